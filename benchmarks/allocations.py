@@ -0,0 +1,119 @@
+"""
+Measures memory allocated per request by bolt's request-scoped objects
+(Request, Uri, headers, HttpBody, matched Route, Response).
+
+    python benchmarks/allocations.py --requests 5000
+
+Request and response of every request are kept alive, so the growth of
+allocated blocks and traced memory divided by the number of requests is
+the size of the object graph a request leaves behind as garbage. Peak
+memory of a single request also includes short-lived temporaries.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bolt.application import Bolt
+from bolt.http import Response, Request
+from bolt.router import Route
+
+
+def create_app(retained):
+    app = Bolt()
+
+    @app.route('/users')
+    class UserController:
+
+        def __init__(self, request: Request, route: Route):
+            self.request = request
+            self.route = route
+
+        @app.post('/{id}')
+        def update(self):
+            return Response('user %s' % self.route.get('id'), 200, {'Content-Type': 'text/plain'})
+
+    def retain(request, handler):
+        response = handler(request)
+        retained.append((request, response))
+        return response
+
+    app.intercept(retain)
+    app.ready()
+
+    return app
+
+
+def environ():
+    body = b'{"name": "Bob"}'
+    return {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': '/users/1',
+        'QUERY_STRING': 'fields=name&expand=team',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '8000',
+        'HTTP_HOST': 'localhost:8000',
+        'HTTP_ACCEPT': 'application/json',
+        'HTTP_USER_AGENT': 'benchmark',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body),
+    }
+
+
+def start_response(status, headers):
+    pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measures memory allocated per request.')
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    retained = []
+    app = create_app(retained)
+    environs = [environ() for i in range(args.requests)]
+    app(environ(), start_response)
+    retained.clear()
+
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    traced = tracemalloc.get_traced_memory()[0]
+    for env in environs:
+        app(env, start_response)
+    blocks = sys.getallocatedblocks() - blocks
+    traced = tracemalloc.get_traced_memory()[0] - traced
+
+    # Peak includes temporary objects freed before the request ends
+    retained.clear()
+    peaks = []
+    for env in environs:
+        env['wsgi.input'].seek(0)
+        retained.clear()
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        app(env, start_response)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    retained.clear()
+    started = time.perf_counter()
+    for env in environs:
+        env['wsgi.input'].seek(0)
+        app(env, start_response)
+    elapsed = time.perf_counter() - started
+
+    print('allocated blocks per request: %.1f' % (blocks / args.requests))
+    print('bytes per request: %.0f' % (traced / args.requests))
+    print('peak bytes per request: %.0f' % sorted(peaks)[len(peaks) // 2])
+    print('time per request: %.1f us' % (elapsed / args.requests * 1e6))
+
+
+if __name__ == '__main__':
+    main()
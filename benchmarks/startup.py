@@ -0,0 +1,74 @@
+"""
+Measures cost of `import bolt` in fresh interpreters: import time, memory
+allocated by imported modules and optional dependencies loaded eagerly.
+
+    python benchmarks/startup.py --runs 20 --budget-ms 150 --budget-kb 4096
+
+Exits with status 1 when median import time or memory exceeds the budget
+or when any of the heavy dependencies is imported.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('pymongo', 'bson', 'dateutil', 'six')
+
+PROBE = '''
+import json, sys, time, tracemalloc
+trace_memory = sys.argv[1] == 'memory'
+if trace_memory:
+    tracemalloc.start()
+started = time.perf_counter()
+import bolt
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    'seconds': elapsed,
+    'bytes': tracemalloc.get_traced_memory()[0] if trace_memory else None,
+    'heavy': sorted(name for name in %r if name in sys.modules)
+}))
+''' % (HEAVY_MODULES,)
+
+
+def measure(mode):
+    """
+    :param mode: 'time' or 'memory', tracing allocations slows imports down
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.check_output([sys.executable, '-W', 'ignore', '-c', PROBE, mode], cwd=ROOT, env=env)
+    return json.loads(output.decode('utf-8'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measures cost of importing bolt.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=None, help='maximum median import time')
+    parser.add_argument('--budget-kb', type=float, default=None, help='maximum memory allocated by import')
+    args = parser.parse_args(argv)
+
+    # First run warms bytecode cache
+    heavy = measure('time')['heavy']
+    milliseconds = statistics.median(measure('time')['seconds'] for i in range(args.runs)) * 1000
+    kilobytes = statistics.median(measure('memory')['bytes'] for i in range(args.runs)) / 1024
+
+    print('import bolt: %.1f ms (median of %d), %.0f KiB allocated' % (milliseconds, args.runs, kilobytes))
+    print('heavy dependencies imported: %s' % (', '.join(heavy) or 'none'))
+
+    failed = bool(heavy)
+    if args.budget_ms is not None and milliseconds > args.budget_ms:
+        print('import time over budget of %.1f ms' % args.budget_ms)
+        failed = True
+    if args.budget_kb is not None and kilobytes > args.budget_kb:
+        print('memory over budget of %.0f KiB' % args.budget_kb)
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
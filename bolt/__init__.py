@@ -5,3 +5,11 @@ Copyright (c) 2016, Dawid Krac Kraczkowski
 License: MIT (see LICENSE for details)
 """
 from .application import Bolt
+
+
+def __getattr__(name):
+    # bolt.cached is imported on first use, so applications not using it do not pay for its imports
+    if name == 'cached':
+        from .cache import cached
+        return cached
+    raise AttributeError("module 'bolt' has no attribute %r" % name)
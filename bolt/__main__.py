@@ -0,0 +1,6 @@
+"""
+Bolt command line interface, see bolt.server.
+"""
+from .server import main
+
+main()
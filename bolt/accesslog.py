@@ -0,0 +1,161 @@
+"""
+Structured access log written in batches by a background thread.
+"""
+from .http import Response
+from queue import Queue, Full, Empty
+from threading import Thread, Lock
+from time import perf_counter, time
+import atexit
+import json
+import os
+
+
+class AccessLog:
+    """ Records every request as a JSON line:
+
+        {"time": 1476890000.123, "method": "GET", "path": "/users/1", "route": "/users/{id}",
+         "status": 200, "bytes": 12, "duration": 0.0021,
+         "timings": {"route": 0.0001, "before": 0.0002, "controller": 0.0015, "after": 0.0001}}
+
+    Records are queued in memory and written in batches by a background thread,
+    so request threads never wait for file I/O. When the buffer is full records
+    are either dropped (POLICY_DROP, counted in `dropped`) or the request thread
+    waits for free space (POLICY_BLOCK).
+
+    Usage:
+        app.use(AccessLog('/var/log/app/access.jsonl'))
+    """
+
+    POLICY_DROP = 'drop'
+    POLICY_BLOCK = 'block'
+
+    def __init__(self, target, buffer_size=10000, batch_size=500, flush_interval=1.0, policy=POLICY_DROP):
+        """
+        :param target: file path or writable stream
+        :param buffer_size: maximum number of records waiting to be written
+        :param batch_size: maximum number of records written at once
+        :param flush_interval: maximum time in seconds a record waits in the buffer
+        :param policy: AccessLog.POLICY_DROP or AccessLog.POLICY_BLOCK
+        """
+        if policy not in (self.POLICY_DROP, self.POLICY_BLOCK):
+            raise ValueError('Unknown access log policy %s' % policy)
+        self.target = target
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.dropped = 0
+        self._queue = Queue(buffer_size)
+        self._stream = None
+        self._thread = None
+        self._lock = Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart)
+
+    def __call__(self, app):
+        app.intercept(self.intercept)
+        app.on_shutdown(self.close)
+        self.start()
+
+    def intercept(self, request, handler):
+        request.timings = {}
+        started = perf_counter()
+        response = None
+        try:
+            response = handler(request)
+            return response
+        finally:
+            # Request failed with unhandled exception is still recorded, server answers it with 500
+            body = response.body if response is not None else ''
+            self.record({
+                'time': time(),
+                'method': request.method,
+                'path': request.uri.path,
+                'route': request.route.name if request.route is not None else None,
+                'status': response.status if response is not None else Response.HTTP_INTERNAL_SERVER_ERROR,
+                # Only non-ASCII bodies need encoding to be measured, it is left to the writer thread
+                'bytes': len(body) if body.isascii() else body,
+                'duration': perf_counter() - started,
+                'timings': request.timings
+            })
+
+    def record(self, record):
+        """ Queues record to be written.
+        :param record: json serializable dict
+        """
+        if self.policy == self.POLICY_BLOCK:
+            self._queue.put(record)
+            return
+        try:
+            self._queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            if hasattr(self.target, 'write'):
+                self._stream = self.target
+            else:
+                self._stream = open(self.target, 'a', encoding='utf-8')
+            self._thread = Thread(target=self._run, name='bolt-access-log', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self):
+        """ Writes all queued records and stops the writer thread.
+        """
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+            if self._stream is not self.target:
+                self._stream.close()
+            atexit.unregister(self.close)
+
+    def _restart(self):
+        # Copied buffer would write the parent's records twice, child opens its own stream and starts empty
+        running = self._thread is not None
+        self._lock = Lock()
+        self._queue = Queue(self._queue.maxsize)
+        self._thread = None
+        if running:
+            self.start()
+
+    def _run(self):
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except Empty:
+                continue
+
+            batch = []
+            stopping = record is None
+            if not stopping:
+                batch.append(record)
+            while len(batch) < self.batch_size and not stopping:
+                try:
+                    record = self._queue.get_nowait()
+                except Empty:
+                    break
+                if record is None:
+                    stopping = True
+                else:
+                    batch.append(record)
+
+            if batch:
+                self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch):
+        for record in batch:
+            if isinstance(record.get('bytes'), str):
+                record['bytes'] = len(record['bytes'].encode('utf-8'))
+        try:
+            self._stream.write(''.join(json.dumps(record, default=str) + '\n' for record in batch))
+            self._stream.flush()
+        except OSError:
+            self.dropped += len(batch)
@@ -0,0 +1,191 @@
+"""
+Diagnostic mode attributing net memory allocations of sampled requests to routes
+with tracemalloc.
+"""
+from threading import Lock
+import gc
+import random
+import tracemalloc
+
+
+class AllocationBudgetExceeded(AssertionError):
+    pass
+
+
+class RouteAllocations:
+    """ Net allocations recorded for a single route.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.blocks = 0
+        self.size = 0
+        self.max_blocks = 0
+        self.max_size = 0
+        self._sites = {}
+
+    def add(self, differences):
+        blocks = 0
+        size = 0
+        for difference in differences:
+            blocks += difference.count_diff
+            size += difference.size_diff
+            if difference.size_diff <= 0 and difference.count_diff <= 0:
+                continue
+            site = ' < '.join(str(frame) for frame in difference.traceback)
+            totals = self._sites.setdefault(site, [0, 0])
+            totals[0] += difference.size_diff
+            totals[1] += difference.count_diff
+
+        self.requests += 1
+        self.blocks += blocks
+        self.size += size
+        self.max_blocks = max(self.max_blocks, blocks)
+        self.max_size = max(self.max_size, size)
+
+    def top(self, limit=10):
+        """ Returns allocation sites sorted by allocated size.
+        :param limit: number of sites
+        :return: list of (site, size, blocks) tuples
+        """
+        sites = sorted(self._sites.items(), key=lambda item: item[1][0], reverse=True)
+        return [(site, size, blocks) for site, (size, blocks) in sites[:limit]]
+
+    def to_dict(self, limit=10):
+        return {
+            'requests': self.requests,
+            'blocks': self.blocks,
+            'size': self.size,
+            'max_blocks': self.max_blocks,
+            'max_size': self.max_size,
+            'top': self.top(limit)
+        }
+
+
+class AllocationProfiler:
+    """ Takes tracemalloc snapshots around sampled requests and attributes net
+    allocations (what is still allocated once the response is ready) to routes.
+
+    Usage:
+        profiler = AllocationProfiler(rate=0.05)
+        app.use(profiler)
+        ...
+        profiler.report()
+        profiler.check('/users/{id}', max_blocks=100)
+
+    Only one request is measured at a time, allocations made by other threads
+    during measurement are attributed to the sampled request as well.
+    Meant as a diagnostic tool, snapshots are expensive.
+    """
+
+    PROFILE_ALLOCATIONS = 'profile_allocations'
+
+    def __init__(self, rate=1.0, routes=None, frames=1, collect=True):
+        """
+        :param rate: fraction of requests (0..1) to measure
+        :param routes: dict mapping route name to its sampling rate
+        :param frames: number of frames stored per allocation site
+        :param collect: run garbage collector before snapshots, so only
+                        memory that really survives is reported
+        """
+        self.rate = rate
+        self.routes = routes or {}
+        self.frames = frames
+        self.collect = collect
+        self.random = random.random
+        self._app = None
+        self._allocations = {}
+        self._lock = Lock()
+        self._started_tracing = False
+        self._filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+
+    def __call__(self, app):
+        self._app = app
+        app.intercept(self.intercept)
+        self.start()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def intercept(self, request, handler):
+        route = self._app.match(request)
+        if route is None:
+            return handler(request)
+
+        rate = self._rate(route)
+        if not rate or self.random() >= rate:
+            return handler(request)
+
+        if not self._lock.acquire(blocking=False):
+            return handler(request)
+        try:
+            before = self._snapshot()
+            response = handler(request)
+            after = self._snapshot()
+            key_type = 'traceback' if self.frames > 1 else 'lineno'
+            self.allocations(route.name).add(after.compare_to(before, key_type))
+            return response
+        finally:
+            self._lock.release()
+
+    def allocations(self, route) -> RouteAllocations:
+        if route not in self._allocations:
+            self._allocations[route] = RouteAllocations(route)
+
+        return self._allocations[route]
+
+    def report(self, limit=10):
+        """ Returns allocations recorded per route.
+        :param limit: number of top allocation sites per route
+        :return: dict
+        """
+        return {name: allocations.to_dict(limit) for name, allocations in self._allocations.items()}
+
+    def check(self, route, max_blocks=None, max_size=None):
+        """ Checks that no measured request of the route allocated more than given budget.
+        Raises AllocationBudgetExceeded otherwise.
+
+        :param route: route name
+        :param max_blocks: maximum number of net allocated memory blocks per request
+        :param max_size: maximum net allocated bytes per request
+        :return: True
+        """
+        allocations = self._allocations.get(route)
+        if allocations is None:
+            raise AllocationBudgetExceeded('No requests were measured for route %s' % route)
+
+        if max_blocks is not None and allocations.max_blocks >= max_blocks:
+            raise AllocationBudgetExceeded('Route %s allocated %d blocks, budget is %d. Top sites: %s' % (
+                route, allocations.max_blocks, max_blocks, allocations.top(3)))
+
+        if max_size is not None and allocations.max_size >= max_size:
+            raise AllocationBudgetExceeded('Route %s allocated %d bytes, budget is %d. Top sites: %s' % (
+                route, allocations.max_size, max_size, allocations.top(3)))
+
+        return True
+
+    def reset(self):
+        self._allocations = {}
+
+    def _rate(self, route):
+        if route.name in self.routes:
+            return self.routes[route.name]
+        rate = route.get(self.PROFILE_ALLOCATIONS)
+        if rate is not None:
+            return rate
+        return self.rate
+
+    def _snapshot(self):
+        if self.collect:
+            gc.collect()
+        return tracemalloc.take_snapshot().filter_traces(self._filters)
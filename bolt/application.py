@@ -5,11 +5,17 @@ Copyright (c) 2016, Dawid Krac Kraczkowski
 License: MIT (see LICENSE for details)
 """
 from .router import Route, RouteMap
-from .utils import find_class, get_fqn, call_object_method, find_clsname
-from .http import Request, Response, HttpException
-from .odm import Serializable
+from .utils import find_class, get_fqn, call_object_method, find_clsname, Serializable
+from .http import Request, Response, HttpException, HttpBody, Uri
+from .tracing import span
 
+from contextlib import contextmanager
+from threading import Thread, Lock
+from time import perf_counter
+
+import importlib
 import inspect
+import logging
 import copy
 import json
 
@@ -18,12 +24,13 @@ class ApplicationFoundation:
 
     def __init__(self):
         self._map = RouteMap()
-        self._before_middleware = MiddlewareComposer()
-        self._after_middleware = MiddlewareComposer()
+        self._before_middleware = MiddlewareComposer('middleware.before')
+        self._after_middleware = MiddlewareComposer('middleware.after')
         self.service_locator = ServiceLocator()
         self._base_routes = {}
         self._routes = []
         self._services = []
+        self._interceptors = []
         pass
 
     def before(self):
@@ -48,6 +55,24 @@ class ApplicationFoundation:
 
         return decorator
 
+    def intercept(self, interceptor):
+        """ Registers request interceptor. Interceptor is a callable which accepts
+        request and next handler in the chain and must return an instance of Response:
+
+            def interceptor(request, handler):
+                response = handler(request)
+                return response
+
+        Interceptors are executed in order of registration, first registered
+        interceptor wraps all the others.
+
+        :param interceptor: callable(request, handler) -> Response
+        :return: interceptor
+        """
+        self._interceptors.append(interceptor)
+
+        return interceptor
+
     def route(self, rule: str):
         def decorator(cls):
             self._base_routes[get_fqn(cls)] = rule
@@ -124,6 +149,61 @@ class ApplicationFoundation:
             'settings': settings
         })
 
+    def lazy_expose(self, rule, target: str, method=None, settings=None):
+        """ Connects an URI rule to controller given by its path, the controller's module
+        is imported when the first matching request comes:
+
+            app.lazy_get('/reports/{id}', 'myapp.reports:ReportController.show')
+
+        Module of lazily loaded controller must not register routes with decorators.
+
+        :param rule: uri rule
+        :param target: 'module:attribute[.attribute]' path of the controller
+        """
+        controller = LazyController(target)
+        self.expose(rule, controller, method, settings)
+
+        return controller
+
+    def lazy_get(self, rule: str, target: str, **kwargs):
+        return self.lazy_expose(rule, target, ['GET'], kwargs)
+
+    def lazy_post(self, rule: str, target: str, **kwargs):
+        return self.lazy_expose(rule, target, ['POST'], kwargs)
+
+    def lazy_put(self, rule: str, target: str, **kwargs):
+        return self.lazy_expose(rule, target, ['PUT'], kwargs)
+
+    def lazy_patch(self, rule: str, target: str, **kwargs):
+        return self.lazy_expose(rule, target, ['PATCH'], kwargs)
+
+    def lazy_delete(self, rule: str, target: str, **kwargs):
+        return self.lazy_expose(rule, target, ['DELETE'], kwargs)
+
+    def lazy_any(self, rule: str, target: str, **kwargs):
+        return self.lazy_expose(rule, target, None, kwargs)
+
+    def prewarm(self, background=True):
+        """ Imports all lazily loaded controllers. Prefork workers call it once they
+        accept connections if prewarm_lazy is set.
+
+        :param background: import in a daemon thread
+        :return: Thread if background is set
+        """
+        controllers = [route['func'] for route in self._routes if isinstance(route['func'], LazyController)]
+
+        def load():
+            for controller in controllers:
+                controller.load()
+
+        if not background:
+            load()
+            return None
+        thread = Thread(target=load, name='bolt-prewarm', daemon=True)
+        thread.start()
+
+        return thread
+
     def service(self, name: str=None):
         def decorator(service):
             self.service_locator.set(service, name)
@@ -154,43 +234,169 @@ class Bolt(ApplicationFoundation):
     def __init__(self):
         super().__init__()
         self._server = None
+        self._handler = self._dispatch
+        self.is_ready = False
+        self.prewarm_lazy = False
+        self.warmup_requests = []
+        self.startup_report = None
+        self._shutdown_callbacks = []
 
     def __call__(self, env, start_response):
         return self._on_request(env, start_response)
 
-    def ready(self):
-        self._build_route_map()
-        for service in self._services:
-            if hasattr(service, '__call__'):
-                service(self)
+    def ready(self, warmup=False, requests=None):
+        """ Prepares application for serving requests. Application is marked as ready
+        only once all the steps are finished.
+
+        In warmup mode all routes are compiled, invocation plans of controllers are
+        built, services registered in service locator are instantiated (so missing
+        dependencies fail at startup) and synthetic requests are passed through the
+        whole pipeline:
+
+            app.ready(warmup=True, requests=[('GET', '/health'), {'method': 'GET', 'path': '/users/1'}])
+
+        Time spent in every step is available in app.startup_report.
+
+        :param warmup: run warmup steps
+        :param requests: synthetic requests, (method, path) tuples or dicts with method, path,
+                         body and headers keys; defaults to app.warmup_requests
+        """
+        if self.is_ready:
+            return self
+        report = StartupReport()
+        with report.phase('services'):
+            for service in self._services:
+                if hasattr(service, '__call__'):
+                    service(self)
+        with report.phase('routes'):
+            self._build_route_map()
+        with report.phase('pipeline'):
+            self._handler = self._build_pipeline()
+        if warmup:
+            self._warmup(report, self.warmup_requests if requests is None else requests)
+        self.startup_report = report
+        self.is_ready = True
         return self
 
+    def _warmup(self, report, requests):
+        with report.phase('compile'):
+            self._map.compile()
+        with report.phase('plans'):
+            for route in self._routes:
+                if not isinstance(route['func'], LazyController):
+                    InvocationPlan.of(route['func'])
+        with report.phase('instances'):
+            self.service_locator.instantiate()
+        with report.phase('requests'):
+            for item in requests:
+                if not isinstance(item, dict):
+                    item = {'method': item[0], 'path': item[1]}
+                started = perf_counter()
+                response = self.handle(self._synthetic_request(item))
+                # Warmup responses are never handed to a server, post-response callbacks run now
+                response.close()
+                report.requests.append({
+                    'method': item.get('method', 'GET'),
+                    'path': item['path'],
+                    'status': response.status,
+                    'duration': perf_counter() - started
+                })
+
     def use(self, service):
         self._services.append(service)
 
+    def on_shutdown(self, callback):
+        """ Registers callback executed when the process serving requests shuts down
+        gracefully (see shutdown). Prefork workers leave with os._exit, which skips
+        atexit hooks, so plugins flushing buffers or stopping threads register here.
+        :param callback: callable without arguments
+        """
+        self._shutdown_callbacks.append(callback)
+
+    def shutdown(self):
+        """ Runs shutdown callbacks, called by a worker once it stopped serving requests.
+        Every callback is run even if previous ones failed.
+        """
+        callbacks, self._shutdown_callbacks = self._shutdown_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logging.getLogger('bolt').exception('Shutdown callback %r failed', callback)
+
+    def handle(self, request: Request) -> Response:
+        """ Passes request through interceptors, middleware and controller and
+        returns the response. Never raises HttpException, errors are converted
+        to responses.
+
+        :param request: Request
+        :return: Response
+        """
+        return self._handler(request)
+
+    def match(self, request: Request) -> Route:
+        """ Finds route matching the request. Matched route is remembered in
+        request.route so the lookup happens only once per request.
+
+        :param request: Request
+        :return: Route or None
+        """
+        if request.route is None:
+            with span('route.find', path=request.uri.path):
+                request.route = self._map.find(request.uri.path, [request.method])
+
+        return request.route
+
+    def _build_pipeline(self):
+        handler = self._dispatch
+        for interceptor in reversed(self._interceptors):
+            handler = self._chain(interceptor, handler)
+
+        return handler
+
+    def _chain(self, interceptor, handler):
+        def intercepted(request):
+            try:
+                return interceptor(request, handler)
+            except HttpException as e:
+                return self._error_response(e)
+
+        return intercepted
+
     def _on_request(self, env, start_response):
         request = Request.from_env(env)
-        route = self._map.find(request.uri.path, [request.method])
+        response = self.handle(request)
+        start_response(Response.status_message(response.status), response.headers)
+        if response.closing:
+            return ClosingBody([response.body.encode("utf-8")], response.close)
+        return [response.body.encode("utf-8")]
+
+    def _dispatch(self, request):
+        timings = request.timings
+        started = perf_counter() if timings is not None else None
+        route = self.match(request)
+        if timings is not None:
+            started = self._record_phase(timings, 'route', started)
         if route is None:
             if self._map.find(request.uri.path):
-                return self._on_error(
-                    request,
-                    HttpException(
-                        'Method not allowed',
-                        Response.HTTP_METHOD_NOT_ALLOWED
-                    ),
-                    start_response
-                )
-            return self._on_error(request, HttpException('Not Found', Response.HTTP_NOT_FOUND), start_response)
-        request.route = route
+                return self._error_response(HttpException('Method not allowed', Response.HTTP_METHOD_NOT_ALLOWED))
+            return self._error_response(HttpException('Not Found', Response.HTTP_NOT_FOUND))
         service_locator = self.service_locator.from_self()
         service_locator.set(route, Route)
         service_locator.set(request, Request)
-        resolver = ControllerResolver(route.callback, service_locator)
+        callback = route.callback
+        if isinstance(callback, LazyController):
+            callback = callback.load()
+        resolver = ControllerResolver(callback, service_locator)
 
         try:
             self._before_middleware(service_locator)
-            response = resolver.resolve()
+            if timings is not None:
+                started = self._record_phase(timings, 'before', started)
+            with span('controller.resolve', route=route.name):
+                response = resolver.resolve()
+            if timings is not None:
+                started = self._record_phase(timings, 'controller', started)
 
             if not isinstance(response, Response):
                 if response is str:
@@ -202,21 +408,82 @@ class Bolt(ApplicationFoundation):
                     )
             service_locator.set(response, Response)
             self._after_middleware(service_locator)
-            start_response(Response.status_message(response.status), response.headers)
-            return [response.body.encode("utf-8")]
+            if timings is not None:
+                self._record_phase(timings, 'after', started)
+            return response
         except HttpException as e:
-            return self._on_error(request, e, start_response)
+            return self._error_response(e)
+
+    @staticmethod
+    def _record_phase(timings, phase, started):
+        now = perf_counter()
+        timings[phase] = now - started
+        return now
+
+    @staticmethod
+    def _synthetic_request(item) -> Request:
+        headers = {name.upper().replace('-', '_'): value for name, value in item.get('headers', {}).items()}
+        body = item.get('body')
+        if body is not None:
+            if not isinstance(body, str):
+                body = json.dumps(body)
+                headers['CONTENT_TYPE'] = 'application/json'
+            headers['CONTENT_LENGTH'] = str(len(body))
+            body = HttpBody(body, len(body))
+        request = Request(item.get('method', Request.METHOD_GET), Uri('http://localhost' + item['path']), body, headers)
+        request.remote_addr = '127.0.0.1'
+
+        return request
+
+    def _error_response(self, error: HttpException) -> Response:
+        headers = {'Content-Type': 'text/plain'}
+        if error.headers:
+            headers.update(error.headers)
+        return Response(str(error), error.code, headers)
+
+
+class StartupReport:
+    """ Time spent in every step of Bolt.ready() and results of synthetic requests.
+    """
+    def __init__(self):
+        self.phases = {}
+        self.requests = []
 
-    def _on_error(self, request, error: HttpException, start_response):
-        status_message = Response.status_message(error.code)
-        response_contents = str(error).encode("utf-8")
-        start_response(status_message, [('Content-Type', 'text/plain')])
-        return [response_contents]
+    @contextmanager
+    def phase(self, name):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = perf_counter() - started
+
+    @property
+    def total(self):
+        return sum(self.phases.values())
+
+    def __str__(self):
+        lines = ['startup: %.1f ms' % (self.total * 1000)]
+        for name, duration in self.phases.items():
+            lines.append('  %-10s %8.1f ms' % (name, duration * 1000))
+        for request in self.requests:
+            lines.append('  %s %s -> %s in %.1f ms' % (request['method'], request['path'], request['status'],
+                                                      request['duration'] * 1000))
+        return '\n'.join(lines)
+
+
+class ClosingBody(list):
+    """ WSGI response body calling `close` once the server has sent it (PEP 3333).
+    """
+    def __init__(self, body, close):
+        super().__init__(body)
+        self.close = close
 
 
 class ServiceLocator:
     """ ServiceLocator
     """
+    _dependencies = {}
+
     def __init__(self):
         self._services_definitions = {}
         self._services = {}
@@ -278,6 +545,13 @@ class ServiceLocator:
 
         return self._services[name]
 
+    def instantiate(self):
+        """ Creates instances of all services registered as classes.
+        """
+        for name, service in list(self._services_definitions.items()):
+            if inspect.isclass(service):
+                self.get(name)
+
     def destroy(self):
         """ Destroys all instantiated services
         :return:
@@ -287,36 +561,108 @@ class ServiceLocator:
     def from_self(self) -> 'ServiceLocator':
         """ Creates and returns new copy of ServiceLocator from current instance.
         Note that all instantiated services will not be available in the ServiceLocator's
-        copy.
+        copy. Services set on the copy are not visible in current instance.
         :return:
         """
         sl = copy.copy(self)
+        sl._services_definitions = self._services_definitions.copy()
         sl.destroy()
 
         return sl
 
     def _resolve_service(self, service):
-        constructor_params = inspect.signature(service.__init__).parameters.values()
+        dependencies = ServiceLocator._dependencies.get(service)
+        if dependencies is None:
+            # Constructor signature is inspected once per service class
+            dependencies = ServiceLocator._dependencies[service] = InvocationPlan.dependencies(
+                inspect.signature(service.__init__).parameters.values())
         kwargs = {}
-        for param in constructor_params:
-            if param.name is 'self':
-                continue
-            if param.name is 'args':
-                continue
-            if param.name is 'kwargs':
-                continue
-
-            fqn = get_fqn(param.annotation)
-            if fqn.startswith('builtins.'):
-                continue
+        for name, fqn in dependencies:
             dependency = self.get(fqn)
             if dependency is None:
                 raise AttributeError('Could not resolve service %s' % fqn)
-            kwargs[param.name] = dependency
+            kwargs[name] = dependency
         instance = service(**kwargs)
         return instance
 
 
+class InvocationPlan:
+    """ Controller's class and dependencies of its constructor and method. Signatures are
+    inspected once per controller, plans are shared by all requests.
+    """
+    _plans = {}
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.controller_class = find_class(controller)
+        self.constructor_dependencies = []
+        if self.controller_class is not None:
+            self.constructor_dependencies = self.dependencies(
+                inspect.signature(self.controller_class.__init__).parameters.values())
+        self.method_dependencies = self.dependencies(inspect.signature(controller).parameters.values())
+
+    @classmethod
+    def of(cls, controller) -> 'InvocationPlan':
+        try:
+            plan = cls._plans.get(controller)
+            if plan is None:
+                plan = cls._plans[controller] = cls(controller)
+        except TypeError:
+            # Unhashable controller
+            plan = cls(controller)
+
+        return plan
+
+    @staticmethod
+    def dependencies(params):
+        dependencies = []
+        for param in params:
+
+            if param.name == 'self':
+                continue
+            if param.name == 'args':
+                continue
+            if param.name == 'kwargs':
+                continue
+
+            dependency = get_fqn(param.annotation)
+            if dependency.startswith('builtins.'):
+                continue
+
+            dependencies.append((param.name, dependency))
+
+        return dependencies
+
+
+class LazyController:
+    """ Placeholder of controller given as 'module:attribute[.attribute]' path. The module is
+    imported and invocation plan is built on first load.
+    """
+    def __init__(self, target: str):
+        if ':' not in target:
+            raise ValueError('Expected controller path in format module:attribute, got %s' % target)
+        self.target = target
+        self._controller = None
+        self._lock = Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._controller is not None
+
+    def load(self):
+        if self._controller is None:
+            with self._lock:
+                if self._controller is None:
+                    module, path = self.target.split(':', 1)
+                    controller = importlib.import_module(module)
+                    for name in path.split('.'):
+                        controller = getattr(controller, name)
+                    InvocationPlan.of(controller)
+                    self._controller = controller
+
+        return self._controller
+
+
 class ControllerResolver:
     """ Takes responsibility for resolving controller's dependencies. If controller is a method
     it will create instance of appropriate class and call the method in the context of the class.
@@ -331,7 +677,8 @@ class ControllerResolver:
         :param service_locator: ServiceLocator
         :return:
         """
-        self.controller_class = find_class(controller)
+        self.plan = InvocationPlan.of(controller)
+        self.controller_class = self.plan.controller_class
         self.service_locator = service_locator
         self.controller_method = controller
 
@@ -341,12 +688,10 @@ class ControllerResolver:
         the instance is created. This method takes care about resolving those dependencies.
         :return:
         """
-        params = inspect.signature(self.controller_class.__init__).parameters.values()
-        return self._resolve_params(params)
+        return self._resolve_params(self.plan.constructor_dependencies)
 
     def _resolve_method_dependencies(self):
-        params = inspect.signature(self.controller_method).parameters.values()
-        return self._resolve_params(params)
+        return self._resolve_params(self.plan.method_dependencies)
 
     def resolve(self):
         """
@@ -374,29 +719,18 @@ class ControllerResolver:
         else:
             return call_object_method(instance, self.controller_method.__name__)
 
-    def _resolve_params(self, params):
+    def _resolve_params(self, dependencies):
         resolved = {}
-        for param in params:
-
-            if param.name is 'self':
-                continue
-            if param.name is 'args':
-                continue
-            if param.name is 'kwargs':
-                continue
-
-            dependency = get_fqn(param.annotation)
-            if dependency.startswith('builtins.'):
-                continue
-
-            resolved[param.name] = self.service_locator.get(dependency)
+        for name, dependency in dependencies:
+            resolved[name] = self.service_locator.get(dependency)
 
         return resolved
 
 
 class MiddlewareComposer:
 
-    def __init__(self):
+    def __init__(self, name='middleware'):
+        self.name = name
         self._middleware = []
         self.error = None
 
@@ -424,7 +758,8 @@ class MiddlewareComposer:
             if args_to_pass > 0:
                 func_args = args[:args_to_pass]
 
-            callback(*func_args, **kw_func_args)
+            with span(self.name, callback=getattr(callback, '__name__', repr(callback))):
+                callback(*func_args, **kw_func_args)
 
         return True
 
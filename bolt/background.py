@@ -0,0 +1,185 @@
+"""
+Work executed after the response has been sent to the client.
+"""
+from .deadline import Deadline
+from contextvars import ContextVar, copy_context
+from queue import Queue, Full
+from threading import Thread, Lock
+from time import perf_counter
+import atexit
+import logging
+import os
+
+
+logger = logging.getLogger('bolt.background')
+
+_current_tasks = ContextVar('bolt_background_tasks', default=None)
+
+
+class BackgroundTasks:
+    """ Tasks of one request, injectable into controllers and services:
+
+        class OrderController:
+            def __init__(self, tasks: BackgroundTasks, mailer: Mailer):
+                ...
+
+            def create(self):
+                ...
+                self.tasks.add(self.mailer.send_confirmation, order)
+                return Response('created', 201)
+
+    Tasks run once the response body has been handed to the server. Every task
+    runs in a copy of the context it was added from, so it keeps references to
+    the request-scoped services and context (e.g. tracing) it was created with.
+    Request deadline does not apply to tasks.
+    """
+    def __init__(self):
+        self.tasks = []
+
+    def add(self, func, *args, **kwargs):
+        """
+        :param func: callable
+        :param args: positional arguments passed to func
+        :param kwargs: keyword arguments passed to func
+        """
+        self.tasks.append((copy_context(), func, args, kwargs))
+
+    def __len__(self):
+        return len(self.tasks)
+
+
+def background_tasks_service(service_locator):
+    """ Service factory of BackgroundTasks, registered by Background.
+    """
+    return _current_tasks.get()
+
+
+class Background:
+    """ Runs BackgroundTasks on a bounded pool of threads.
+
+        app.use(Background(workers=4))
+
+    When the queue is full, tasks are dropped (counted in `dropped` and logged).
+    Failing tasks are logged and counted in `failed`. Queued tasks are finished
+    on shutdown (see close).
+    """
+    def __init__(self, workers=4, queue_size=1000, registry=None):
+        """
+        :param workers: number of threads
+        :param queue_size: maximum number of tasks waiting for a thread
+        :param registry: bolt.metrics.MetricsRegistry
+        """
+        self.workers = workers
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = Queue(queue_size)
+        self._threads = []
+        self._lock = Lock()
+        self._counter_lock = Lock()
+        self._tasks_total = None
+        self._duration = None
+        self._queued = None
+        if registry is not None:
+            self._tasks_total = registry.counter('bolt_background_tasks_total', 'Background tasks by outcome.',
+                                                 ['status'])
+            self._duration = registry.histogram('bolt_background_task_duration_seconds',
+                                                'Background task duration in seconds.')
+            self._queued = registry.gauge('bolt_background_tasks_queued', 'Background tasks waiting for a thread.')
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart)
+
+    def __call__(self, app):
+        app.service_locator.set(background_tasks_service, BackgroundTasks)
+        app.intercept(self.intercept)
+        app.on_shutdown(self.close)
+        self.start()
+
+    def intercept(self, request, handler):
+        tasks = BackgroundTasks()
+        token = _current_tasks.set(tasks)
+        try:
+            response = handler(request)
+        finally:
+            _current_tasks.reset(token)
+        if tasks.tasks:
+            response.on_close(lambda: self.submit(tasks))
+
+        return response
+
+    def submit(self, tasks: BackgroundTasks):
+        """ Queues tasks to be executed by the pool.
+        """
+        for task in tasks.tasks:
+            try:
+                self._queue.put_nowait(task)
+            except Full:
+                self._record('dropped')
+                logger.error('Background task %r dropped, queue is full', task[1])
+                continue
+            if self._queued is not None:
+                self._queued.inc()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = Thread(target=self._run, name='bolt-background-%d' % i, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.close)
+
+    def close(self, timeout=None):
+        """ Finishes queued tasks and stops the threads.
+        :param timeout: maximum number of seconds to wait for every thread
+        """
+        with self._lock:
+            if not self._threads:
+                return
+            for thread in self._threads:
+                self._queue.put(None)
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+            atexit.unregister(self.close)
+
+    def _restart(self):
+        # Tasks scheduled before fork (e.g. by warmup requests) are run by the master's own threads
+        running = bool(self._threads)
+        self._lock = Lock()
+        self._counter_lock = Lock()
+        self._queue = Queue(self._queue.maxsize)
+        self._threads = []
+        if running:
+            self.start()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            if self._queued is not None:
+                self._queued.dec()
+            context, func, args, kwargs = task
+            started = perf_counter()
+            try:
+                context.run(self._execute, func, args, kwargs)
+            except Exception:
+                self._record('failed')
+                logger.exception('Background task %r failed', func)
+            else:
+                self._record('completed')
+            if self._duration is not None:
+                self._duration.observe(perf_counter() - started)
+
+    @staticmethod
+    def _execute(func, args, kwargs):
+        with Deadline().scope():
+            func(*args, **kwargs)
+
+    def _record(self, status):
+        with self._counter_lock:
+            setattr(self, status, getattr(self, status) + 1)
+        if self._tasks_total is not None:
+            self._tasks_total.labels(status).inc()
@@ -0,0 +1,139 @@
+"""
+Batch endpoint executing many sub-requests within one HTTP request.
+"""
+from .http import Request, Response, HttpException, HttpBody, Uri
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+import json
+import logging
+import os
+
+
+logger = logging.getLogger('bolt.batch')
+
+
+class BatchEndpoint:
+    """ Controller dispatching sub-requests through the application's pipeline.
+    """
+    SAFE_METHODS = (Request.METHOD_GET, Request.METHOD_HEAD)
+    SKIPPED_HEADERS = ('CONTENT_LENGTH', 'CONTENT_TYPE')
+
+    def __init__(self, batch: 'Batch', app):
+        self.batch = batch
+        self.app = app
+
+    def __call__(self, request: Request):
+        sub_requests = [self.sub_request(request, item) for item in self.parse(request)]
+        pool = self.batch.pool
+        if pool is not None and all(sub.method in self.SAFE_METHODS for sub in sub_requests):
+            futures = [pool.submit(copy_context().run, self.dispatch, sub) for sub in sub_requests]
+            results = [future.result() for future in futures]
+        else:
+            # Requests changing state are executed one by one in given order
+            results = [self.dispatch(sub) for sub in sub_requests]
+
+        return Response(json.dumps(results), Response.HTTP_OK, {'Content-Type': 'application/json'})
+
+    def parse(self, request):
+        try:
+            items = json.loads(request.body.contents if request.body is not None else '')
+        except ValueError:
+            raise HttpException('Batch must be a JSON array', Response.HTTP_BAD_REQUEST)
+        if not isinstance(items, list):
+            raise HttpException('Batch must be a JSON array', Response.HTTP_BAD_REQUEST)
+        if len(items) > self.batch.max_requests:
+            raise HttpException('Batch can contain at most %d requests' % self.batch.max_requests,
+                                Response.HTTP_REQUEST_ENTITY_TOO_LARGE)
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get('path'), str) \
+                    or not item['path'].startswith('/'):
+                raise HttpException('Every batch item must contain absolute path', Response.HTTP_BAD_REQUEST)
+
+        return items
+
+    def sub_request(self, request, item):
+        """ Creates request from batch item, headers of the batch request (e.g. authorization
+        or cookies) are passed to sub-requests.
+        """
+        headers = {name: value for name, value in request.headers if name not in self.SKIPPED_HEADERS}
+        body = item.get('body')
+        if body is not None:
+            if not isinstance(body, str):
+                body = json.dumps(body)
+                headers['CONTENT_TYPE'] = 'application/json'
+            headers['CONTENT_LENGTH'] = str(len(body))
+            body = HttpBody(body, len(body))
+        uri = request.uri
+        sub_uri = Uri('%s://%s:%s%s' % (uri.scheme, uri.hostname, uri.port, item['path']))
+        sub = Request(str(item.get('method', Request.METHOD_GET)).upper(), sub_uri, body, headers)
+        sub.remote_addr = request.remote_addr
+
+        return sub
+
+    def dispatch(self, sub):
+        if sub.uri.path == self.batch.path:
+            response = Response('Batch requests cannot be nested', Response.HTTP_BAD_REQUEST)
+        else:
+            try:
+                response = self.app.handle(sub)
+            except Exception:
+                # Failed sub-request must not discard responses of the others
+                logger.exception('Batch sub-request %s %s failed', sub.method, sub.uri.path)
+                response = Response('Internal Server Error', Response.HTTP_INTERNAL_SERVER_ERROR)
+        # Sub-responses are never handed to the server, post-response callbacks run now
+        response.close()
+
+        body = response.body
+        if 'json' in dict(response.headers).get('Content-Type', ''):
+            try:
+                body = json.loads(body)
+            except ValueError:
+                pass
+
+        return {'status': int(response.status), 'headers': dict(response.headers), 'body': body}
+
+
+class Batch:
+    """ Exposes endpoint accepting JSON array of sub-requests:
+
+        POST /batch
+        [{"method": "GET", "path": "/users/1"}, {"method": "POST", "path": "/orders", "body": {"id": 1}}]
+
+    and returning array of their responses in the same order:
+
+        [{"status": 200, "headers": {...}, "body": {...}}, ...]
+
+    Every sub-request passes through interceptors, middleware and controller
+    exactly as it would if sent separately. When workers are given, batches
+    consisting only of GET and HEAD requests are executed concurrently.
+
+        app.use(Batch('/batch', workers=8))
+    """
+    def __init__(self, path='/batch', max_requests=50, workers=0):
+        """
+        :param path: endpoint path
+        :param max_requests: maximum number of sub-requests in one batch
+        :param workers: number of threads executing sub-requests concurrently, 0 executes them sequentially
+        """
+        self.path = path
+        self.max_requests = max_requests
+        self.workers = workers
+        self.pool = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def __call__(self, app):
+        if self.workers:
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix='bolt-batch')
+        app.expose(self.path, BatchEndpoint(self, app), [Request.METHOD_POST])
+        app.on_shutdown(self.shutdown)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def _reset(self):
+        # Threads of the parent's pool are gone in prefork workers, each worker gets its own pool
+        if self.pool is not None:
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix='bolt-batch')
@@ -0,0 +1,746 @@
+"""
+Cache backends and memoization. MemoryCache keeps values in process memory,
+SharedMemoryCache in a memory-mapped file shared by all processes of a host
+(e.g. prefork workers). Both have the same interface and can be swapped.
+"""
+from .shm import SharedMemory, hash_key
+from collections import OrderedDict
+from contextlib import contextmanager, ExitStack
+from contextvars import ContextVar
+from functools import update_wrapper
+from threading import Lock, Event
+import pickle
+import random
+import re
+import struct
+import time
+
+
+class CacheStats:
+    """ Hit, miss and eviction counters of a cache (kept per process).
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def as_dict(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class MemoryCache:
+    """ In-process cache with LRU eviction and per-entry TTL.
+
+        cache = MemoryCache(maxsize=10000)
+        cache.set('user:1', user, ttl=60)
+        cache.get('user:1')
+    """
+    def __init__(self, maxsize=1024, clock=time.time):
+        """
+        :param maxsize: maximum number of entries
+        :param clock: function returning current time in seconds
+        """
+        self.maxsize = maxsize
+        self.clock = clock
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """
+        :param key: str
+        :param default: value returned on miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= self.clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+
+            return entry[0]
+
+    def set(self, key, value, ttl=None) -> bool:
+        """
+        :param key: str
+        :param value: any value
+        :param ttl: seconds after which entry expires, None for no expiration
+        :return: True if the value has been stored
+        """
+        with self._lock:
+            self._store(key, value, ttl)
+
+        return True
+
+    def add(self, key, value, ttl=None) -> bool:
+        """ Stores value only if there is no (not expired) entry for the key.
+        :return: True if the value has been stored
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > self.clock()):
+                return False
+            self._store(key, value, ttl)
+
+        return True
+
+    def incr(self, key, delta=1, ttl=None) -> int:
+        """ Atomically increments integer value, missing value is treated as 0.
+        :return: new value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            value = delta
+            if entry is not None and (entry[1] is None or entry[1] > self.clock()):
+                value += entry[0]
+                ttl = entry[1] - self.clock() if entry[1] is not None else ttl
+            self._store(key, value, ttl)
+
+        return value
+
+    def delete(self, key) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > self.clock())
+
+    def entries(self) -> list:
+        """ Not expired entries, from least to most recently used.
+        :return: list of (key, value, expires at or None) tuples
+        """
+        now = self.clock()
+        with self._lock:
+            return [(key, value, expires) for key, (value, expires) in self._entries.items()
+                    if expires is None or expires > now]
+
+    def load(self, entries):
+        """ Stores entries returned by entries(), expired ones are skipped.
+        :param entries: iterable of (key, value, expires at or None) tuples
+        """
+        now = self.clock()
+        with self._lock:
+            for key, value, expires in entries:
+                if expires is None or expires > now:
+                    self._store(key, value, expires - now if expires is not None else None)
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (value, self.clock() + ttl if ttl is not None else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+
+class SharedMemoryCache:
+    """ Cache stored in a memory-mapped file, all processes opening the same file
+    share entries, so prefork workers of a host do not duplicate hot values.
+
+    The file is a fixed-size hash table divided into groups of `group_size` slots.
+    A key can be stored only in the group selected by its hash, every group has
+    its own lock stripe and CLOCK hand. When the group is full an entry is evicted
+    with CLOCK (second chance) algorithm: reading an entry sets its reference bit,
+    the hand clears reference bits until it finds an entry without one.
+
+    Values are pickled. Entries (key and pickled value) bigger than a slot are not
+    stored, set returns False for them.
+
+    Group layout: [uint32 clock hand][4 bytes padding][slot]...
+    Slot layout:  [uint64 key hash][double expires at][uint32 value length]
+                  [uint16 key length][uint8 referenced][padding][key][value]
+
+    Expiration times are absolute, so the clock (default time.time) must be
+    shared by all processes.
+    """
+
+    GROUP_HEADER = struct.Struct('<I4x')
+    ENTRY = struct.Struct('<QdIHBx')
+    # Offset of the referenced flag within a slot
+    REFERENCED = 22
+
+    def __init__(self, path, capacity=4096, slot_size=512, group_size=8, stripes=64, clock=time.time):
+        """
+        :param path: file path, preferably on tmpfs (/dev/shm)
+        :param capacity: number of slots (maximum number of entries)
+        :param slot_size: size of a slot in bytes, limits size of entries
+        :param group_size: number of slots a key can be stored in
+        :param stripes: number of locks
+        :param clock: function returning current time in seconds
+        """
+        if slot_size <= self.ENTRY.size:
+            raise ValueError('Slot size must be bigger than %d bytes' % self.ENTRY.size)
+        self.slot_size = slot_size
+        self.group_size = group_size
+        self.groups = max(1, capacity // group_size)
+        self.group_bytes = self.GROUP_HEADER.size + group_size * slot_size
+        self.clock = clock
+        self.stats = CacheStats()
+        self.memory = SharedMemory(path, self.groups * self.group_bytes, stripes)
+
+    def get(self, key, default=None):
+        """
+        :param key: str
+        :param default: value returned on miss
+        """
+        hashed, encoded = self._key(key)
+        with self._group(hashed) as (memory, start):
+            offset = self._find(memory, start, hashed, encoded)
+            if offset is None:
+                self.stats.misses += 1
+                return default
+            value_length = self.ENTRY.unpack_from(memory, offset)[2]
+            memory[offset + self.REFERENCED] = 1
+            position = offset + self.ENTRY.size + len(encoded)
+            data = memory[position:position + value_length]
+            self.stats.hits += 1
+
+        return pickle.loads(data)
+
+    def set(self, key, value, ttl=None) -> bool:
+        """
+        :param key: str
+        :param value: picklable value
+        :param ttl: seconds after which entry expires, None for no expiration
+        :return: True if the value has been stored
+        """
+        hashed, encoded = self._key(key)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if not self._fits(encoded, data):
+            return False
+        with self._group(hashed) as (memory, start):
+            offset = self._find(memory, start, hashed, encoded)
+            if offset is None:
+                offset = self._victim(memory, start)
+            self._write(memory, offset, hashed, encoded, data, ttl)
+
+        return True
+
+    def add(self, key, value, ttl=None) -> bool:
+        """ Stores value only if there is no (not expired) entry for the key.
+        :return: True if the value has been stored
+        """
+        hashed, encoded = self._key(key)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if not self._fits(encoded, data):
+            return False
+        with self._group(hashed) as (memory, start):
+            if self._find(memory, start, hashed, encoded) is not None:
+                return False
+            self._write(memory, self._victim(memory, start), hashed, encoded, data, ttl)
+
+        return True
+
+    def incr(self, key, delta=1, ttl=None) -> int:
+        """ Atomically (across processes) increments integer value, missing value is treated as 0.
+        :return: new value
+        :raise ValueError: when key and new value do not fit in a slot
+        """
+        hashed, encoded = self._key(key)
+        with self._group(hashed) as (memory, start):
+            offset = self._find(memory, start, hashed, encoded)
+            value = delta
+            if offset is not None:
+                _, expires, value_length, _, _ = self.ENTRY.unpack_from(memory, offset)
+                position = offset + self.ENTRY.size + len(encoded)
+                value += pickle.loads(memory[position:position + value_length])
+                ttl = expires - self.clock() if expires else ttl
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            if not self._fits(encoded, data):
+                raise ValueError('Counter %r does not fit in a slot of %d bytes' % (key, self.slot_size))
+            if offset is None:
+                offset = self._victim(memory, start)
+            self._write(memory, offset, hashed, encoded, data, ttl)
+
+        return value
+
+    def delete(self, key) -> bool:
+        hashed, encoded = self._key(key)
+        with self._group(hashed) as (memory, start):
+            offset = self._find(memory, start, hashed, encoded)
+            if offset is None:
+                return False
+            self.ENTRY.pack_into(memory, offset, 0, 0.0, 0, 0, 0)
+
+        return True
+
+    def clear(self):
+        with ExitStack() as stack:
+            for stripe in range(self.memory.stripes):
+                stack.enter_context(self.memory.locked(stripe))
+            self.memory.map[:] = bytes(self.memory.size)
+
+    def __contains__(self, key):
+        hashed, encoded = self._key(key)
+        with self._group(hashed) as (memory, start):
+            return self._find(memory, start, hashed, encoded) is not None
+
+    def entries(self) -> list:
+        """ Not expired entries, values are unpickled.
+        :return: list of (key, value, expires at or None) tuples
+        """
+        entries = []
+        for group in range(self.groups):
+            start = group * self.group_bytes
+            with self.memory.locked(group % self.memory.stripes) as memory:
+                now = self.clock()
+                for offset in self._slots(start):
+                    slot_hash, expires, value_length, key_length, _ = self.ENTRY.unpack_from(memory, offset)
+                    if slot_hash == 0 or (expires and expires <= now):
+                        continue
+                    position = offset + self.ENTRY.size
+                    entries.append((memory[position:position + key_length],
+                                    memory[position + key_length:position + key_length + value_length],
+                                    expires or None))
+
+        return [(key.decode('utf-8'), pickle.loads(data), expires) for key, data, expires in entries]
+
+    def load(self, entries):
+        """ Stores entries returned by entries(), expired ones are skipped.
+        :param entries: iterable of (key, value, expires at or None) tuples
+        """
+        for key, value, expires in entries:
+            now = self.clock()
+            if expires is None or expires > now:
+                self.set(key, value, expires - now if expires is not None else None)
+
+    def _key(self, key):
+        encoded = key.encode('utf-8')
+
+        return hash_key(encoded), encoded
+
+    def _fits(self, encoded, data):
+        return self.ENTRY.size + len(encoded) + len(data) <= self.slot_size
+
+    @contextmanager
+    def _group(self, hashed):
+        """ Holds lock of the key's group.
+        :return: memory map and offset of the group
+        """
+        group = hashed % self.groups
+        with self.memory.locked(group % self.memory.stripes) as memory:
+            yield memory, group * self.group_bytes
+
+    def _slots(self, start):
+        first = start + self.GROUP_HEADER.size
+        return range(first, first + self.group_size * self.slot_size, self.slot_size)
+
+    def _find(self, memory, start, hashed, encoded):
+        now = self.clock()
+        for offset in self._slots(start):
+            slot_hash, expires, _, key_length, _ = self.ENTRY.unpack_from(memory, offset)
+            if slot_hash != hashed:
+                continue
+            position = offset + self.ENTRY.size
+            if memory[position:position + key_length] != encoded:
+                continue
+            if expires and expires <= now:
+                self.ENTRY.pack_into(memory, offset, 0, 0.0, 0, 0, 0)
+                return None
+            return offset
+
+        return None
+
+    def _victim(self, memory, start):
+        """ Finds slot for a new entry: empty or expired slot, otherwise one chosen by CLOCK.
+        """
+        now = self.clock()
+        slots = self._slots(start)
+        for offset in slots:
+            slot_hash, expires = self.ENTRY.unpack_from(memory, offset)[:2]
+            if slot_hash == 0 or (expires and expires <= now):
+                return offset
+
+        hand = self.GROUP_HEADER.unpack_from(memory, start)[0] % self.group_size
+        while True:
+            offset = slots[hand]
+            hand = (hand + 1) % self.group_size
+            if memory[offset + self.REFERENCED]:
+                memory[offset + self.REFERENCED] = 0
+                continue
+            self.GROUP_HEADER.pack_into(memory, start, hand)
+            self.stats.evictions += 1
+            return offset
+
+    def _write(self, memory, offset, hashed, encoded, data, ttl):
+        expires = self.clock() + ttl if ttl is not None else 0.0
+        self.ENTRY.pack_into(memory, offset, hashed, expires, len(data), len(encoded), 1)
+        position = offset + self.ENTRY.size
+        memory[position:position + len(encoded)] = encoded
+        memory[position + len(encoded):position + len(encoded) + len(data)] = data
+
+
+class Tags:
+    """ Version stamps of tags, cached values remember stamps of their tags and are
+    valid as long as none of them changed. Invalidating a tag gives it a new stamp,
+    so all values tagged with it become stale at once:
+
+        tags = Tags(SharedMemoryCache('/dev/shm/app.tags'))
+        versions = tags.versions(['users', 'users:1'])
+        ...
+        tags.invalidate('users:1')
+        tags.valid(['users', 'users:1'], versions)  # False
+
+    Tag `name:id` also depends on `name:*`, invalidating `users:*` makes stale every
+    value tagged with any `users:<id>`. Stamps are random, a stamp lost from the
+    backend (evicted, cleared) is replaced with a new one, so values of such tag
+    become stale instead of being wrongly considered valid.
+
+    With SharedMemoryCache backend invalidations are visible to all processes of
+    the host. Stamps kept in process memory do not survive restart, tagged values
+    loaded from a snapshot (see bolt.snapshot) are then stale.
+    """
+    PREFIX = 'bolt:tag:'
+
+    def __init__(self, backend=None):
+        """
+        :param backend: MemoryCache or SharedMemoryCache keeping the stamps
+        """
+        self.backend = backend if backend is not None else MemoryCache(maxsize=100000)
+
+    def versions(self, tags) -> tuple:
+        """
+        :param tags: list of tags
+        :return: current stamps of the tags
+        """
+        versions = []
+        for tag in self.expand(tags):
+            key = self.PREFIX + tag
+            version = self.backend.get(key)
+            if version is None:
+                self.backend.add(key, random.getrandbits(63))
+                version = self.backend.get(key)
+            versions.append(version)
+
+        return tuple(versions)
+
+    def valid(self, tags, versions) -> bool:
+        """ Checks whether none of the tags has been invalidated since versions were read.
+        """
+        return self.versions(tags) == versions
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.set(self.PREFIX + tag, random.getrandbits(63))
+
+    @staticmethod
+    def expand(tags):
+        expanded = []
+        for tag in tags:
+            expanded.append(tag)
+            name, separator, id = tag.partition(':')
+            if separator and id != '*':
+                expanded.append(name + ':*')
+
+        return expanded
+
+
+def entity_tag(collection, id) -> str:
+    """ Tag of a single document, published by bolt.odm when the document is written.
+    :param collection: collection name
+    :param id: document id
+    """
+    return '%s:%s' % (collection, id)
+
+
+def invalidate(*tags):
+    """ Makes values tagged with any of the tags stale, in every process sharing
+    tag versions backend (see Memoization).
+    """
+    CachedFunction.tags.invalidate(*tags)
+
+
+_ADDRESS = re.compile(r' at 0x[0-9a-fA-F]+>')
+
+
+def stable_repr(value) -> str:
+    """ Repr of a value usable in cache keys. Values whose repr is based on their
+    memory address (objects without own __repr__, functions) are rejected, the
+    address can be reused by another object once the value is garbage-collected.
+    :raise TypeError: when value has no stable repr
+    """
+    if isinstance(value, (list, tuple)):
+        items = ', '.join(stable_repr(item) for item in value)
+        return '[%s]' % items if isinstance(value, list) else '(%s)' % items
+    if isinstance(value, (set, frozenset)):
+        return '{%s}' % ', '.join(sorted(stable_repr(item) for item in value))
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join(sorted('%s: %s' % (stable_repr(key), stable_repr(item))
+                                         for key, item in value.items()))
+    represented = repr(value)
+    if type(value).__repr__ is object.__repr__ or _ADDRESS.search(represented):
+        raise TypeError('%s has no stable repr, cached function needs key function for it' %
+                        type(value).__name__)
+
+    return represented
+
+
+_request_caches = ContextVar('bolt_request_caches', default=None)
+
+_MISSING = object()
+
+
+class _Pending:
+    """ Cache miss being filled by the first caller, stored under its key only
+    until the result is cached so callers missing meanwhile share it.
+    """
+    def __init__(self):
+        self.done = Event()
+        self.value = None
+        self.error = None
+
+
+class CachedFunction:
+    """ Function or method memoized by `cached` decorator.
+    """
+    # Set by Memoization, records calls of all cached functions
+    metric = None
+    # Versions of tags, Memoization can replace it with one shared by workers
+    tags = Tags()
+    instances = []
+
+    def __init__(self, func, ttl=None, maxsize=1024, scope='app', key=None, cache=None, tags=None):
+        if scope not in ('app', 'request'):
+            raise ValueError('Scope must be either "app" or "request"')
+        update_wrapper(self, func)
+        self.func = func
+        self.name = '%s.%s' % (func.__module__, func.__qualname__)
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.scope = scope
+        self.key_func = key
+        self.tags_func = tags
+        self.cache = cache if cache is not None or scope == 'request' else MemoryCache(maxsize)
+        self.stats = CacheStats()
+        self._pending = {}
+        self._lock = Lock()
+        CachedFunction.instances.append(self)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return BoundCachedFunction(self, instance)
+
+    def __call__(self, *args, **kwargs):
+        return self.call(None, args, kwargs)
+
+    def call(self, instance, args, kwargs):
+        backend = self.backend()
+        if backend is None:
+            return self._invoke(instance, args, kwargs)
+        key = self.key(args, kwargs)
+        value = self._lookup(backend, key)
+        if value is not _MISSING:
+            self._record('hit')
+            return value
+        self._record('miss')
+        if self.scope == 'request':
+            return self._invoke_and_store(backend, key, instance, args, kwargs)
+
+        return self._compute(backend, key, instance, args, kwargs)
+
+    def key(self, args, kwargs) -> str:
+        """ Cache key of a call, the instance of a method is not part of the key.
+        """
+        if self.key_func is not None:
+            return '%s(%s)' % (self.name, self.key_func(*args, **kwargs))
+        return '%s(%s)' % (self.name, ', '.join([stable_repr(arg) for arg in args] +
+                                                ['%s=%s' % (name, stable_repr(kwargs[name])) for name in sorted(kwargs)]))
+
+    def backend(self):
+        if self.scope == 'app':
+            return self.cache
+        caches = _request_caches.get()
+        if caches is None:
+            return None
+        backend = caches.get(self)
+        if backend is None:
+            backend = caches[self] = MemoryCache(self.maxsize)
+
+        return backend
+
+    def invalidate(self, *args, **kwargs):
+        """ Removes cached result of a call with given arguments.
+        """
+        backend = self.backend()
+        if backend is not None:
+            backend.delete(self.key(args, kwargs))
+
+    def clear(self):
+        """ Removes all cached results, note that cache passed to the decorator
+        is cleared as a whole.
+        """
+        backend = self.backend()
+        if backend is not None:
+            backend.clear()
+
+    def _compute(self, backend, key, instance, args, kwargs):
+        # Concurrent misses of one key wait for a single computation (within the process)
+        with self._lock:
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _Pending()
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = self._invoke_and_store(backend, key, instance, args, kwargs)
+            return pending.value
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+
+    def _lookup(self, backend, key):
+        entry = backend.get(key, _MISSING)
+        if entry is _MISSING or self.tags_func is None:
+            return entry
+        value, tags, versions = entry
+        if not CachedFunction.tags.valid(tags, versions):
+            return _MISSING
+
+        return value
+
+    def _invoke_and_store(self, backend, key, instance, args, kwargs):
+        if self.tags_func is None:
+            value = self._invoke(instance, args, kwargs)
+            backend.set(key, value, self.ttl)
+            return value
+
+        tags = list(self.tags_func(*args, **kwargs) if callable(self.tags_func) else self.tags_func)
+        # Versions are read before the value is computed, so invalidation during computation is not lost
+        versions = CachedFunction.tags.versions(tags)
+        value = self._invoke(instance, args, kwargs)
+        backend.set(key, (value, tags, versions), self.ttl)
+
+        return value
+
+    def _invoke(self, instance, args, kwargs):
+        if instance is None:
+            return self.func(*args, **kwargs)
+        return self.func(instance, *args, **kwargs)
+
+    def _record(self, result):
+        with self._lock:
+            if result == 'hit':
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+        if CachedFunction.metric is not None:
+            CachedFunction.metric.labels(self.name, result).inc()
+
+
+class BoundCachedFunction:
+    """ Cached method bound to an instance.
+    """
+    __slots__ = ('cached', 'instance')
+
+    def __init__(self, cached, instance):
+        self.cached = cached
+        self.instance = instance
+
+    def __call__(self, *args, **kwargs):
+        return self.cached.call(self.instance, args, kwargs)
+
+    def invalidate(self, *args, **kwargs):
+        self.cached.invalidate(*args, **kwargs)
+
+    def clear(self):
+        self.cached.clear()
+
+    @property
+    def stats(self):
+        return self.cached.stats
+
+
+def cached(ttl=None, maxsize=1024, scope='app', key=None, cache=None, tags=None):
+    """ Memoizes results of a function or a service method:
+
+        class PermissionService:
+            @bolt.cached(ttl=60, key=lambda user, action: '%s:%s' % (user.id, action))
+            def allowed(self, user, action):
+                ...
+
+        permissions.allowed(user, 'edit')
+        permissions.allowed.invalidate(user, 'edit')
+
+    Results can be tagged, a result is stale once any of its tags is invalidated
+    (see Tags). Writes made with bolt.odm invalidate collection and document tags
+    (see entity_tag), so results depending on documents can be cached for long:
+
+        @bolt.cached(ttl=3600, tags=lambda id: ['users', entity_tag('users', id)])
+        def get(self, id):
+            ...
+
+    Results of `app` scope are shared by all instances of the service (services
+    are created per request) and all requests. Results of `request` scope live
+    until the end of the request and require Memoization plugin, without it
+    the function is not memoized. Concurrent callers missing the same key wait
+    for a single computation instead of computing it each.
+
+    :param ttl: seconds after which result expires, None for no expiration
+    :param maxsize: maximum number of results kept, when cache is not given
+    :param scope: 'app' or 'request'
+    :param key: function receiving call's arguments (without self) and returning str,
+                by default key is built from repr of the arguments (see stable_repr)
+    :param cache: MemoryCache or SharedMemoryCache for app scope, e.g. shared by workers
+    :param tags: list of tags or function receiving call's arguments (without self) and returning it
+    """
+    def decorator(func):
+        return CachedFunction(func, ttl, maxsize, scope, key, cache, tags)
+
+    return decorator
+
+
+class Memoization:
+    """ Enables request scope of cached functions and exports their hits and misses
+    to metrics. Tag versions are kept in process memory unless `tags` backend is
+    given, with SharedMemoryCache invalidations made by one worker are visible
+    to all workers of the host.
+
+        app.use(Memoization(registry=registry, tags=SharedMemoryCache('/dev/shm/app.tags')))
+    """
+    def __init__(self, registry=None, tags=None):
+        """
+        :param registry: bolt.metrics.MetricsRegistry
+        :param tags: MemoryCache or SharedMemoryCache keeping versions of tags
+        """
+        if tags is not None:
+            CachedFunction.tags = Tags(tags)
+        if registry is not None:
+            CachedFunction.metric = registry.counter('bolt_cached_calls_total',
+                                                     'Calls of cached functions by result.', ['function', 'result'])
+
+    def __call__(self, app):
+        app.intercept(self.intercept)
+
+    def intercept(self, request, handler):
+        token = _request_caches.set({})
+        try:
+            return handler(request)
+        finally:
+            _request_caches.reset(token)
+
+    @staticmethod
+    def stats() -> dict:
+        """
+        :return: hits and misses of every cached function
+        """
+        return {function.name: function.stats.as_dict() for function in CachedFunction.instances}
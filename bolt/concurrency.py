@@ -0,0 +1,488 @@
+"""
+Admission control for concurrently processed requests.
+"""
+from .http import Response, HttpException
+from .utils import find_clsname
+from collections import deque
+from threading import Lock, Event, BoundedSemaphore
+import copy
+import math
+import time
+
+
+class Lane:
+    """ Scheduling class of a group of routes.
+    """
+    def __init__(self, limit=None, reserved=0, weight=1):
+        """
+        :param limit: maximum number of requests of the lane processed at once
+        :param reserved: number of slots which can be used only by this lane
+        :param weight: share of freed slots given to waiting requests of the lane
+        """
+        if weight <= 0:
+            raise ValueError('Lane weight must be greater than zero')
+        self.limit = limit
+        self.reserved = reserved
+        self.weight = weight
+        self.running = 0
+        self.rejected = 0
+        self.pass_value = 0.0
+        self.waiting = deque()
+
+
+class LaneScheduler:
+    """ Schedules requests from per-lane queues, so slow bulk routes can never take
+    every worker thread. Routes declare their lane in settings:
+
+        @app.get('/report', lane='bulk')
+        def report(self):
+            ...
+
+        app.use(LaneScheduler(capacity=16, lanes={
+            'default': Lane(reserved=4),
+            'bulk': Lane(limit=8, weight=1)
+        }))
+
+    Capacity should match number of threads serving requests (see serve --threads).
+    A request is started if there is a free slot which is not reserved for another
+    lane and its lane is below its limit. A waiting request keeps its serving
+    thread, so by default requests which cannot start are rejected right away with
+    503, and requests of a lane which reached its limit are always rejected right
+    away. With timeout requests may wait in the lane's queue for a freed slot,
+    freed slots are handed to waiting lanes proportionally to their weights.
+    Requests waiting longer than timeout are rejected with 503.
+    """
+
+    LANE = 'lane'
+    DEFAULT_LANE = 'default'
+
+    def __init__(self, capacity, lanes=None, timeout=0.0, retry_after=1):
+        """
+        :param capacity: number of requests processed at once
+        :param lanes: dict mapping lane name to Lane, routes without lane use 'default' lane
+        :param timeout: maximum time in seconds a request waits for a slot, 0 rejects it immediately
+        :param retry_after: Retry-After value (seconds) sent with rejected requests
+        """
+        self.capacity = capacity
+        self.lanes = dict(lanes or {})
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.running = 0
+        self._virtual_time = 0.0
+        self._lock = Lock()
+        if self.DEFAULT_LANE not in self.lanes:
+            self.lanes[self.DEFAULT_LANE] = Lane()
+        if sum(lane.reserved for lane in self.lanes.values()) >= capacity:
+            raise ValueError('Reserved slots have to leave at least one shared slot')
+        self._app = None
+
+    def __call__(self, app):
+        self._app = app
+        app.intercept(self.intercept)
+
+    def intercept(self, request, handler):
+        route = self._app.match(request)
+        lane = route.get(self.LANE) if route is not None else None
+        lane = lane or self.DEFAULT_LANE
+        if not self.acquire(lane):
+            raise HttpException('Service Unavailable', Response.HTTP_SERVICE_UNAVAILABLE,
+                                {'Retry-After': str(self.retry_after)})
+        try:
+            return handler(request)
+        finally:
+            self.release(lane)
+
+    def acquire(self, name, timeout=None):
+        """ Waits for a free slot in the lane.
+        :param name: lane name
+        :param timeout: maximum wait in seconds, defaults to scheduler's timeout
+        :return: bool whether the slot was acquired
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            lane = self._lane(name)
+            if not lane.waiting and self._admissible(lane):
+                self._start(lane)
+                return True
+            if timeout <= 0 or (lane.limit is not None and lane.running >= lane.limit):
+                # Lane over its share is shed, queued requests would only hold serving threads
+                lane.rejected += 1
+                return False
+            if not lane.waiting:
+                lane.pass_value = max(lane.pass_value, self._virtual_time)
+            waiter = Event()
+            lane.waiting.append(waiter)
+
+        if waiter.wait(timeout):
+            return True
+
+        with self._lock:
+            if waiter.is_set():
+                return True
+            lane.waiting.remove(waiter)
+            lane.rejected += 1
+            return False
+
+    def release(self, name):
+        with self._lock:
+            lane = self._lane(name)
+            lane.running -= 1
+            self.running -= 1
+            self._schedule()
+
+    def stats(self):
+        with self._lock:
+            return {name: {'running': lane.running, 'waiting': len(lane.waiting), 'rejected': lane.rejected}
+                    for name, lane in self.lanes.items()}
+
+    def _lane(self, name):
+        if name not in self.lanes:
+            self.lanes[name] = Lane()
+        return self.lanes[name]
+
+    def _admissible(self, lane):
+        if self.running >= self.capacity:
+            return False
+        if lane.limit is not None and lane.running >= lane.limit:
+            return False
+        reserved = sum(max(0, other.reserved - other.running) for other in self.lanes.values() if other is not lane)
+
+        return self.capacity - self.running > reserved
+
+    def _start(self, lane):
+        lane.running += 1
+        self.running += 1
+        lane.pass_value += 1.0 / lane.weight
+
+    def _schedule(self):
+        while True:
+            candidates = [lane for lane in self.lanes.values() if lane.waiting and self._admissible(lane)]
+            if not candidates:
+                return
+            lane = min(candidates, key=lambda candidate: candidate.pass_value)
+            self._virtual_time = lane.pass_value
+            self._start(lane)
+            lane.waiting.popleft().set()
+
+
+class Bulkhead:
+    """ Limits number of requests processed at once by a route or a group of routes.
+    """
+    def __init__(self, name, limit, timeout=0.0):
+        """
+        :param name: bulkhead name
+        :param limit: maximum number of requests processed at once
+        :param timeout: maximum time in seconds excess requests wait, 0 rejects them immediately
+        """
+        self.name = name
+        self.limit = limit
+        self.timeout = timeout
+        self.in_flight = 0
+        self.rejected = 0
+        self._semaphore = BoundedSemaphore(limit)
+        self._lock = Lock()
+
+    def acquire(self):
+        if self.timeout:
+            acquired = self._semaphore.acquire(timeout=self.timeout)
+        else:
+            acquired = self._semaphore.acquire(blocking=False)
+        with self._lock:
+            if acquired:
+                self.in_flight += 1
+            else:
+                self.rejected += 1
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+
+class Bulkheads:
+    """ Isolates routes from each other by limiting their concurrency, so one route
+    waiting on a slow dependency cannot take all worker threads.
+
+    Limits are set in route settings:
+
+        @app.get('/search', concurrency=4, concurrency_timeout=0.1)
+        def search(self):
+            ...
+
+    or passed to the constructor keyed by route name or controller's fully qualified
+    class name, in which case all routes of the controller share one bulkhead:
+
+        app.use(Bulkheads({'myapp.controllers.ReportController': 2}))
+
+    Routes sharing `bulkhead` setting share one limit as well. Requests over the limit
+    wait up to the timeout and are rejected with 503 afterwards. In-flight and rejected
+    requests are reported by stats() and, if registry is passed, as metrics.
+    """
+
+    CONCURRENCY = 'concurrency'
+    CONCURRENCY_TIMEOUT = 'concurrency_timeout'
+    BULKHEAD = 'bulkhead'
+
+    def __init__(self, limits=None, timeout=0.0, retry_after=1, registry=None):
+        """
+        :param limits: dict mapping route name or controller class name to the limit
+        :param timeout: default time excess requests wait for a slot
+        :param retry_after: Retry-After value (seconds) sent with rejected requests
+        :param registry: bolt.metrics.MetricsRegistry
+        """
+        self.limits = limits or {}
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.bulkheads = {}
+        self._lock = Lock()
+        self._app = None
+        self._in_flight = None
+        self._rejected = None
+        if registry is not None:
+            self._in_flight = registry.gauge('bolt_bulkhead_in_flight', 'Requests processed by bulkhead.',
+                                             ['bulkhead'])
+            self._rejected = registry.counter('bolt_bulkhead_rejected_total', 'Requests rejected by bulkhead.',
+                                              ['bulkhead'])
+
+    def __call__(self, app):
+        self._app = app
+        app.intercept(self.intercept)
+
+    def intercept(self, request, handler):
+        route = self._app.match(request)
+        bulkhead = self.bulkhead(route) if route is not None else None
+        if bulkhead is None:
+            return handler(request)
+
+        if not bulkhead.acquire():
+            if self._rejected is not None:
+                self._rejected.labels(bulkhead.name).inc()
+            raise HttpException('Service Unavailable', Response.HTTP_SERVICE_UNAVAILABLE,
+                                {'Retry-After': str(self.retry_after)})
+        if self._in_flight is not None:
+            self._in_flight.labels(bulkhead.name).inc()
+        try:
+            return handler(request)
+        finally:
+            bulkhead.release()
+            if self._in_flight is not None:
+                self._in_flight.labels(bulkhead.name).dec()
+
+    def bulkhead(self, route) -> Bulkhead:
+        """ Returns bulkhead guarding the route or None if route's concurrency is not limited.
+        :param route: Route
+        :return: Bulkhead
+        """
+        name, limit = self._limit(route)
+        if limit is None:
+            return None
+        if name not in self.bulkheads:
+            timeout = route.get(self.CONCURRENCY_TIMEOUT)
+            with self._lock:
+                if name not in self.bulkheads:
+                    self.bulkheads[name] = Bulkhead(name, limit, self.timeout if timeout is None else timeout)
+
+        return self.bulkheads[name]
+
+    def stats(self):
+        with self._lock:
+            return {name: {'limit': bulkhead.limit, 'in_flight': bulkhead.in_flight, 'rejected': bulkhead.rejected}
+                    for name, bulkhead in self.bulkheads.items()}
+
+    def _limit(self, route):
+        limit = route.get(self.CONCURRENCY)
+        if limit is not None:
+            return route.get(self.BULKHEAD) or route.name, limit
+        if route.name in self.limits:
+            return route.name, self.limits[route.name]
+        if self.limits:
+            controller = find_clsname(route.callback)
+            if controller in self.limits:
+                return controller, self.limits[controller]
+
+        return None, None
+
+
+class AIMDLimit:
+    """ Additive increase, multiplicative decrease. Limit grows by `increase` while
+    requests are fast and the limit is utilized, and is multiplied by `backoff`
+    once latency exceeds the threshold or a request fails.
+    """
+    def __init__(self, initial=20, min_limit=1, max_limit=1000, latency_threshold=1.0, backoff=0.9, increase=1):
+        """
+        :param initial: initial limit
+        :param min_limit: minimum limit
+        :param max_limit: maximum limit
+        :param latency_threshold: latency in seconds considered as overload
+        :param backoff: factor applied to the limit on overload
+        :param increase: value added to the limit when requests are fast
+        """
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.backoff = backoff
+        self.increase = increase
+
+    def update(self, latency, in_flight, dropped=False):
+        if dropped or latency > self.latency_threshold:
+            self.limit = max(self.min_limit, int(self.limit * self.backoff))
+        elif in_flight * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + self.increase)
+
+        return self.limit
+
+
+class GradientLimit:
+    """ Adjusts the limit by the ratio of the lowest observed latency (latency without
+    queueing) to the current latency. Ratio close to 1 means requests are not waiting
+    for anything and the limit can grow by a small queue allowance, growing latency
+    shrinks the limit proportionally.
+    """
+    def __init__(self, initial=20, min_limit=1, max_limit=1000, smoothing=0.2, tolerance=1.5, probe_interval=1000):
+        """
+        :param initial: initial limit
+        :param min_limit: minimum limit
+        :param max_limit: maximum limit
+        :param smoothing: weight of a new estimate (0..1)
+        :param tolerance: latency increase (relative to the lowest one) tolerated before shrinking the limit
+        :param probe_interval: number of samples after which lowest latency is measured again
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.probe_interval = probe_interval
+        self.min_latency = None
+        self._samples = 0
+
+    def update(self, latency, in_flight, dropped=False):
+        self._samples += 1
+        if self.min_latency is None or latency < self.min_latency or self._samples >= self.probe_interval:
+            self.min_latency = latency
+            self._samples = 0
+
+        if dropped:
+            estimate = self.limit / 2
+        else:
+            gradient = max(0.5, min(1.0, self.tolerance * self.min_latency / latency if latency > 0 else 1.0))
+            if gradient >= 1.0 and in_flight * 2 < self.limit:
+                # Limit is not utilized, latency tells nothing about larger limits
+                return int(self.limit)
+            estimate = self.limit * gradient + math.sqrt(self.limit)
+
+        self.limit = self.limit * (1 - self.smoothing) + estimate * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+
+        return int(self.limit)
+
+
+class AdaptiveLimit:
+    """ Requests admitted under one adaptive limit (global or route's) and the
+    algorithm deciding how many of them may run at once.
+    """
+    def __init__(self, name, algorithm):
+        self.name = name
+        self.algorithm = algorithm
+        self.in_flight = 0
+        self.rejected = 0
+
+    @property
+    def limit(self):
+        return int(self.algorithm.limit)
+
+
+class AdaptiveLimiter:
+    """ Limits concurrency with a limit continuously adjusted from observed latency,
+    so the service stays near its throughput knee without manual tuning. Requests
+    over the current limit are rejected with 503.
+
+        app.use(AdaptiveLimiter(AIMDLimit(initial=20, latency_threshold=0.25)))
+        app.use(AdaptiveLimiter(GradientLimit(), per_route=True))
+
+    Failed requests (exceptions, 503 and 504 responses) are reported to the algorithm
+    as dropped.
+    """
+    GLOBAL = '*'
+    DROPPED_STATUSES = (Response.HTTP_SERVICE_UNAVAILABLE, Response.HTTP_GATEWAY_TIMEOUT)
+
+    def __init__(self, algorithm=None, per_route=False, clock=time.monotonic, retry_after=1, registry=None):
+        """
+        :param algorithm: AIMDLimit or GradientLimit (or any object with `limit` and `update`),
+                          copied for every route if per_route is set
+        :param per_route: keep separate limit for every route
+        :param clock: function returning current time in seconds
+        :param retry_after: Retry-After value (seconds) sent with rejected requests
+        :param registry: bolt.metrics.MetricsRegistry
+        """
+        self.algorithm = algorithm or AIMDLimit()
+        self.per_route = per_route
+        self.clock = clock
+        self.retry_after = retry_after
+        self.limits = {}
+        self._lock = Lock()
+        self._app = None
+        self._limit_gauge = None
+        self._rejected = None
+        if registry is not None:
+            self._limit_gauge = registry.gauge('bolt_adaptive_limit', 'Current concurrency limit.', ['limit'])
+            self._rejected = registry.counter('bolt_adaptive_limit_rejected_total',
+                                              'Requests rejected by adaptive limit.', ['limit'])
+
+    def __call__(self, app):
+        self._app = app
+        app.intercept(self.intercept)
+
+    def intercept(self, request, handler):
+        name = self.GLOBAL
+        if self.per_route:
+            route = self._app.match(request)
+            if route is None:
+                return handler(request)
+            name = route.name
+
+        limit = self.acquire(name)
+        if limit is None:
+            raise HttpException('Service Unavailable', Response.HTTP_SERVICE_UNAVAILABLE,
+                                {'Retry-After': str(self.retry_after)})
+        started = self.clock()
+        dropped = True
+        try:
+            response = handler(request)
+            dropped = int(response.status) in self.DROPPED_STATUSES
+            return response
+        finally:
+            self.release(limit, self.clock() - started, dropped)
+
+    def acquire(self, name):
+        """ Takes a slot of the limit.
+        :param name: limit name, route name or AdaptiveLimiter.GLOBAL
+        :return: AdaptiveLimit or None if the limit is reached
+        """
+        with self._lock:
+            if name not in self.limits:
+                algorithm = self.algorithm if name == self.GLOBAL else copy.deepcopy(self.algorithm)
+                self.limits[name] = AdaptiveLimit(name, algorithm)
+            limit = self.limits[name]
+            if limit.in_flight >= limit.limit:
+                limit.rejected += 1
+                if self._rejected is not None:
+                    self._rejected.labels(name).inc()
+                return None
+            limit.in_flight += 1
+
+            return limit
+
+    def release(self, limit, latency, dropped=False):
+        with self._lock:
+            limit.algorithm.update(latency, limit.in_flight, dropped)
+            limit.in_flight -= 1
+            if self._limit_gauge is not None:
+                self._limit_gauge.labels(limit.name).set(limit.limit)
+
+    def stats(self):
+        with self._lock:
+            return {name: {'limit': limit.limit, 'in_flight': limit.in_flight, 'rejected': limit.rejected}
+                    for name, limit in self.limits.items()}
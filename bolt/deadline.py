@@ -0,0 +1,162 @@
+"""
+Per-request deadlines. Deadline of the current request is kept in a context
+variable, so services and ODM queries can stop working on requests nobody
+waits for anymore.
+"""
+from .http import Response, HttpException
+from contextlib import contextmanager
+from contextvars import ContextVar
+import math
+import time
+
+
+_current_deadline = ContextVar('bolt_current_deadline', default=None)
+
+
+class DeadlineExceeded(HttpException):
+    def __init__(self, msg='Gateway Timeout'):
+        super().__init__(msg, Response.HTTP_GATEWAY_TIMEOUT)
+
+
+class Deadline:
+    """ Point in time after which result of the work is useless. Deadline without
+    timeout never expires.
+
+        class ReportController:
+            def __init__(self, deadline: Deadline):
+                self.deadline = deadline
+
+            def __call__(self):
+                for chunk in chunks:
+                    self.deadline.check()
+                    ...
+    """
+    def __init__(self, timeout=None, clock=time.monotonic):
+        """
+        :param timeout: seconds from now, None for no deadline
+        :param clock: function returning current time in seconds
+        """
+        self.clock = clock
+        self.expires_at = clock() + timeout if timeout is not None else None
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and self.clock() >= self.expires_at
+
+    def remaining(self):
+        """
+        :return: seconds left (0 once expired) or None if there is no deadline
+        """
+        if self.expires_at is None:
+            return None
+
+        return max(0.0, self.expires_at - self.clock())
+
+    def max_time_ms(self):
+        """ Remaining time in milliseconds, suitable for MongoDB's maxTimeMS.
+        :return: int >= 1 or None if there is no deadline
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+
+        return max(1, int(remaining * 1000))
+
+    def check(self):
+        """ Raises DeadlineExceeded once the deadline has passed.
+        """
+        if self.expired:
+            raise DeadlineExceeded()
+
+    @contextmanager
+    def scope(self):
+        """ Makes deadline current for the code in the block.
+        """
+        token = _current_deadline.set(self)
+        try:
+            yield self
+        finally:
+            _current_deadline.reset(token)
+
+
+def current_deadline():
+    """
+    :return: Deadline of the current request or None
+    """
+    return _current_deadline.get()
+
+
+def deadline_service(service_locator):
+    """ Service factory of Deadline, registered by Deadlines. Requests without
+    deadline get one which never expires.
+    """
+    return _current_deadline.get() or Deadline()
+
+
+class Deadlines:
+    """ Sets deadline of every request from the route's `timeout` setting or from
+    the request header (seconds), whichever is sooner, and returns 504 once
+    the deadline has passed.
+
+        app.use(Deadlines(default=30))
+
+        @app.get('/report', timeout=5)
+        def report(deadline: Deadline):
+            ...
+
+    Deadline is available in DI as bolt.deadline.Deadline and honoured by
+    bolt.odm.Query operations through maxTimeMS.
+    """
+
+    TIMEOUT = 'timeout'
+    HEADER = 'X-Request-Timeout'
+
+    def __init__(self, default=None, header=HEADER, clock=time.monotonic):
+        """
+        :param default: timeout in seconds of routes without timeout setting
+        :param header: request header with timeout in seconds, None to ignore clients' timeouts
+        :param clock: function returning current time in seconds
+        """
+        self.default = default
+        self.header = header
+        self.clock = clock
+        self._app = None
+
+    def __call__(self, app):
+        self._app = app
+        app.service_locator.set(deadline_service, Deadline)
+        app.intercept(self.intercept)
+
+    def intercept(self, request, handler):
+        route = self._app.match(request)
+        timeout = self.timeout(request, route)
+        if timeout is None:
+            return handler(request)
+
+        deadline = Deadline(timeout, self.clock)
+        with deadline.scope():
+            deadline.check()
+            response = handler(request)
+        deadline.check()
+
+        return response
+
+    def timeout(self, request, route):
+        timeouts = []
+        if route is not None and route.get(self.TIMEOUT) is not None:
+            timeouts.append(route.get(self.TIMEOUT))
+        elif self.default is not None:
+            timeouts.append(self.default)
+        if self.header is not None:
+            value = request.get_header(self.header)
+            if value is not None:
+                try:
+                    timeout = float(value)
+                except ValueError:
+                    timeout = None
+                # nan would never expire, inf overflows maxTimeMS
+                if timeout is None or not math.isfinite(timeout) or timeout <= 0:
+                    raise HttpException('Invalid %s header' % self.header, Response.HTTP_BAD_REQUEST)
+                timeouts.append(timeout)
+
+        return min(timeouts) if timeouts else None
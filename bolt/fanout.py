@@ -0,0 +1,147 @@
+"""
+Parallel execution of independent calls made by a controller.
+"""
+from .deadline import current_deadline, DeadlineExceeded
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION, ALL_COMPLETED
+from contextvars import ContextVar, copy_context
+from threading import Lock
+from time import perf_counter
+import os
+
+
+_in_pool = ContextVar('bolt_fan_out_in_pool', default=False)
+
+
+class Parallel:
+    """ Runs independent calls in parallel and gathers their results, injectable into
+    controllers and services:
+
+        class DashboardController:
+            def __init__(self, parallel: Parallel, users: UserService, orders: OrderService):
+                ...
+
+            def __call__(self):
+                user, orders = self.parallel.gather(
+                    lambda: self.users.get(id),
+                    lambda: self.orders.recent(id)
+                )
+
+    Calls run in a copy of the caller's context, so request deadline and tracing
+    apply to them. Gathering stops with DeadlineExceeded once the request deadline
+    passes. Durations of the calls are available in `timings` after gather.
+    """
+    def __init__(self, fan_out: 'FanOut'):
+        self.fan_out = fan_out
+        self.timings = []
+
+    def gather(self, *calls, cancel_on_failure=None):
+        """
+        :param calls: callables without arguments
+        :param cancel_on_failure: cancel calls not yet started once any call fails,
+                                  defaults to FanOut's setting
+        :return: list of results in order of calls
+        """
+        if cancel_on_failure is None:
+            cancel_on_failure = self.fan_out.cancel_on_failure
+        timings = [{'call': getattr(call, '__name__', repr(call)), 'duration': None, 'status': 'pending'}
+                   for call in calls]
+        self.timings.extend(timings)
+
+        if _in_pool.get():
+            # Calls made from the pool run inline, waiting for the pool within the pool may deadlock
+            return [self._run(call, timing) for call, timing in zip(calls, timings)]
+
+        pool = self.fan_out.pool()
+        futures = [pool.submit(copy_context().run, self._run, call, timing) for call, timing in zip(calls, timings)]
+        deadline = current_deadline()
+        timeout = deadline.remaining() if deadline is not None else None
+        done, pending = wait(futures, timeout, FIRST_EXCEPTION if cancel_on_failure else ALL_COMPLETED)
+
+        failed = [future for future in futures if future in done and future.exception() is not None]
+        # Either a call failed or the deadline has passed, calls not started yet are not needed.
+        # Running calls cannot be interrupted, they finish in the background.
+        for future, timing in zip(futures, timings):
+            if future in pending and future.cancel():
+                timing['status'] = 'cancelled'
+        if failed:
+            raise failed[0].exception()
+        if pending:
+            raise DeadlineExceeded()
+
+        return [future.result() for future in futures]
+
+    def _run(self, call, timing):
+        _in_pool.set(True)
+        started = perf_counter()
+        try:
+            result = call()
+            timing['status'] = 'ok'
+            return result
+        except BaseException:
+            timing['status'] = 'error'
+            raise
+        finally:
+            timing['duration'] = perf_counter() - started
+            self.fan_out.observe(timing)
+
+
+def parallel_service(service_locator):
+    """ Service factory of Parallel, registered by FanOut. Every request gets its own
+    instance sharing the thread pool.
+    """
+    fan_out = service_locator.get(FanOut)
+    parallel = Parallel(fan_out)
+    service_locator.set(parallel, Parallel)
+
+    return parallel
+
+
+class FanOut:
+    """ Makes Parallel service available, all requests share one bounded thread pool.
+
+        app.use(FanOut(workers=32))
+    """
+    def __init__(self, workers=16, cancel_on_failure=True, registry=None):
+        """
+        :param workers: number of threads
+        :param cancel_on_failure: cancel calls not yet started once any call fails
+        :param registry: bolt.metrics.MetricsRegistry
+        """
+        self.workers = workers
+        self.cancel_on_failure = cancel_on_failure
+        self._pool = None
+        self._lock = Lock()
+        self._duration = None
+        if registry is not None:
+            self._duration = registry.histogram('bolt_fan_out_call_duration_seconds',
+                                                'Duration of parallel calls in seconds.', ['status'])
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def __call__(self, app):
+        app.service_locator.set(self, FanOut)
+        app.service_locator.set(parallel_service, Parallel)
+        app.on_shutdown(self.shutdown)
+
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='bolt-fan-out')
+
+        return self._pool
+
+    def observe(self, timing):
+        if self._duration is not None:
+            self._duration.labels(timing['status']).observe(timing['duration'])
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _reset(self):
+        # Pool used by the parent (e.g. warmup requests) has no threads in the child
+        self._pool = None
+        self._lock = Lock()
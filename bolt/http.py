@@ -1,10 +1,12 @@
 from urllib.parse import urlparse, parse_qs, unquote_plus
-from six.moves.http_cookies import SimpleCookie
+from http.cookies import SimpleCookie
 import re
 import json
 
 
 class HttpBody:
+    __slots__ = ('stream', 'length', '_bytes_remaining', '_contents')
+
     def __init__(self, body, length):
         if hasattr(body, 'read'):
             self.stream = body
@@ -58,6 +60,8 @@ class HttpMessage:
     TRUE_STRINGS = ('true', 'True', 'yes')
     FALSE_STRINGS = ('false', 'False', 'no')
 
+    __slots__ = ('_headers', '_body')
+
     @property
     def body(self):
         return self._body
@@ -73,18 +77,26 @@ class HttpMessage:
         :return:
         """
         name = name.upper().replace('-', '_')
-        if name in self._headers:
-            return self._headers[name]
+        headers = self._header_map()
+        if name in headers:
+            return headers[name]
 
         return None
 
+    def set_header(self, name: str, value):
+        self._header_map()[name] = value
+
     @property
     def headers(self):
         headers = []
-        for key in self._headers:
-            headers.append((key, self._headers[key]))
+        header_map = self._header_map()
+        for key in header_map:
+            headers.append((key, header_map[key]))
         return headers
 
+    def _header_map(self):
+        return self._headers
+
 
 class Request(HttpMessage):
 
@@ -99,6 +111,8 @@ class Request(HttpMessage):
     METHOD_TRACE = 'TRACE'
     METHOD_CONNECT = 'CONNECT'
 
+    __slots__ = ('_method', '_uri', '_cookies', '_env', 'route', 'timings', 'remote_addr')
+
     @property
     def uri(self):
         return self._uri
@@ -106,7 +120,7 @@ class Request(HttpMessage):
     @property
     def cookies(self):
         if self._cookies is None:
-            parser = SimpleCookie(self.headers("Cookie"))
+            parser = SimpleCookie(self.get_header("Cookie") or "")
             cookies = {}
             for morsel in parser.values():
                 cookies[morsel.key] = morsel.value
@@ -128,16 +142,28 @@ class Request(HttpMessage):
         self._method = method
         self._uri = uri
         self._cookies = None
+        self._env = None
+        self.route = None
+        self.timings = None
+        self.remote_addr = None
+
+    def _header_map(self):
+        # Headers of requests created from WSGI environ are collected on first use
+        if self._headers is None and self._env is not None:
+            env = self._env
+            headers = {}
+            for key in env:
+                if key.startswith('HTTP'):
+                    headers[key[5:]] = env[key]
+                elif key in HttpMessage.WSGI_CONTENT_HEADERS:
+                    headers[key] = env[key]
+            self._headers = headers
+            self._env = None
+
+        return self._headers
 
     @staticmethod
     def from_env(env):
-        headers = {}
-        for key in env:
-            if key.startswith('HTTP'):
-                headers[key[5:]] = env[key]
-            elif key in HttpMessage.WSGI_CONTENT_HEADERS:
-                headers[key] = env[key]
-
         uri = Uri.from_env(env)
         if 'CONTENT_LENGTH' in env:
             try:
@@ -150,7 +176,9 @@ class Request(HttpMessage):
         else:
             body = None
 
-        request = Request(env['REQUEST_METHOD'], uri, body, headers)
+        request = Request(env['REQUEST_METHOD'], uri, body)
+        request._env = env
+        request.remote_addr = env.get('REMOTE_ADDR')
         return request
 
 
@@ -260,6 +288,7 @@ class Response(HttpMessage):
         416: 'Requested Range Not Satisfiable',
         417: 'Expectation Failed',
         422: 'Unprocessable Entity',
+        429: 'Too Many Requests',
 
         # Server Error 5xx
         500: 'Internal Server Error',
@@ -271,19 +300,38 @@ class Response(HttpMessage):
         509: 'Bandwidth Limit Exceeded'
     }
 
+    __slots__ = ('_status', '_close_callbacks')
+
     @property
     def status(self):
         return self._status
 
     def __init__(self, body, status=200, headers=None):
         super().__init__(body, headers)
-        self._body = body
         self._status = status
+        self._close_callbacks = None
         if headers is None:
             self._headers = {
                 'Content-Type': 'plain/text'
             }
 
+    def on_close(self, callback):
+        """ Registers callback executed once the response has been handed to the server.
+        :param callback: callable without arguments
+        """
+        if self._close_callbacks is None:
+            self._close_callbacks = []
+        self._close_callbacks.append(callback)
+
+    @property
+    def closing(self) -> bool:
+        return self._close_callbacks is not None
+
+    def close(self):
+        callbacks, self._close_callbacks = self._close_callbacks or [], None
+        for callback in callbacks:
+            callback()
+
     @classmethod
     def status_message(cls, code):
         if code in cls.STATUS_MESSAGE:
@@ -312,6 +360,9 @@ class Uri:
     SCHEME_HTTP = 'http'
     SCHEME_HTTPS = 'https'
 
+    __slots__ = ('_scheme', '_port', '_hostname', '_path', '_query', '_fragment', '_username', '_password',
+                 '_arguments')
+
     @property
     def scheme(self):
         return self._scheme
@@ -328,14 +379,21 @@ class Uri:
     def path(self):
         return self._path
 
+    @property
+    def query(self):
+        return self._query
+
     def get_argument(self, name):
         try:
-            return self._arguments[name]
+            return self.arguments[name]
         except KeyError:
             return None
 
     @property
     def arguments(self):
+        # Query string is parsed on first use
+        if self._arguments is None:
+            self._arguments = unpack_arguments(self._query)
         return self._arguments
 
     def __init__(self, uri: str):
@@ -348,12 +406,12 @@ class Uri:
         self._fragment = parts.fragment
         self._username = parts.username
         self._password = parts.password
-        self._arguments = unpack_arguments(self._query)
+        self._arguments = None
 
     @classmethod
     def from_env(cls, env):
         host = env['HTTP_HOST'].split(':')
-        instance = Uri('')
+        instance = cls.__new__(cls)
         instance._scheme = env['wsgi.url_scheme']
         instance._hostname = host[0]
         try:
@@ -365,14 +423,18 @@ class Uri:
                 instance._port = 443
         instance._path = env['PATH_INFO']
         instance._query = env['QUERY_STRING']
-        instance._arguments = unpack_arguments(instance._query)
+        instance._fragment = ''
+        instance._username = None
+        instance._password = None
+        instance._arguments = None
         return instance
 
 
 class HttpException(Exception):
-    def __init__(self, msg, code='400'):
+    def __init__(self, msg, code='400', headers=None):
         super().__init__(msg)
         self.code = code
+        self.headers = headers
 
 
 def parse_key_pair(keyval):
@@ -0,0 +1,465 @@
+"""
+Metrics registry with counters, gauges and fixed-bucket histograms exported
+in Prometheus text format.
+
+Values can be kept in process memory or in memory-mapped files (one file per
+process) so metrics recorded by prefork workers can be aggregated and scraped
+from any of them.
+"""
+from .http import Response
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+import glob
+import json
+import mmap
+import os
+import struct
+
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 7.5, 10.0, float('inf'))
+
+
+class LocalStore:
+    """ Keeps metric values in process memory.
+    """
+    def __init__(self):
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, key, amount=1.0):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        self._values[key] = value
+
+    def samples(self):
+        return list(self._values.items())
+
+
+class MmapStore:
+    """ Keeps metric values in memory-mapped files stored in given directory.
+    Every process writes to its own files, gauges are stored separately from
+    other metrics so they can be removed once the process is dead
+    (see mark_process_dead).
+
+    File layout:
+        [uint32 used bytes][4 bytes padding]
+        [uint32 key length][key (utf-8 json), padded to 8 bytes][double value]...
+    """
+
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, directory, pid=None):
+        self.directory = directory
+        self._lock = Lock()
+        self._pid = pid
+        self._files = {}
+        if pid is None and hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def inc(self, key, amount=1.0):
+        with self._lock:
+            values = self._file_for(key)
+            values.write(key, values.read(key) + amount)
+
+    def set(self, key, value):
+        with self._lock:
+            self._file_for(key).write(key, value)
+
+    def samples(self):
+        return MmapStore.collect(self.directory)
+
+    @staticmethod
+    def collect(directory):
+        """ Reads and aggregates values written by all processes. Values of
+        the same sample are summed.
+
+        :param directory: metrics directory
+        :return: list of (key, value) tuples
+        """
+        totals = {}
+        for path in sorted(glob.glob(os.path.join(directory, '*.db'))):
+            for key, value in MmapValues.read_all(path):
+                totals[key] = totals.get(key, 0.0) + value
+
+        return list(totals.items())
+
+    def _file_for(self, key):
+        kind = 'gauge' if key[0] == 'gauge' else 'counter'
+        if kind not in self._files:
+            pid = self._pid if self._pid is not None else os.getpid()
+            path = os.path.join(self.directory, '%s_%s.db' % (kind, pid))
+            self._files[kind] = MmapValues(path, self.INITIAL_SIZE)
+
+        return self._files[kind]
+
+    def _reset(self):
+        self._lock = Lock()
+        self._files = {}
+
+
+class MmapValues:
+    """ Append-only file of JSON encoded keys each followed by a double, written
+    by one process and read by whichever process collects the metrics. The file
+    doubles in size once it is full.
+    """
+    def __init__(self, path, size):
+        self._path = path
+        self._positions = {}
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size < size:
+            self._file.truncate(size)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = struct.unpack_from('I', self._map, 0)[0] or 8
+        for key, value, position in MmapValues._entries(self._map, self._used):
+            self._positions[key] = position
+
+    def read(self, key):
+        if key not in self._positions:
+            self._allocate(key)
+        return struct.unpack_from('d', self._map, self._positions[key])[0]
+
+    def write(self, key, value):
+        if key not in self._positions:
+            self._allocate(key)
+        struct.pack_into('d', self._map, self._positions[key], value)
+
+    def _allocate(self, key):
+        encoded = json.dumps(key).encode('utf-8')
+        padded = len(encoded) + (8 - (len(encoded) + 4) % 8)
+        entry = struct.pack('I%ds' % padded, len(encoded), encoded)
+        size = len(entry) + 8
+
+        while self._used + size > self._capacity:
+            self._capacity *= 2
+            self._file.truncate(self._capacity)
+            self._map = mmap.mmap(self._file.fileno(), self._capacity)
+
+        self._map[self._used:self._used + len(entry)] = entry
+        self._positions[key] = self._used + len(entry)
+        struct.pack_into('d', self._map, self._positions[key], 0.0)
+        self._used += size
+        struct.pack_into('I', self._map, 0, self._used)
+
+    @staticmethod
+    def read_all(path):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < 8:
+            return []
+        used = struct.unpack_from('I', data, 0)[0]
+
+        return [(key, value) for key, value, position in MmapValues._entries(data, used)]
+
+    @staticmethod
+    def _entries(data, used):
+        position = 8
+        while position < used:
+            length = struct.unpack_from('I', data, position)[0]
+            padded = length + (8 - (length + 4) % 8)
+            key = json.loads(data[position + 4:position + 4 + length].decode('utf-8'))
+            position += 4 + padded
+            value = struct.unpack_from('d', data, position)[0]
+            yield MmapValues._to_key(key), value, position
+            position += 8
+
+    @staticmethod
+    def _to_key(key):
+        return tuple(tuple(tuple(pair) for pair in item) if isinstance(item, list) else item for item in key)
+
+
+def mark_process_dead(directory, pid):
+    """ Removes gauge values written by dead process, counters and histograms
+    are kept so totals do not decrease once worker is replaced.
+
+    :param directory: metrics directory
+    :param pid: dead process id
+    """
+    path = os.path.join(directory, 'gauge_%s.db' % pid)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class Metric:
+
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames, store):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames or ())
+        self._store = store
+        self._children = {}
+
+    def labels(self, *values):
+        """ Returns child metric for given label values, children are cached
+        so recording values of known label set costs a single dict lookup.
+        """
+        try:
+            return self._children[values]
+        except KeyError:
+            if len(values) != len(self.labelnames):
+                raise ValueError('Metric %s expects labels: %s' % (self.name, ', '.join(self.labelnames)))
+            labels = tuple(zip(self.labelnames, [str(value) for value in values]))
+            child = self._create_child(labels)
+            self._children[values] = child
+            return child
+
+    def _key(self, suffix, labels):
+        return self.TYPE, self.name, self.documentation, self.name + suffix, labels
+
+    def _create_child(self, labels):
+        raise NotImplementedError()
+
+
+class Counter(Metric):
+
+    TYPE = 'counter'
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+    def _create_child(self, labels):
+        return CounterValue(self._store, self._key('_total' if not self.name.endswith('_total') else '', labels))
+
+
+class CounterValue:
+    def __init__(self, store, key):
+        self._store = store
+        self._key = key
+
+    def inc(self, amount=1.0):
+        if amount < 0:
+            raise ValueError('Counters can only be incremented')
+        self._store.inc(self._key, amount)
+
+
+class Gauge(Metric):
+
+    TYPE = 'gauge'
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1.0):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def _create_child(self, labels):
+        return GaugeValue(self._store, self._key('', labels))
+
+
+class GaugeValue:
+    def __init__(self, store, key):
+        self._store = store
+        self._key = key
+
+    def inc(self, amount=1.0):
+        self._store.inc(self._key, amount)
+
+    def dec(self, amount=1.0):
+        self._store.inc(self._key, -amount)
+
+    def set(self, value):
+        self._store.set(self._key, value)
+
+
+class Histogram(Metric):
+
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, store, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, store)
+        buckets = sorted(float(bucket) for bucket in buckets)
+        if buckets[-1] != float('inf'):
+            buckets.append(float('inf'))
+        self.buckets = tuple(buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _create_child(self, labels):
+        bucket_keys = [self._key('_bucket', labels + (('le', format_value(bucket)),)) for bucket in self.buckets]
+        return HistogramValue(self._store, self.buckets, bucket_keys, self._key('_sum', labels))
+
+
+class HistogramValue:
+    def __init__(self, store, buckets, bucket_keys, sum_key):
+        self._store = store
+        self._buckets = buckets
+        self._bucket_keys = bucket_keys
+        self._sum_key = sum_key
+
+    def observe(self, value):
+        self._store.inc(self._bucket_keys[bisect_left(self._buckets, value)], 1.0)
+        self._store.inc(self._sum_key, value)
+
+
+class MetricsRegistry:
+    """ Creates metrics and renders their values in Prometheus text format.
+
+    If directory is passed values are kept in memory-mapped files inside that
+    directory and collect() reports totals of all processes writing there.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._metrics = {}
+        if directory is None:
+            self._store = LocalStore()
+        else:
+            self._store = MmapStore(directory)
+
+    def counter(self, name, documentation='', labelnames=None) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, self._store))
+
+    def gauge(self, name, documentation='', labelnames=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, self._store))
+
+    def histogram(self, name, documentation='', labelnames=None, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, self._store, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def collect(self) -> str:
+        """ Renders all recorded samples in Prometheus text exposition format.
+        :return: str
+        """
+        return render(self._store.samples())
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            existing = self._metrics[metric.name]
+            if existing.TYPE != metric.TYPE or existing.labelnames != metric.labelnames:
+                raise ValueError('Metric %s is already registered with different definition' % metric.name)
+            return existing
+        self._metrics[metric.name] = metric
+
+        return metric
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    return repr(float(value))
+
+
+def escape_label(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def render(samples) -> str:
+    families = {}
+    for key, value in samples:
+        metric_type, name, documentation, sample, labels = key
+        if name not in families:
+            families[name] = (metric_type, documentation, {})
+        families[name][2][(sample, labels)] = value
+
+    lines = []
+    for name in sorted(families):
+        metric_type, documentation, values = families[name]
+        lines.append('# HELP %s %s' % (name, documentation.replace('\\', r'\\').replace('\n', r'\n')))
+        lines.append('# TYPE %s %s' % (name, metric_type))
+        if metric_type == 'histogram':
+            values = _cumulate_buckets(name, values)
+        for (sample, labels), value in sorted(values.items(), key=_sample_order):
+            lines.append('%s%s %s' % (sample, _render_labels(labels), format_value(value)))
+
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def _cumulate_buckets(name, values):
+    series = {}
+    result = {}
+    for (sample, labels), value in values.items():
+        if sample == name + '_bucket':
+            series.setdefault(labels[:-1], []).append((float(labels[-1][1]), labels[-1][1], value))
+        else:
+            result[(sample, labels)] = value
+
+    for labels, buckets in series.items():
+        total = 0.0
+        for bound, le, value in sorted(buckets):
+            total += value
+            result[(name + '_bucket', labels + (('le', le),))] = total
+        result[(name + '_count', labels)] = total
+
+    return result
+
+
+def _sample_order(item):
+    (sample, labels), value = item
+    if labels and labels[-1][0] == 'le':
+        return sample, labels[:-1], float(labels[-1][1])
+    return sample, labels, 0.0
+
+
+def _render_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (name, escape_label(value)) for name, value in labels) + '}'
+
+
+class MetricsEndpoint:
+    """ Controller rendering registry's samples.
+    """
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+
+    def __call__(self):
+        return Response(self.registry.collect(), Response.HTTP_OK, {'Content-Type': self.CONTENT_TYPE})
+
+
+class Metrics:
+    """ Records per-route request counts, status codes, latency and in-flight
+    requests and exposes registry's samples under given path.
+
+    Usage:
+        app.use(Metrics(path='/metrics'))
+
+    In prefork deployments pass directory shared by all workers so scraping any
+    of them reports totals for the whole server:
+        app.use(Metrics(MetricsRegistry('/tmp/bolt-metrics')))
+    """
+    UNMATCHED_ROUTE = ''
+
+    def __init__(self, registry: MetricsRegistry=None, path='/metrics', buckets=DEFAULT_BUCKETS):
+        self.registry = registry or MetricsRegistry()
+        self.path = path
+        self.requests = self.registry.counter(
+            'bolt_requests_total', 'Total number of processed requests.', ['route', 'method', 'status'])
+        self.latency = self.registry.histogram(
+            'bolt_request_duration_seconds', 'Request processing time in seconds.', ['route', 'method'], buckets)
+        self.in_flight = self.registry.gauge(
+            'bolt_requests_in_flight', 'Number of requests being processed.')
+
+    def __call__(self, app):
+        app.intercept(self.intercept)
+        if self.path:
+            app.expose(self.path, MetricsEndpoint(self.registry), ['GET'])
+
+    def intercept(self, request, handler):
+        in_flight = self.in_flight.labels()
+        in_flight.inc()
+        start = perf_counter()
+        status = Response.HTTP_INTERNAL_SERVER_ERROR
+        try:
+            response = handler(request)
+            status = response.status
+            return response
+        finally:
+            elapsed = perf_counter() - start
+            in_flight.dec()
+            route = request.route.name if request.route is not None else self.UNMATCHED_ROUTE
+            self.requests.labels(route, request.method, status).inc()
+            self.latency.labels(route, request.method).observe(elapsed)
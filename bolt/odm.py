@@ -1,8 +1,12 @@
 import copy
+from contextlib import contextmanager
 import pymongo
 from datetime import datetime
-from dateutil import parser as date_parser
 from bson import ObjectId
+from .tracing import span
+from .utils import Serializable
+from .deadline import current_deadline, DeadlineExceeded
+from .cache import invalidate, entity_tag
 
 
 class Field:
@@ -31,6 +35,7 @@ class Field:
             # Cast to desired type
             # Date time can be stored as a string so lets parse it
             if self.get_type() is datetime:
+                from dateutil import parser as date_parser
                 return date_parser.parse(value)
             else:
                 return self.get_type()(value)
@@ -122,11 +127,6 @@ class Entity(metaclass=EntityMeta):
         return getattr(self, self.__id__.name)
 
 
-class Serializable:
-    def serialize(self):
-        return {}
-
-
 class Mapper:
 
     def __init__(self, entity):
@@ -217,6 +217,10 @@ class Cursor(pymongo.cursor.Cursor):
     def __next__(self):
         return self._map_to_entity(self.next())
 
+    def _refresh(self):
+        with span('odm.fetch', collection=self.collection.name), deadline_aware():
+            return pymongo.cursor.Cursor._refresh(self)
+
     def _map_to_entity(self, data):
         if self.__collection.name in ODM.__using__:
             cls = ODM.__using__[self.__collection.name]
@@ -230,12 +234,108 @@ class Cursor(pymongo.cursor.Cursor):
         return data
 
 
+@contextmanager
+def deadline_aware():
+    """ Fails fast once the deadline of the current request has passed and converts
+    MongoDB's ExecutionTimeout (maxTimeMS exceeded) to DeadlineExceeded.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        yield
+        return
+    deadline.check()
+    try:
+        yield
+    except pymongo.errors.ExecutionTimeout as e:
+        raise DeadlineExceeded() from e
+
+
+def traced(operation, max_time_option=None, tags=None):
+    """ Wraps pymongo's collection operation in a tracing span and makes it honour
+    the deadline of the current request.
+    :param operation: name of pymongo.collection.Collection method
+    :param max_time_option: name of the operation's option limiting its execution time
+    :param tags: function returning cache tags invalidated by the operation (see written_tags)
+    """
+    def traced_operation(self, *args, **kwargs):
+        with span('odm.' + operation, collection=self.name), deadline_aware():
+            if max_time_option is not None:
+                with_max_time(kwargs, max_time_option)
+            try:
+                return getattr(pymongo.collection.Collection, operation)(self, *args, **kwargs)
+            finally:
+                # Failed write may have been partially applied
+                if tags is not None:
+                    invalidate(*tags(self.name, args, kwargs))
+
+    traced_operation.__name__ = operation
+    traced_operation.__doc__ = getattr(pymongo.collection.Collection, operation).__doc__
+    return traced_operation
+
+
+def written_tags(argument, ids):
+    """ Creates function returning cache tags of documents written by an operation:
+    the collection and every written document, or all documents of the collection
+    (`collection:*`) when written documents are not known.
+    :param argument: name of the operation's first argument
+    :param ids: function returning ids of written documents from the argument, or None when unknown
+    """
+    def tags(collection, args, kwargs):
+        value = args[0] if args else kwargs.get(argument)
+        written = ids(value) if value is not None else None
+        if written is None:
+            return [collection, entity_tag(collection, '*')]
+        return [collection] + [entity_tag(collection, id) for id in written]
+
+    return tags
+
+
+def _document_id(document):
+    return [document['_id']] if '_id' in document else None
+
+
+def _documents_ids(documents):
+    ids = [document.get('_id') for document in documents]
+    return ids if None not in ids else None
+
+
+def _filter_id(filter):
+    id = filter.get('_id')
+    return [id] if id is not None and not isinstance(id, dict) else None
+
+
+def with_max_time(kwargs, option):
+    deadline = current_deadline()
+    if deadline is None or option in kwargs:
+        return
+    max_time_ms = deadline.max_time_ms()
+    if max_time_ms is not None:
+        kwargs[option] = max_time_ms
+
+
 class Query(pymongo.collection.Collection):
     def __init__(self, *args, **kwargs):
         pymongo.collection.Collection.__init__(self, *args, **kwargs)
 
+    find_one = traced('find_one', 'max_time_ms')
+    insert_one = traced('insert_one', tags=written_tags('document', _document_id))
+    insert_many = traced('insert_many', tags=written_tags('documents', _documents_ids))
+    replace_one = traced('replace_one', tags=written_tags('filter', _filter_id))
+    update_one = traced('update_one', tags=written_tags('filter', _filter_id))
+    update_many = traced('update_many', tags=written_tags('filter', lambda filter: None))
+    delete_one = traced('delete_one', tags=written_tags('filter', _filter_id))
+    delete_many = traced('delete_many', tags=written_tags('filter', lambda filter: None))
+    find_one_and_update = traced('find_one_and_update', 'maxTimeMS', written_tags('filter', _filter_id))
+    find_one_and_replace = traced('find_one_and_replace', 'maxTimeMS', written_tags('filter', _filter_id))
+    find_one_and_delete = traced('find_one_and_delete', 'maxTimeMS', written_tags('filter', _filter_id))
+    count_documents = traced('count_documents', 'maxTimeMS')
+    aggregate = traced('aggregate', 'maxTimeMS')
+    bulk_write = traced('bulk_write', tags=written_tags('requests', lambda requests: None))
+
     def find(self, *args, **kwargs):
-        return Cursor(self, *args, **kwargs)
+        with span('odm.find', collection=self.name), deadline_aware():
+            with_max_time(kwargs, 'max_time_ms')
+            return Cursor(self, *args, **kwargs)
 
     def persist(self, entity: Entity):
         if not isinstance(entity, Entity):
@@ -245,12 +345,18 @@ class Query(pymongo.collection.Collection):
         if entity.__collection__ != self.name:
             raise ValueError('Passed entity have to be persisted in %s collection' % entity.__collection__)
 
-        cls = ODM.__using__[self.name]
-        data = Mapper(cls).from_entity(entity)
-        if entity.__persisted__ is False:
-            self.insert_one(data)
-        else:
-            self.replace_one({'_id': entity.get_id()}, data)
+        with span('odm.persist', collection=self.name):
+            cls = ODM.__using__[self.name]
+            data = Mapper(cls).from_entity(entity)
+            if entity.__persisted__ is not False:
+                self.replace_one({'_id': entity.get_id()}, data)
+                return
+            try:
+                self.insert_one(data)
+            finally:
+                # insert_one invalidates the _id pymongo assigned to the document, entity may be cached under its own id
+                if entity.get_id() is not None and data.get('_id', entity.get_id()) != entity.get_id():
+                    invalidate(entity_tag(self.name, entity.get_id()))
 
 
 class ODM:
@@ -0,0 +1,225 @@
+"""
+Sampling profiler collecting per-route statistics of a fraction of requests.
+"""
+from threading import Lock, Thread, Event, get_ident
+import cProfile
+import pstats
+import random
+import os
+import re
+import sys
+
+
+class Profiler:
+    """ Profiles configurable fraction of requests and aggregates results per route.
+
+    Sampling rate can be set globally, per route name or in route settings:
+
+        app.use(Profiler(rate=0.01, output_dir='/tmp/profiles', dump_interval=300))
+
+        @app.get('/report', profile=0.5)
+        def report(self):
+            ...
+
+    Two modes are available:
+        - cprofile: deterministic cProfile of sampled requests, dumped as .pstats files
+        - sampler: statistical stack sampler, dumped as collapsed stacks (.collapsed files)
+          which can be turned into flame graphs.
+
+    Unsampled requests cost one random number and a dictionary lookup.
+    """
+
+    PROFILE = 'profile'
+    MODE_CPROFILE = 'cprofile'
+    MODE_SAMPLER = 'sampler'
+
+    def __init__(self, rate=0.0, routes=None, mode=MODE_CPROFILE, output_dir=None, dump_interval=None,
+                 interval=0.005):
+        """
+        :param rate: fraction of requests (0..1) profiled by default
+        :param routes: dict mapping route name to its sampling rate
+        :param mode: Profiler.MODE_CPROFILE or Profiler.MODE_SAMPLER
+        :param output_dir: directory where dump() writes files
+        :param dump_interval: if set, stats are dumped every dump_interval seconds
+        :param interval: stack sampling interval in seconds (sampler mode only)
+        """
+        if mode not in (self.MODE_CPROFILE, self.MODE_SAMPLER):
+            raise ValueError('Unknown profiler mode %s' % mode)
+        self.rate = rate
+        self.routes = routes or {}
+        self.mode = mode
+        self.output_dir = output_dir
+        self.dump_interval = dump_interval
+        self.random = random.random
+        self._app = None
+        self._stats = {}
+        self._lock = Lock()
+        self._sampler = StackSampler(interval) if mode == self.MODE_SAMPLER else None
+        self._stopped = Event()
+
+    def __call__(self, app):
+        self._app = app
+        app.intercept(self.intercept)
+        if self.dump_interval:
+            Thread(target=self._dump_periodically, name='bolt-profiler', daemon=True).start()
+
+    def intercept(self, request, handler):
+        route = self._app.match(request)
+        if route is None:
+            return handler(request)
+
+        rate = self._rate(route)
+        if not rate or self.random() >= rate:
+            return handler(request)
+
+        if self._sampler is not None:
+            return self._sample(route.name, request, handler)
+
+        return self._profile(route.name, request, handler)
+
+    @property
+    def stats(self):
+        """ Aggregated statistics: pstats.Stats per route in cprofile mode,
+        dict of collapsed stack -> samples count per route in sampler mode.
+        """
+        if self._sampler is not None:
+            return self._sampler.stacks
+        return self._stats
+
+    def dump(self, output_dir=None):
+        """ Writes aggregated statistics, one file per route.
+        :param output_dir: target directory, defaults to one passed to constructor
+        :return: list of written files
+        """
+        output_dir = output_dir or self.output_dir
+        if output_dir is None:
+            raise ValueError('Profiler output directory is not set')
+        os.makedirs(output_dir, exist_ok=True)
+
+        written = []
+        with self._lock:
+            if self._sampler is None:
+                for route, stats in self._stats.items():
+                    path = os.path.join(output_dir, route_filename(route) + '.pstats')
+                    stats.dump_stats(path)
+                    written.append(path)
+            else:
+                for route, stacks in self._sampler.snapshot().items():
+                    path = os.path.join(output_dir, route_filename(route) + '.collapsed')
+                    with open(path, 'w') as file:
+                        for stack, count in sorted(stacks.items()):
+                            file.write('%s %d\n' % (stack, count))
+                    written.append(path)
+
+        return written
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            if self._sampler is not None:
+                self._sampler.reset()
+
+    def stop(self):
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.stop()
+
+    def _rate(self, route):
+        if route.name in self.routes:
+            return self.routes[route.name]
+        rate = route.get(self.PROFILE)
+        if rate is not None:
+            return rate
+        return self.rate
+
+    def _profile(self, name, request, handler):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active in this interpreter
+            return handler(request)
+        try:
+            return handler(request)
+        finally:
+            profile.disable()
+            with self._lock:
+                if name in self._stats:
+                    self._stats[name].add(profile)
+                else:
+                    self._stats[name] = pstats.Stats(profile)
+
+    def _sample(self, name, request, handler):
+        thread_id = get_ident()
+        self._sampler.register(thread_id, name)
+        try:
+            return handler(request)
+        finally:
+            self._sampler.unregister(thread_id)
+
+    def _dump_periodically(self):
+        while not self._stopped.wait(self.dump_interval):
+            self.dump()
+
+
+class StackSampler:
+    """ Periodically captures stacks of registered threads. Sampling thread is
+    started with the first registered thread.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = {}
+        self._active = {}
+        self._lock = Lock()
+        self._thread = None
+        self._stopped = Event()
+
+    def register(self, thread_id, name):
+        self._active[thread_id] = name
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, name='bolt-stack-sampler', daemon=True)
+                    self._thread.start()
+
+    def unregister(self, thread_id):
+        self._active.pop(thread_id, None)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stacks) for name, stacks in self.stacks.items()}
+
+    def reset(self):
+        with self._lock:
+            self.stacks = {}
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, name in list(self._active.items()):
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    stack = collapse_stack(frame)
+                    stacks = self.stacks.setdefault(name, {})
+                    stacks[stack] = stacks.get(stack, 0) + 1
+
+
+def collapse_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('%s:%s' % (frame.f_globals.get('__name__', '?'), code.co_name))
+        frame = frame.f_back
+
+    return ';'.join(reversed(names))
+
+
+def route_filename(route):
+    return re.sub(r'[^a-zA-Z0-9_.-]+', '_', route).strip('_') or 'root'
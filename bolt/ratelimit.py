@@ -0,0 +1,195 @@
+"""
+Token bucket rate limiting of clients, configured per route.
+"""
+from .http import Response, HttpException
+from .shm import SharedMemory, hash_key
+from collections import OrderedDict
+from threading import Lock
+import math
+import struct
+import time
+
+
+def take(tokens, updated, now, rate, burst, cost):
+    """ Refills bucket for time elapsed since last update and takes `cost` tokens.
+    :return: (tokens left, retry after in seconds or 0 if tokens were taken)
+    """
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+
+    return tokens, (cost - tokens) / rate
+
+
+class MemoryBackend:
+    """ Keeps buckets in process memory, least recently used buckets are
+    removed once there are more than `max_keys` of them.
+    """
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = Lock()
+
+    def consume(self, key, rate, burst, now, cost=1):
+        """
+        :param key: bucket key
+        :param rate: tokens added per second
+        :param burst: bucket capacity
+        :param now: current time in seconds
+        :param cost: number of tokens to take
+        :return: seconds until enough tokens are available, 0 if tokens were taken
+        """
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens, retry_after = take(tokens, updated, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return retry_after
+
+
+class SharedMemoryBackend:
+    """ Keeps buckets in a memory-mapped file so all prefork workers of a host
+    share the same limits. Buckets are stored in a fixed-size hash table of groups
+    of `group_size` slots, a key is placed in the group selected by its hash and
+    when the group is full the least recently updated bucket is replaced.
+
+    Slot layout: [uint64 key hash][double tokens][double updated]
+
+    Time must be comparable between processes, default time.monotonic is
+    system wide on Linux.
+    """
+
+    SLOT = struct.Struct('Qdd')
+
+    def __init__(self, path, slots=65536, group_size=8, stripes=64):
+        """
+        :param path: file path, preferably on tmpfs (/dev/shm)
+        :param slots: maximum number of buckets
+        :param group_size: number of slots searched for a key
+        :param stripes: number of locks
+        """
+        self.group_size = group_size
+        self.groups = max(1, slots // group_size)
+        self.memory = SharedMemory(path, self.groups * group_size * self.SLOT.size, stripes)
+
+    def consume(self, key, rate, burst, now, cost=1):
+        """
+        :param key: bucket key
+        :param rate: tokens added per second
+        :param burst: bucket capacity
+        :param now: current time in seconds
+        :param cost: number of tokens to take
+        :return: seconds until enough tokens are available, 0 if tokens were taken
+        """
+        hashed = hash_key(key)
+        group = hashed % self.groups
+        start = group * self.group_size * self.SLOT.size
+        with self.memory.locked(group % self.memory.stripes) as memory:
+            position = empty = oldest = None
+            tokens, updated = burst, now
+            for offset in range(start, start + self.group_size * self.SLOT.size, self.SLOT.size):
+                slot_key, slot_tokens, slot_updated = self.SLOT.unpack_from(memory, offset)
+                if slot_key == hashed:
+                    position, tokens, updated = offset, slot_tokens, slot_updated
+                    break
+                if slot_key == 0:
+                    if empty is None:
+                        empty = offset
+                elif oldest is None or slot_updated < oldest[1]:
+                    oldest = (offset, slot_updated)
+            if position is None:
+                position = empty if empty is not None else oldest[0]
+
+            tokens, retry_after = take(tokens, updated, now, rate, burst, cost)
+            self.SLOT.pack_into(memory, position, hashed, tokens, now)
+
+        return retry_after
+
+
+class Limit:
+    """ Rate limit of a route:
+
+        @app.get('/search', rate_limit=Limit(10, burst=20))
+        @app.post('/login', rate_limit=Limit(1 / 60, burst=5, header='X-Api-Key'))
+
+    Clients are identified by IP address (default), a request header or a key
+    function. Every route has its own buckets unless limits share a `scope`.
+    """
+    def __init__(self, rate, burst=None, header=None, key=None, scope=None, cost=1):
+        """
+        :param rate: requests per second
+        :param burst: number of requests allowed at once, defaults to rate (at least 1)
+        :param header: header identifying client
+        :param key: function(request) returning client key, None skips limiting
+        :param scope: bucket name shared by routes, defaults to route name
+        :param cost: tokens taken by one request
+        """
+        if rate <= 0:
+            raise ValueError('Rate limit must be positive, got %s' % rate)
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self.header = header
+        self.key = key
+        self.scope = scope
+        self.cost = cost
+
+    def client(self, request):
+        if self.key is not None:
+            return self.key(request)
+        if self.header is not None:
+            return request.get_header(self.header)
+
+        return request.remote_addr
+
+
+class RateLimiter:
+    """ Rejects requests over the route limit with 429 before the controller
+    is resolved.
+
+        app.use(RateLimiter())
+        app.use(RateLimiter(SharedMemoryBackend('/dev/shm/app.ratelimit'), default=Limit(100, burst=200)))
+    """
+
+    RATE_LIMIT = 'rate_limit'
+
+    def __init__(self, backend=None, default=None, clock=time.monotonic, registry=None):
+        """
+        :param backend: MemoryBackend (default) or SharedMemoryBackend
+        :param default: Limit of routes without rate_limit setting
+        :param clock: function returning current time in seconds
+        :param registry: bolt.metrics.MetricsRegistry
+        """
+        self.backend = backend or MemoryBackend()
+        self.default = default
+        self.clock = clock
+        self._app = None
+        self._rejected = None
+        if registry is not None:
+            self._rejected = registry.counter('bolt_rate_limited_total', 'Requests rejected by rate limit.', ['scope'])
+
+    def __call__(self, app):
+        self._app = app
+        app.intercept(self.intercept)
+
+    def intercept(self, request, handler):
+        route = self._app.match(request)
+        if route is None:
+            return handler(request)
+        limit = route.get(self.RATE_LIMIT) or self.default
+        if limit is None:
+            return handler(request)
+        client = limit.client(request)
+        if client is None:
+            return handler(request)
+
+        scope = limit.scope or route.name
+        retry_after = self.backend.consume('%s:%s' % (scope, client), limit.rate, limit.burst, self.clock(), limit.cost)
+        if retry_after:
+            if self._rejected is not None:
+                self._rejected.labels(scope).inc()
+            raise HttpException('Too Many Requests', Response.HTTP_TOO_MANY_REQUESTS,
+                                {'Retry-After': str(math.ceil(retry_after))})
+
+        return handler(request)
@@ -3,6 +3,8 @@ import copy
 
 
 class Route:
+    __slots__ = ('name', 'callback', 'params', 'settings', '_rule')
+
     def __init__(self, pattern, callback, settings=None):
         """ Provides simplified and more natural way for building regular
         expression which later on can be matched against uri(s).
@@ -55,6 +57,20 @@ class Route:
 
         return True
 
+    def matched(self, uri: str) -> 'Route':
+        """ Returns copy of the route holding params of the uri, or None if uri is not
+        matching the rule. Unlike match, the route itself is not modified, so routes
+        of a RouteMap can be matched by many threads at once.
+
+        :param uri: valid uri string
+        :return: Route or None
+        """
+        params = self._rule.match(uri)
+        if params is None:
+            return None
+
+        return self.clone(params)
+
     def get(self, property):
         if self.settings is not None and property in self.settings:
             return self.settings[property]
@@ -64,10 +80,22 @@ class Route:
 
         return None
 
-    def clone(self):
-        cloned = Route(self.name, self.callback, self.settings)
+    def compile(self):
+        self._rule.compile()
+
+        return self
+
+    def clone(self, params=None):
+        """
+        :param params: params of the clone, defaults to a copy of route's params
+        """
+        # Clones share the rule, creating it again for every matched request is wasteful
+        cloned = Route.__new__(Route)
+        cloned.name = self.name
+        cloned.callback = self.callback
+        cloned.settings = self.settings
         cloned._rule = self._rule
-        cloned.params = copy.copy(self.params)
+        cloned.params = params if params is not None else copy.copy(self.params)
         return cloned
 
 
@@ -105,21 +133,32 @@ class RouteMap:
 
         return self
 
+    def compile(self):
+        """ Compiles patterns of all routes, otherwise patterns are compiled on first match.
+        """
+        for routes in self._routes.values():
+            for route in routes:
+                route.compile()
+
+        return self
+
     def find(self, uri, groups=['*']) -> Route:
         for group in groups:
             if group == '*':
                 for group, routes in self._routes.items():
                     for route in routes:
-                        if route.match(uri):
-                            return route.clone()
+                        matched = route.matched(uri)
+                        if matched is not None:
+                            return matched
                 break
 
             if group not in self._routes:
                 return None
 
             for route in self._routes[group]:
-                if route.match(uri):
-                    return route.clone()
+                matched = route.matched(uri)
+                if matched is not None:
+                    return matched
 
         return None
 
@@ -128,6 +167,8 @@ class Rule:
     """
     Private package class
     """
+    __slots__ = ('_parsed_rule', '_params')
+
     def __init__(self, route):
         self._parsed_rule = ParsedRule(route)
         self._params = {}
@@ -145,6 +186,9 @@ class Rule:
 
         return self._fetch_params(results)
 
+    def compile(self):
+        self._parsed_rule.compile()
+
     def _fetch_params(self, results):
         params = {}
         for property in self._parsed_rule._properties:
@@ -168,12 +212,21 @@ class ParsedRule:
         self.raw_rule = rule
         self._properties = []
         self._pattern = None
+        self._regex = None
+
+    def compile(self):
+        if self._regex is None:
+            if self._pattern is None:
+                self._parse()
+            self._regex = re.compile(self._pattern, re.I)
+
+        return self._regex
 
     def match(self, uri):
-        if self._pattern is None:
-            self._parse()
+        if self._regex is None:
+            self.compile()
 
-        return re.match(self._pattern, uri, re.I)
+        return self._regex.match(uri)
 
     def _parse(self):
         without_optionals = self.raw_rule.rstrip(']')
@@ -0,0 +1,603 @@
+"""
+Prefork WSGI server for bolt applications.
+
+    python -m bolt serve myapp.main:app --workers 4 --port 8000
+
+Master process loads the application, calls Bolt.ready() and freezes all
+objects created so far (gc.freeze), so compiled routes, services and imported
+modules stay shared (copy-on-write) between forked workers. Every worker binds
+its own listening socket with SO_REUSEPORT and the kernel balances connections
+between them.
+
+Signals handled by master:
+    SIGTERM, SIGINT - graceful shutdown, workers finish in-flight requests
+    SIGHUP          - graceful restart of all workers
+
+With --threads every worker serves requests with a fixed pool of threads fed
+from a bounded queue of accepted connections (see PooledWSGIServer). When the
+queue is full connections are rejected immediately with 503 and Retry-After.
+
+Workers can be recycled (see RecyclePolicy) after serving given number of
+requests, exceeding RSS limit or reaching maximum age. Recycled worker asks
+master for a replacement and finishes requests it has already accepted
+before it exits. Stopping workers run shutdown callbacks of the application
+(see Bolt.on_shutdown).
+
+With --warmup master warms the application up (Bolt.ready(warmup=True)) and
+prints the startup report before any worker starts accepting connections.
+"""
+from .metrics import Metrics, mark_process_dead
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+from queue import Queue, Full
+from threading import Thread
+import argparse
+import importlib
+import gc
+import os
+import random
+import resource
+import select
+import signal
+import socket
+import struct
+import sys
+import time
+import traceback
+from time import perf_counter
+
+
+class ReusePortWSGIServer(WSGIServer):
+    """ WSGI server binding its socket with SO_REUSEPORT, so many processes can
+    listen on the same address.
+    """
+    allow_reuse_address = True
+    request_queue_size = 128
+    handled = 0
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        super().process_request(request, client_address)
+        self.handled += 1
+
+
+class PooledWSGIServer(ReusePortWSGIServer):
+    """ WSGI server handing accepted connections to a fixed pool of threads through
+    a bounded queue. Connections which do not fit in the queue are rejected with
+    503 Service Unavailable, so clients fail fast instead of timing out.
+
+    Queue depth, time spent in the queue and rejections are recorded in the metrics
+    registry if one is passed.
+    """
+    threads = 8
+    queue_size = 64
+    retry_after = 1
+
+    def __init__(self, server_address, handler_class, bind_and_activate=True, threads=None, queue_size=None,
+                 retry_after=None, registry=None):
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self.threads = threads or self.threads
+        self.queue_size = queue_size or self.queue_size
+        self.retry_after = retry_after if retry_after is not None else self.retry_after
+        self.rejected = 0
+        self._queue = Queue(self.queue_size)
+        self._pool = []
+        self._depth = None
+        self._wait = None
+        self._rejections = None
+        if registry is not None:
+            self._depth = registry.gauge('bolt_server_queue_depth', 'Connections waiting for a worker thread.')
+            self._wait = registry.histogram('bolt_server_queue_wait_seconds',
+                                            'Time connections spent waiting for a worker thread.')
+            self._rejections = registry.counter('bolt_server_rejected_total',
+                                                'Connections rejected because the queue was full.')
+        for i in range(self.threads):
+            thread = Thread(target=self._work, name='bolt-worker-%d' % i, daemon=True)
+            thread.start()
+            self._pool.append(thread)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def process_request(self, request, client_address):
+        try:
+            self._queue.put_nowait((request, client_address, perf_counter()))
+        except Full:
+            self.reject(request)
+            return
+        if self._depth is not None:
+            self._depth.inc()
+        self.handled += 1
+
+    def reject(self, request):
+        self.rejected += 1
+        if self._rejections is not None:
+            self._rejections.inc()
+        body = b'Service Unavailable'
+        try:
+            # Read what already arrived, closing socket with unread data resets the connection
+            request.setblocking(False)
+            try:
+                request.recv(65536)
+            except OSError:
+                pass
+            request.settimeout(1)
+            request.sendall(b'HTTP/1.1 503 Service Unavailable\r\nContent-Type: text/plain\r\n'
+                            b'Content-Length: %d\r\nRetry-After: %d\r\nConnection: close\r\n\r\n%s'
+                            % (len(body), self.retry_after, body))
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for thread in self._pool:
+            self._queue.put(None)
+        for thread in self._pool:
+            thread.join()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            request, client_address, queued = item
+            if self._depth is not None:
+                self._depth.dec()
+                self._wait.observe(perf_counter() - queued)
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """ Request handler which does not write access log to stderr,
+    see bolt.accesslog.AccessLog.
+    """
+    def log_message(self, format, *args):
+        pass
+
+
+def current_rss():
+    """ Returns resident set size of current process in bytes. Falls back to
+    peak RSS if /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class RecyclePolicy:
+    """ Decides when worker should be replaced with a fresh process.
+
+        policy = RecyclePolicy(max_requests=10000, max_requests_jitter=1000, max_rss=512 * 1024 * 1024,
+                               max_age=24 * 3600)
+
+    Jitter spreads recycling of workers started at the same time, so they are not
+    all replaced at once.
+    """
+    def __init__(self, max_requests=None, max_requests_jitter=0, max_rss=None, max_age=None):
+        """
+        :param max_requests: number of requests after which worker is recycled
+        :param max_requests_jitter: random number of requests (0..jitter) added to max_requests per worker
+        :param max_rss: resident set size limit in bytes, checked between requests
+        :param max_age: worker lifetime limit in seconds
+        """
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_rss = max_rss
+        self.max_age = max_age
+
+    @property
+    def enabled(self):
+        return bool(self.max_requests or self.max_rss or self.max_age)
+
+    def requests_limit(self):
+        """ Returns request limit for a new worker.
+        """
+        if not self.max_requests:
+            return None
+        return self.max_requests + random.randint(0, self.max_requests_jitter or 0)
+
+    def check(self, requests, requests_limit, age, rss=None):
+        """ Returns reason for recycling the worker or None.
+        :param requests: number of served requests
+        :param requests_limit: limit returned by requests_limit()
+        :param age: worker's age in seconds
+        :param rss: worker's current rss, measured if not passed
+        :return: str or None
+        """
+        if requests_limit is not None and requests >= requests_limit:
+            return 'served %d requests' % requests
+        if self.max_age is not None and age >= self.max_age:
+            return 'reached maximum age of %ds' % self.max_age
+        if self.max_rss is not None:
+            rss = current_rss() if rss is None else rss
+            if rss >= self.max_rss:
+                return 'rss %d exceeded %d bytes' % (rss, self.max_rss)
+
+        return None
+
+
+class Worker:
+    """ Serves requests until it is asked to stop. Stop requests (SIGTERM) are
+    honoured between requests, so in-flight request is always finished.
+
+    Recycle policy is checked between requests, once it triggers worker notifies
+    master through notify_fd and keeps serving until master replaces it.
+    """
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, app, host, port, backlog=128, server_class=ReusePortWSGIServer,
+                 handler_class=QuietRequestHandler, policy=None, notify_fd=None, threads=None, queue_size=None,
+                 retry_after=None, drain_timeout=5.0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.server_class = server_class
+        self.handler_class = handler_class
+        self.policy = policy
+        self.notify_fd = notify_fd
+        self.threads = threads
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self.drain_timeout = drain_timeout
+        self.requests_limit = None
+        self.recycle_reason = None
+        self.started = time.monotonic()
+        self.stopping = False
+        self.server = None
+
+    @property
+    def requests(self):
+        return self.server.handled if self.server is not None else 0
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+        self.started = time.monotonic()
+        if self.policy is not None:
+            self.requests_limit = self.policy.requests_limit()
+        self.server = self.create_server()
+        self.server.timeout = self.POLL_INTERVAL
+        if getattr(self.app, 'prewarm_lazy', False):
+            self.app.prewarm()
+        try:
+            while not self.stopping:
+                self.server.handle_request()
+                if self.policy is not None and self.recycle_reason is None:
+                    self.check_policy()
+            self.drain()
+        finally:
+            self.server.server_close()
+            if hasattr(self.app, 'shutdown'):
+                self.app.shutdown()
+
+    def create_server(self):
+        if self.threads:
+            server_class = self.server_class if issubclass(self.server_class, PooledWSGIServer) \
+                else PooledWSGIServer
+            server = server_class((self.host, self.port), self.handler_class, False, self.threads,
+                                  self.queue_size, self.retry_after, find_metrics(self.app))
+        else:
+            server = self.server_class((self.host, self.port), self.handler_class, bind_and_activate=False)
+        server.request_queue_size = self.backlog
+        try:
+            server.server_bind()
+            server.server_activate()
+        except OSError:
+            server.server_close()
+            raise
+        server.set_app(self.app)
+        return server
+
+    def check_policy(self):
+        reason = self.policy.check(self.requests, self.requests_limit, time.monotonic() - self.started)
+        if reason is None:
+            return
+        self.recycle_reason = reason
+        if self.notify_fd is None:
+            self.stop()
+            return
+        try:
+            os.write(self.notify_fd, struct.pack('i', os.getpid()))
+        except OSError:
+            self.stop()
+
+    def drain(self):
+        """ Serves connections already waiting in the listen queue, they would be
+        reset once the socket is closed. Under sustained load new connections keep
+        arriving, so draining stops after `backlog` connections (the size of the
+        queue when worker was stopped) or `drain_timeout` seconds, well before
+        master kills the worker, and only requests already in flight are finished.
+        """
+        deadline = time.monotonic() + self.drain_timeout
+        for i in range(self.backlog):
+            if time.monotonic() >= deadline or not select.select([self.server], [], [], 0)[0]:
+                return
+            self.server.handle_request()
+
+    def stop(self):
+        self.stopping = True
+
+    def _stop(self, signum, frame):
+        self.stop()
+
+
+class PreforkServer:
+
+    def __init__(self, app, host='127.0.0.1', port=8000, workers=None, backlog=128, graceful_timeout=30,
+                 worker_class=Worker, recycle_policy: RecyclePolicy=None, threads=None, queue_size=None,
+                 retry_after=None, warmup=False):
+        """
+        :param app: Bolt application (or any WSGI callable)
+        :param host: interface to bind to
+        :param port: port to bind to
+        :param workers: number of worker processes, defaults to number of CPUs
+        :param backlog: listen queue size of every worker
+        :param graceful_timeout: seconds workers are given to finish in-flight requests
+        :param worker_class: Worker class
+        :param recycle_policy: RecyclePolicy
+        :param threads: number of threads serving requests in every worker, see PooledWSGIServer
+        :param queue_size: number of accepted connections waiting for a thread
+        :param retry_after: Retry-After value (seconds) sent with rejected connections
+        :param warmup: warm the application up (see Bolt.ready) before workers are started
+        """
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise RuntimeError('SO_REUSEPORT is not supported on this platform')
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.backlog = backlog
+        self.graceful_timeout = graceful_timeout
+        self.worker_class = worker_class
+        self.recycle_policy = recycle_policy
+        self.threads = threads
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self.warmup = warmup
+        self.children = {}
+        self.retiring = {}
+        self._stopping = False
+        self._reloading = False
+        self._notify_read = None
+        self._notify_write = None
+
+    def run(self):
+        if hasattr(self.app, 'ready'):
+            if self.warmup:
+                self.app.ready(warmup=True)
+                sys.stderr.write('%s\n' % self.app.startup_report)
+            else:
+                self.app.ready()
+        self._check_address()
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        self._notify_read, self._notify_write = os.pipe()
+        os.set_blocking(self._notify_read, False)
+
+        for i in range(self.workers):
+            self.spawn()
+
+        try:
+            while not self._stopping:
+                if self._reloading:
+                    self._reloading = False
+                    self.reload()
+                for pid in self._recycle_requests():
+                    self.recycle(pid)
+                self.reap()
+                self._kill_overdue()
+                while not self._stopping and len(self.children) - len(self.retiring) < self.workers:
+                    self.spawn()
+                time.sleep(0.1)
+        finally:
+            self.stop()
+            os.close(self._notify_read)
+            os.close(self._notify_write)
+
+    def spawn(self):
+        # Draining has to end early enough for in-flight requests to finish within graceful timeout
+        worker = self.worker_class(self.app, self.host, self.port, self.backlog, threads=self.threads,
+                                   queue_size=self.queue_size, retry_after=self.retry_after,
+                                   drain_timeout=self.graceful_timeout / 3)
+        worker.policy = self.recycle_policy if self.recycle_policy and self.recycle_policy.enabled else None
+        worker.notify_fd = self._notify_write
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                os.close(self._notify_read)
+                worker.run()
+            except BaseException:
+                status = 1
+                traceback.print_exc()
+            finally:
+                os._exit(status)
+
+        self.children[pid] = time.monotonic()
+        return pid
+
+    def reap(self):
+        """ Collects exited workers.
+        :return: list of (pid, exit status)
+        """
+        exited = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                break
+            if pid == 0:
+                break
+            if pid in self.children:
+                del self.children[pid]
+                self.retiring.pop(pid, None)
+                self.on_worker_exit(pid)
+                exited.append((pid, status))
+
+        return exited
+
+    def recycle(self, pid):
+        """ Starts replacement of the worker and asks the worker to finish.
+        :param pid: worker's pid
+        """
+        if pid not in self.children or pid in self.retiring:
+            return
+        self.spawn()
+        self.retiring[pid] = time.monotonic() + self.graceful_timeout
+        self._signal(pid, signal.SIGTERM)
+
+    def reload(self):
+        """ Starts new generation of workers and gracefully stops the old one.
+        """
+        for pid in [pid for pid in self.children if pid not in self.retiring]:
+            self.recycle(pid)
+
+    def stop(self):
+        self._stopping = True
+        self._terminate(list(self.children))
+
+    def on_worker_exit(self, pid):
+        # Gauges of dead workers have to be removed from aggregated metrics
+        registry = find_metrics(self.app)
+        if registry is not None and registry.directory:
+            mark_process_dead(registry.directory, pid)
+
+    def _terminate(self, pids):
+        for pid in pids:
+            self._signal(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while any(pid in self.children for pid in pids) and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+
+        for pid in pids:
+            if pid in self.children:
+                self._signal(pid, signal.SIGKILL)
+        while any(pid in self.children for pid in pids):
+            self.reap()
+            time.sleep(0.01)
+
+    def _recycle_requests(self):
+        try:
+            data = os.read(self._notify_read, 4096)
+        except BlockingIOError:
+            return []
+        return [pid for (pid,) in struct.iter_unpack('i', data[:len(data) - len(data) % 4])]
+
+    def _kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                self._signal(pid, signal.SIGKILL)
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _check_address(self):
+        # Fail in master rather than in every worker if address cannot be bound
+        probe = socket.socket(socket.AF_INET6 if ':' in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            probe.bind((self.host, self.port))
+        finally:
+            probe.close()
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reloading = True
+
+
+def find_metrics(app):
+    """ Returns metrics registry used by application's Metrics service.
+    :param app: Bolt application
+    :return: MetricsRegistry or None
+    """
+    for service in getattr(app, '_services', []):
+        if isinstance(service, Metrics):
+            return service.registry
+
+    return None
+
+
+def load_app(spec):
+    """ Imports application from `module:attribute` specification,
+    attribute defaults to `app`.
+
+    :param spec: application specification, e.g. myapp.main:app
+    :return: application
+    """
+    module_name, separator, attribute = spec.partition(':')
+    module = importlib.import_module(module_name)
+    try:
+        return getattr(module, attribute or 'app')
+    except AttributeError:
+        raise ValueError('Module %s has no attribute %s' % (module_name, attribute or 'app'))
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(prog='bolt')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    serve = commands.add_parser('serve', help='serve application with prefork server')
+    serve.add_argument('app', help='application to serve, e.g. myapp.main:app')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8000)
+    serve.add_argument('--workers', type=int, default=None, help='number of workers, defaults to number of CPUs')
+    serve.add_argument('--backlog', type=int, default=128)
+    serve.add_argument('--graceful-timeout', type=float, default=30)
+    serve.add_argument('--threads', type=int, default=None, help='serve requests with a pool of N threads')
+    serve.add_argument('--queue-size', type=int, default=None,
+                       help='connections waiting for a thread, excess is rejected with 503')
+    serve.add_argument('--retry-after', type=int, default=None, help='Retry-After sent with rejected connections')
+    serve.add_argument('--max-requests', type=int, default=None, help='recycle worker after serving N requests')
+    serve.add_argument('--max-requests-jitter', type=int, default=0,
+                       help='random number of requests added to --max-requests per worker')
+    serve.add_argument('--max-rss', type=int, default=None, help='recycle worker once its RSS exceeds N megabytes')
+    serve.add_argument('--max-age', type=float, default=None, help='recycle worker after N seconds')
+    serve.add_argument('--warmup', action='store_true',
+                       help='compile routes, create services and replay app.warmup_requests before forking workers')
+
+    return parser
+
+
+def main(argv=None):
+    arguments = create_parser().parse_args(argv)
+    sys.path.insert(0, os.getcwd())
+    app = load_app(arguments.app)
+    policy = RecyclePolicy(arguments.max_requests, arguments.max_requests_jitter,
+                           arguments.max_rss * 1024 * 1024 if arguments.max_rss else None, arguments.max_age)
+    server = PreforkServer(app, arguments.host, arguments.port, arguments.workers, arguments.backlog,
+                           arguments.graceful_timeout, recycle_policy=policy, threads=arguments.threads,
+                           queue_size=arguments.queue_size, retry_after=arguments.retry_after,
+                           warmup=arguments.warmup)
+    server.run()
@@ -0,0 +1,75 @@
+"""
+Memory-mapped file shared by processes of one host, with striped locks
+usable from both threads and processes.
+"""
+from contextlib import contextmanager
+from threading import Lock
+import fcntl
+import hashlib
+import mmap
+import os
+
+
+class SharedMemory:
+    """ Fixed-size file mapped into memory of every process that opens it.
+
+    Access is guarded by `stripes` independent locks. A stripe is held with both
+    a thread lock (fcntl locks are owned by a process, so threads of one process
+    would not exclude each other) and a one-byte fcntl lock, which is released by
+    the kernel when the process dies.
+
+        memory = SharedMemory('/dev/shm/app.ratelimit', 1024 * 1024)
+        with memory.locked(stripe):
+            struct.pack_into('d', memory.map, offset, value)
+    """
+
+    def __init__(self, path, size, stripes=64):
+        """
+        :param path: file path, preferably on tmpfs (/dev/shm)
+        :param size: size of the mapping in bytes
+        :param stripes: number of locks
+        """
+        self.path = path
+        self.size = size
+        self.stripes = stripes
+        self._locks = [Lock() for i in range(stripes)]
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        # Separate descriptor for locks, region locks are not tied to the mapping
+        self._lock_file = open(path, 'rb+')
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    @contextmanager
+    def locked(self, stripe):
+        """ Holds lock of given stripe.
+        :param stripe: 0 <= stripe < stripes
+        """
+        with self._locks[stripe]:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX, 1, stripe)
+            try:
+                yield self.map
+            finally:
+                fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1, stripe)
+
+    def close(self):
+        self.map.close()
+        self._lock_file.close()
+
+    def _reset(self):
+        self._locks = [Lock() for i in range(self.stripes)]
+
+
+def hash_key(key) -> int:
+    """ Hash of a string stable across processes (unlike builtin hash), never 0.
+    :param key: str or bytes
+    """
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') or 1
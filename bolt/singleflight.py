@@ -0,0 +1,107 @@
+"""
+Coalescing of identical concurrent requests.
+"""
+from .http import Request, Response, HttpException
+from threading import Lock, Event
+
+
+class Flight:
+    """ Leader's request in progress, followers wait for `done` and copy
+    the response or re-raise the error.
+    """
+    def __init__(self):
+        self.done = Event()
+        self.response = None
+        self.error = None
+
+
+class SingleFlight:
+    """ Executes concurrent identical requests of a route only once. The first request
+    (leader) runs the controller, requests arriving while it runs (followers) wait
+    for it and get a copy of its response.
+
+        app.use(SingleFlight(timeout=5))
+
+        @app.get('/products/{id}', coalesce=True)
+        @app.get('/feed', coalesce=['Accept-Language'])
+
+    Requests are identical when method, path, query string and the selected headers
+    (setting value or `headers` of SingleFlight) are equal, so only routes whose
+    response does not depend on anything else (e.g. the user) should be coalesced.
+    Followers waiting longer than `timeout` get 504.
+    """
+
+    COALESCE = 'coalesce'
+
+    def __init__(self, timeout=5.0, headers=(), methods=(Request.METHOD_GET, Request.METHOD_HEAD), registry=None):
+        """
+        :param timeout: seconds followers wait for the leader
+        :param headers: headers making requests different, used when route setting is True
+        :param methods: coalesced methods
+        :param registry: bolt.metrics.MetricsRegistry
+        """
+        self.timeout = timeout
+        self.headers = tuple(headers)
+        self.methods = methods
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = Lock()
+        self._app = None
+        self._coalesced = None
+        if registry is not None:
+            self._coalesced = registry.counter('bolt_coalesced_requests_total',
+                                               'Requests served with response of identical request.', ['route'])
+
+    def __call__(self, app):
+        self._app = app
+        app.intercept(self.intercept)
+
+    def intercept(self, request, handler):
+        if request.method not in self.methods:
+            return handler(request)
+        route = self._app.match(request)
+        setting = route.get(self.COALESCE) if route is not None else None
+        if not setting:
+            return handler(request)
+
+        key = self.key(request, setting if isinstance(setting, (list, tuple)) else self.headers)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+
+        if leader:
+            try:
+                flight.response = handler(request)
+                return flight.response
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+        if not flight.done.wait(self.timeout):
+            raise HttpException('Gateway Timeout', Response.HTTP_GATEWAY_TIMEOUT)
+        if flight.error is not None:
+            raise flight.error
+        with self._lock:
+            self.coalesced += 1
+        if self._coalesced is not None:
+            self._coalesced.labels(route.name).inc()
+
+        return self.share(flight.response)
+
+    @staticmethod
+    def key(request, headers):
+        return (request.method, request.uri.path, request.uri.query) + \
+            tuple(request.get_header(name) for name in headers)
+
+    @staticmethod
+    def share(response):
+        """ Copy of leader's response, callbacks registered by the leader (e.g. background
+        tasks) are not copied.
+        """
+        return Response(response.body, response.status, dict(response.headers))
@@ -0,0 +1,174 @@
+"""
+Snapshots of caches saved to a local file, so restarted processes start warm.
+"""
+from threading import Thread, Lock, Event
+import logging
+import os
+import pickle
+import tempfile
+import time
+
+
+logger = logging.getLogger('bolt.snapshot')
+
+
+class CacheSnapshots:
+    """ Saves chosen caches (MemoryCache, SharedMemoryCache or functions decorated
+    with bolt.cached) to a file and loads them back when the application gets ready:
+
+        app.use(CacheSnapshots('/var/lib/app/caches.snapshot', version='2.3.1', caches={
+            'config': ConfigService.resolve,
+            'products': products_cache
+        }, interval=300))
+
+    Snapshot is loaded at Bolt.ready(), with prefork server that is in master before
+    workers are forked, so every worker starts with the loaded entries. Snapshot
+    is ignored when its version differs from `version` (e.g. cached values changed
+    their shape) or it is older than `max_age`; entries expired in the meantime
+    are skipped.
+
+    Snapshot is saved on graceful shutdown (see Bolt.on_shutdown) and every
+    `interval` seconds, only by processes which served requests. The file is
+    replaced atomically, when many workers save it the last one wins. Values
+    which cannot be pickled are skipped.
+    """
+    def __init__(self, path, version, caches, interval=None, max_age=None, clock=time.time):
+        """
+        :param path: snapshot file
+        :param version: version stamp (e.g. application release), snapshots of other versions are ignored
+        :param caches: dict of name => cache or cached function
+        :param interval: seconds between periodic saves, None saves only on shutdown
+        :param max_age: seconds after which snapshot is too old to be loaded
+        :param clock: function returning current time in seconds
+        """
+        self.path = path
+        self.version = version
+        self.caches = {}
+        for name, cache in caches.items():
+            # Cached functions keep their results in `cache`
+            cache = getattr(cache, 'cache', cache)
+            if cache is None:
+                raise ValueError('Cache %s cannot be persisted, results of request scope are not kept' % name)
+            self.caches[name] = cache
+        self.interval = interval
+        self.max_age = max_age
+        self.clock = clock
+        self._serving = False
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+        self._app = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def __call__(self, app):
+        self._app = app
+        app.intercept(self.intercept)
+        app.on_shutdown(self.close)
+        self.load()
+
+    def intercept(self, request, handler):
+        # Warmup requests are replayed by master within Bolt.ready(), master must not save its initial copy
+        if not self._serving and self._app.is_ready:
+            self._start()
+        return handler(request)
+
+    def load(self) -> int:
+        """ Loads entries of the snapshot into the caches.
+        :return: number of loaded entries
+        """
+        try:
+            with open(self.path, 'rb') as file:
+                snapshot = pickle.load(file)
+        except FileNotFoundError:
+            return 0
+        except Exception:
+            logger.exception('Cache snapshot %s could not be read', self.path)
+            return 0
+        if snapshot.get('version') != self.version:
+            logger.info('Cache snapshot %s ignored, version %r differs from %r',
+                        self.path, snapshot.get('version'), self.version)
+            return 0
+        if self.max_age is not None and snapshot['saved_at'] + self.max_age < self.clock():
+            logger.info('Cache snapshot %s ignored, it is older than %d seconds', self.path, self.max_age)
+            return 0
+
+        loaded = 0
+        now = self.clock()
+        for name, entries in snapshot['caches'].items():
+            cache = self.caches.get(name)
+            if cache is None:
+                continue
+            valid = []
+            for key, data, expires in entries:
+                if expires is not None and expires <= now:
+                    continue
+                try:
+                    valid.append((key, pickle.loads(data), expires))
+                except Exception:
+                    logger.debug('Cache snapshot entry %r of %s skipped', key, name, exc_info=True)
+            cache.load(valid)
+            loaded += len(valid)
+
+        return loaded
+
+    def save(self) -> int:
+        """ Writes entries of the caches to the snapshot file.
+        :return: number of saved entries
+        """
+        caches = {}
+        saved = 0
+        for name, cache in self.caches.items():
+            entries = []
+            for key, value, expires in cache.entries():
+                try:
+                    entries.append((key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires))
+                except Exception:
+                    logger.debug('Cache entry %r of %s cannot be pickled', key, name, exc_info=True)
+            caches[name] = entries
+            saved += len(entries)
+
+        snapshot = {'version': self.version, 'saved_at': self.clock(), 'caches': caches}
+        fd, temporary = tempfile.mkstemp(prefix='.snapshot-', dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump(snapshot, file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+        return saved
+
+    def close(self):
+        """ Stops periodic saving and saves the snapshot if the process served requests.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._serving:
+            self.save()
+
+    def _start(self):
+        with self._lock:
+            if self._serving:
+                return
+            self._serving = True
+            if self.interval:
+                self._thread = Thread(target=self._run, name='bolt-cache-snapshot', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.save()
+            except Exception:
+                logger.exception('Cache snapshot %s could not be saved', self.path)
+
+    def _reset(self):
+        # Forked process saves only once it serves requests itself
+        self._serving = False
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
@@ -0,0 +1,223 @@
+"""
+Lightweight request tracing. Framework opens spans around route matching,
+middleware, controller and ODM operations; spans are recorded only when
+a trace is active, so without Tracer installed they cost a single lookup.
+"""
+from contextvars import ContextVar
+from threading import Lock
+import json
+import random
+import re
+import time
+
+
+TRACEPARENT_PATTERN = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current_span = ContextVar('bolt_current_span', default=None)
+
+
+class Span:
+
+    def __init__(self, name, trace, parent_id=None, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.trace_id = trace.trace_id
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+        self._started = time.perf_counter()
+
+    def set(self, name, value):
+        self.attributes[name] = value
+
+    def end(self):
+        self.duration = time.perf_counter() - self._started
+        self.trace.spans.append(self)
+
+    @property
+    def traceparent(self):
+        return '00-%s-%s-01' % (self.trace_id, self.span_id)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration': self.duration,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class Trace:
+    """ Spans of one request, appended as they end and handed to the exporter together.
+    """
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+
+
+class SpanScope:
+    """ Makes the span current within the `with` block, ending it and noting
+    the exception (if any) on exit.
+    """
+    def __init__(self, span):
+        self.span = span
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_value is not None:
+            self.span.error = '%s: %s' % (exc_type.__name__, exc_value)
+        _current_span.reset(self._token)
+        self.span.end()
+
+
+class NoopScope:
+    """ Stand-in for SpanScope outside of traced requests, so instrumented code
+    costs nothing when tracing is off.
+    """
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return None
+
+
+_noop_scope = NoopScope()
+
+
+def span(name, **attributes):
+    """ Opens child span of the current span:
+
+        with span('cache.lookup', key=key):
+            ...
+
+    Does nothing if there is no active trace.
+    :param name: span name
+    :param attributes: span attributes
+    :return: context manager
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _noop_scope
+
+    return SpanScope(Span(name, parent.trace, parent.span_id, attributes))
+
+
+def current_span() -> Span:
+    return _current_span.get()
+
+
+def parse_traceparent(header):
+    """ Parses W3C traceparent header.
+    :param header: header's value
+    :return: tuple (trace_id, parent_id, sampled) or None if header is not valid
+    """
+    if not header:
+        return None
+    matched = TRACEPARENT_PATTERN.match(header.strip().lower())
+    if matched is None or matched.group(1) == '0' * 32 or matched.group(2) == '0' * 16:
+        return None
+
+    return matched.group(1), matched.group(2), bool(int(matched.group(3), 16) & 1)
+
+
+class SpanExporter:
+    def export(self, spans):
+        raise NotImplementedError()
+
+
+class InMemoryExporter(SpanExporter):
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+class JsonFileExporter(SpanExporter):
+    """ Appends spans to a file, one JSON object per line.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+
+    def export(self, spans):
+        lines = ''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in spans)
+        with self._lock:
+            with open(self.path, 'a') as file:
+                file.write(lines)
+
+
+class Tracer:
+    """ Starts a trace for every sampled request and passes its spans to the exporter
+    once the request is processed.
+
+    Usage:
+        app.use(Tracer(JsonFileExporter('/var/log/app/spans.jsonl')))
+
+    Trace id and parent span are taken from incoming traceparent header,
+    if the header is missing requests are sampled with sample_rate probability.
+    """
+    HEADER = 'traceparent'
+
+    def __init__(self, exporter: SpanExporter, sample_rate=1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def __call__(self, app):
+        app.intercept(self.intercept)
+
+    def intercept(self, request, handler):
+        parent = parse_traceparent(request.get_header(self.HEADER))
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = None, None
+            sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+        if not sampled:
+            return handler(request)
+
+        with self.trace('request', trace_id, parent_id, method=request.method, path=request.uri.path) as root:
+            response = handler(request)
+            root.set('status', response.status)
+            if request.route is not None:
+                root.set('route', request.route.name)
+            response.set_header(self.HEADER, root.traceparent)
+            return response
+
+    def trace(self, name, trace_id=None, parent_id=None, **attributes):
+        """ Starts new trace (or continues remote one) outside of request processing,
+        e.g. in background jobs.
+
+        :param name: root span name
+        :param trace_id: remote trace id
+        :param parent_id: remote parent span id
+        :return: context manager
+        """
+        return TraceScope(self, Span(name, Trace(trace_id or '%032x' % random.getrandbits(128)), parent_id,
+                                     attributes))
+
+
+class TraceScope(SpanScope):
+    """ Scope of the request's root span, the whole trace goes to the tracer's
+    exporter once it closes.
+    """
+    def __init__(self, tracer, root):
+        super().__init__(root)
+        self._tracer = tracer
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        self._tracer.exporter.export(self.span.trace.spans)
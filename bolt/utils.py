@@ -26,6 +26,11 @@ def find_clsname(method):
     return None
 
 
+class Serializable:
+    def serialize(self):
+        return {}
+
+
 def get_fqn(obj):
     return inspect.getmodule(obj).__name__ + '.' + obj.__name__
 
@@ -1,6 +1,5 @@
 import re
 from datetime import datetime, date
-from dateutil import parser as date_parser
 from bolt.http import Request, Response, HttpException
 from bolt.router import Route
 
@@ -246,6 +245,8 @@ class DateValidator(ValidationRule, RangeAwareValidator):
             return result(is_valid)
 
         if self._format is None:
+            # dateutil is imported on first use, it is slow to import
+            from dateutil import parser as date_parser
             try:
                 date = date_parser.parse(value)
             except ValueError:
@@ -0,0 +1,108 @@
+import unittest
+import tempfile
+import json
+import io
+import os
+from bolt.application import Bolt
+from bolt.http import Response
+from bolt.accesslog import AccessLog
+from tests.fixtures import call_app
+
+
+class EchoController:
+    def __call__(self):
+        return Response('zażółć')
+
+
+class AsciiController:
+    def __call__(self):
+        return Response('ok')
+
+
+class FailingController:
+    def __call__(self):
+        raise RuntimeError('Storage unavailable')
+
+
+class AccessLogTest(unittest.TestCase):
+
+    def test_records(self):
+        path = os.path.join(tempfile.mkdtemp(), 'access.jsonl')
+        log = AccessLog(path, flush_interval=0.01)
+        app = Bolt()
+        app.use(log)
+        app.expose('/echo/{id}', EchoController(), ['GET'])
+        app.ready()
+
+        call_app(app, '/echo/1')
+        call_app(app, '/missing')
+        log.close()
+
+        with open(path) as file:
+            records = [json.loads(line) for line in file]
+
+        self.assertEqual(2, len(records))
+        self.assertEqual('GET', records[0]['method'])
+        self.assertEqual('/echo/1', records[0]['path'])
+        self.assertEqual('/echo/{id}', records[0]['route'])
+        self.assertEqual(200, records[0]['status'])
+        self.assertEqual(10, records[0]['bytes'])
+        self.assertEqual(['route', 'before', 'controller', 'after'], list(records[0]['timings'].keys()))
+        self.assertEqual(404, records[1]['status'])
+        self.assertIsNone(records[1]['route'])
+
+    def test_failed_request(self):
+        stream = io.StringIO()
+        log = AccessLog(stream)
+        app = Bolt()
+        app.use(log)
+        app.expose('/fail', FailingController(), ['GET'])
+        app.expose('/ascii', AsciiController(), ['GET'])
+        app.ready()
+
+        with self.assertRaises(RuntimeError):
+            call_app(app, '/fail')
+        call_app(app, '/ascii')
+        log.close()
+
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(['/fail', '/ascii'], [record['path'] for record in records])
+        self.assertEqual(500, records[0]['status'])
+        self.assertEqual(0, records[0]['bytes'])
+        self.assertEqual(2, records[1]['bytes'])
+
+    def test_flushed_on_shutdown(self):
+        stream = io.StringIO()
+        log = AccessLog(stream, flush_interval=60)
+        app = Bolt()
+        app.use(log)
+        app.expose('/echo/{id}', EchoController(), ['GET'])
+        app.ready()
+
+        call_app(app, '/echo/1')
+        app.shutdown()
+        self.assertEqual(1, len(stream.getvalue().splitlines()))
+
+    def test_drop_policy(self):
+        stream = io.StringIO()
+        log = AccessLog(stream, buffer_size=2)
+        for i in range(5):
+            log.record({'id': i})
+        self.assertEqual(3, log.dropped)
+
+        log.start()
+        log.close()
+        self.assertEqual([{'id': 0}, {'id': 1}], [json.loads(line) for line in stream.getvalue().splitlines()])
+
+    def test_batches(self):
+        stream = io.StringIO()
+        log = AccessLog(stream, batch_size=2, policy=AccessLog.POLICY_BLOCK)
+        for i in range(5):
+            log.record({'id': i})
+        log.start()
+        log.close()
+        self.assertEqual(5, len(stream.getvalue().splitlines()))
+        self.assertEqual(0, log.dropped)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, AccessLog, io.StringIO(), policy='wait')
@@ -0,0 +1,57 @@
+import unittest
+from bolt.application import Bolt
+from bolt.http import Response
+from bolt.allocations import AllocationProfiler, AllocationBudgetExceeded
+from tests.fixtures import call_app
+
+leaked = []
+
+
+class LeakingController:
+    def __call__(self):
+        leaked.append([object() for i in range(1000)])
+        return Response('leaking')
+
+
+class CleanController:
+    def __call__(self):
+        [object() for i in range(1000)]
+        return Response('clean')
+
+
+class AllocationProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = AllocationProfiler(routes={'/skipped': 0})
+        self.app = Bolt()
+        self.app.use(self.profiler)
+        self.app.expose('/leaking', LeakingController(), ['GET'])
+        self.app.expose('/clean', CleanController(), ['GET'])
+        self.app.expose('/skipped', CleanController(), ['GET'])
+        self.app.ready()
+
+    def tearDown(self):
+        self.profiler.stop()
+        leaked.clear()
+
+    def test_attribution(self):
+        call_app(self.app, '/leaking')
+        call_app(self.app, '/leaking')
+        call_app(self.app, '/clean')
+        call_app(self.app, '/skipped')
+
+        report = self.profiler.report()
+        self.assertEqual(['/leaking', '/clean'], list(report.keys()))
+        self.assertEqual(2, report['/leaking']['requests'])
+        self.assertGreaterEqual(report['/leaking']['max_blocks'], 1000)
+        self.assertLess(report['/clean']['max_blocks'], 1000)
+        self.assertIn('allocationstest.py', report['/leaking']['top'][0][0])
+
+    def test_budget(self):
+        call_app(self.app, '/leaking')
+        call_app(self.app, '/clean')
+
+        self.assertTrue(self.profiler.check('/clean', max_blocks=1000))
+        self.assertRaises(AllocationBudgetExceeded, self.profiler.check, '/leaking', max_blocks=1000)
+        self.assertRaises(AllocationBudgetExceeded, self.profiler.check, '/leaking', max_size=1024)
+        self.assertRaises(AllocationBudgetExceeded, self.profiler.check, '/skipped', max_blocks=1000)
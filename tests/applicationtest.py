@@ -33,6 +33,14 @@ class ServiceLocatorTest(unittest.TestCase):
         service_instance = sl.get(TestService)
         self.assertIsInstance(service_instance, TestService)
 
+    def test_from_self_isolation(self):
+        sl = ServiceLocator()
+        sl.set(TestService)
+        copy = sl.from_self()
+        copy.set('request specific', 'RequestValue')
+        self.assertIsNone(sl.get('RequestValue'))
+        self.assertIsInstance(copy.get(TestService), TestService)
+
     def test_with_assigned_name(self):
         sl = ServiceLocator()
         sl.set(test_service_factory, 'CustomName')
@@ -71,7 +79,7 @@ class ControllerResolverTest(unittest.TestCase):
         route = app._map.find('/dependencies/33')
         sl = app.service_locator.from_self()
         sl.set(route, Route)
-        controller_resolver = ControllerResolver(route.callback, app.service_locator)
+        controller_resolver = ControllerResolver(route.callback, sl)
         result = controller_resolver.resolve()
 
         self.assertEqual(75, result)
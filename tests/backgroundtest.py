@@ -0,0 +1,125 @@
+import unittest
+import threading
+from bolt.application import Bolt
+from bolt.http import Response, Request
+from bolt.background import Background, BackgroundTasks
+from bolt.deadline import Deadlines, current_deadline
+from bolt.metrics import MetricsRegistry
+from tests.fixtures import call_app, wsgi_env
+
+events = []
+release = threading.Event()
+registry = MetricsRegistry()
+background = Background(workers=1, queue_size=2, registry=registry)
+
+app = Bolt()
+app.use(Deadlines(default=5))
+app.use(background)
+
+
+class AuditLog:
+    def __init__(self, request: Request):
+        self.request = request
+
+    def write(self, action):
+        release.wait(5)
+        events.append((action, self.request.uri.path, current_deadline().remaining()))
+
+
+@app.route('/orders')
+class OrderController:
+
+    def __init__(self, tasks: BackgroundTasks, request: Request):
+        self.tasks = tasks
+        self.audit = AuditLog(request)
+
+    @app.post('')
+    def create(self):
+        self.tasks.add(self.audit.write, 'created')
+        events.append('response')
+        return Response('created', 201)
+
+    @app.delete('')
+    def delete(self):
+        self.tasks.add(self.fail)
+        self.tasks.add(self.audit.write, action='deleted')
+        return Response('deleted')
+
+    @app.get('')
+    def list(self):
+        return Response('orders')
+
+    def fail(self):
+        raise ValueError('failure')
+
+
+app.ready()
+
+
+class BackgroundTest(unittest.TestCase):
+
+    def setUp(self):
+        events.clear()
+        release.clear()
+        background.start()
+
+    def tearDown(self):
+        release.set()
+        background.close()
+
+    def test_runs_after_response(self):
+        response = call_app(app, '/orders', 'POST')
+        self.assertEqual('201 Created', response['status'])
+        self.assertEqual(['response'], events)
+
+        release.set()
+        background.close()
+        self.assertEqual(['response', ('created', '/orders', None)], events)
+
+    def test_not_closed_response(self):
+        result = app(wsgi_env('/orders', 'POST'), lambda status, headers: None)
+        release.set()
+        background.close()
+        self.assertEqual(['response'], events)
+
+        background.start()
+        result.close()
+        background.close()
+        self.assertEqual(('created', '/orders', None), events[1])
+
+    def test_failing_task(self):
+        release.set()
+        with self.assertLogs('bolt.background', 'ERROR'):
+            call_app(app, '/orders', 'DELETE')
+            background.close()
+        self.assertEqual([('deleted', '/orders', None)], events)
+        self.assertEqual(1, background.failed)
+        self.assertIn('bolt_background_tasks_total{status="failed"} 1.0', registry.collect())
+
+    def test_dropped_tasks(self):
+        for i in range(4):
+            call_app(app, '/orders', 'POST')
+        # One task is running, two are queued
+        self.assertGreaterEqual(background.dropped, 1)
+        release.set()
+        background.close()
+        self.assertEqual(4 - background.dropped, len([event for event in events if event != 'response']))
+
+    def test_finished_on_shutdown(self):
+        shutdown_app = Bolt()
+        shutdown_background = Background(workers=1)
+        shutdown_app.use(shutdown_background)
+        shutdown_app.ready()
+        tasks = BackgroundTasks()
+        tasks.add(release.wait, 5)
+        tasks.add(events.append, 'finished')
+        shutdown_background.submit(tasks)
+
+        release.set()
+        shutdown_app.shutdown()
+        self.assertEqual(['finished'], events)
+        self.assertEqual(2, shutdown_background.completed)
+
+    def test_no_tasks(self):
+        response = app(wsgi_env('/orders'), lambda status, headers: None)
+        self.assertFalse(hasattr(response, 'close'))
@@ -0,0 +1,121 @@
+import unittest
+import json
+import os
+import threading
+from bolt.application import Bolt
+from bolt.http import Response, Request, HttpException
+from bolt.router import Route
+from bolt.batch import Batch
+from tests.fixtures import call_app
+
+calls = []
+app = Bolt()
+app.use(Batch(max_requests=3))
+parallel_app = Bolt()
+parallel_app.use(Batch(workers=3))
+barrier = threading.Barrier(3, timeout=5)
+
+
+@app.before()
+def authorize(service_locator):
+    if service_locator.get(Request).get_header('Authorization') != 'secret':
+        raise HttpException('Forbidden', Response.HTTP_FORBIDDEN)
+
+
+@app.route('/users')
+class UserController:
+
+    def __init__(self, request: Request, route: Route):
+        self.request = request
+        self.route = route
+
+    @app.get('/{id}')
+    def get(self):
+        id = self.route.get('id')
+        calls.append(('get', id))
+        return Response(json.dumps({'id': id}), 200, {'Content-Type': 'application/json'})
+
+    @app.post('')
+    def create(self):
+        calls.append(('create', self.request.body.from_json()))
+        return Response('created', 201)
+
+    @app.delete('/{id}')
+    def delete(self):
+        raise RuntimeError('Storage unavailable')
+
+
+@parallel_app.route('/wait')
+class WaitController:
+
+    @parallel_app.get('/{id}')
+    def wait(self, route: Route):
+        barrier.wait()
+        return Response(route.get('id'))
+
+
+app.ready()
+parallel_app.ready()
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def call(self, app, batch, headers=None):
+        return call_app(app, '/batch', 'POST', headers=headers or {'Authorization': 'secret'},
+                        body=json.dumps(batch))
+
+    def test_batch(self):
+        result = self.call(app, [
+            {'path': '/users/1'},
+            {'method': 'post', 'path': '/users', 'body': {'name': 'Bob'}},
+            {'method': 'GET', 'path': '/missing'},
+        ])
+        self.assertEqual('200 OK', result['status'])
+        responses = json.loads(result['body'])
+        self.assertEqual([200, 201, 404], [response['status'] for response in responses])
+        self.assertEqual({'id': '1'}, responses[0]['body'])
+        self.assertEqual('created', responses[1]['body'])
+        self.assertEqual([('get', '1'), ('create', {'name': 'Bob'})], calls)
+
+    def test_failed_sub_request(self):
+        with self.assertLogs('bolt.batch', 'ERROR'):
+            result = self.call(app, [
+                {'path': '/users/1'},
+                {'method': 'DELETE', 'path': '/users/1'},
+                {'path': '/users/2'},
+            ])
+        self.assertEqual('200 OK', result['status'])
+        responses = json.loads(result['body'])
+        self.assertEqual([200, 500, 200], [response['status'] for response in responses])
+        self.assertEqual({'id': '2'}, responses[2]['body'])
+
+    def test_middleware(self):
+        result = self.call(app, [{'path': '/users/1'}], headers={'Authorization': 'wrong'})
+        self.assertEqual('403 Forbidden', result['status'])
+        self.assertEqual([], calls)
+
+    def test_invalid_batch(self):
+        self.assertEqual('400 Bad Request', self.call(app, {'path': '/users/1'})['status'])
+        self.assertEqual('400 Bad Request', self.call(app, [{'path': 'users'}])['status'])
+        self.assertEqual('413 Request Entity Too Large', self.call(app, [{'path': '/users/1'}] * 4)['status'])
+        nested = json.loads(self.call(app, [{'method': 'POST', 'path': '/batch', 'body': []}])['body'])
+        self.assertEqual(400, nested[0]['status'])
+
+    def test_concurrent_batch(self):
+        result = self.call(parallel_app, [{'path': '/wait/%d' % i} for i in range(3)])
+        responses = json.loads(result['body'])
+        self.assertEqual(['0', '1', '2'], [response['body'] for response in responses])
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork')
+    def test_concurrent_batch_after_fork(self):
+        self.call(parallel_app, [{'path': '/wait/%d' % i} for i in range(3)])
+        pid = os.fork()
+        if pid == 0:
+            threading.Timer(5, os._exit, [2]).start()
+            result = self.call(parallel_app, [{'path': '/wait/%d' % i} for i in range(3)])
+            os._exit(0 if len(json.loads(result['body'])) == 3 else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(0, os.waitstatus_to_exitcode(status))
@@ -0,0 +1,408 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from bolt.application import Bolt
+from bolt.cache import MemoryCache, SharedMemoryCache, CachedFunction, Memoization, Tags, cached, entity_tag, \
+    invalidate
+from bolt.http import Response
+from bolt.metrics import MetricsRegistry
+from tests.fixtures import call_app
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+CLOCK = FakeClock()
+
+
+class CacheTestCase:
+
+    def create(self, clock, **kwargs):
+        raise NotImplementedError()
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = self.create(self.clock)
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual('default', self.cache.get('a', 'default'))
+        self.assertTrue(self.cache.set('a', {'name': 'A', 'ids': [1, 2]}))
+        self.assertEqual({'name': 'A', 'ids': [1, 2]}, self.cache.get('a'))
+        self.assertIn('a', self.cache)
+        self.assertTrue(self.cache.set('a', 'replaced'))
+        self.assertEqual('replaced', self.cache.get('a'))
+        self.assertTrue(self.cache.delete('a'))
+        self.assertFalse(self.cache.delete('a'))
+        self.assertNotIn('a', self.cache)
+
+    def test_ttl(self):
+        self.cache.set('a', 1, ttl=10)
+        self.cache.set('b', 2)
+        self.clock.now += 9
+        self.assertEqual(1, self.cache.get('a'))
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(2, self.cache.get('b'))
+
+    def test_add(self):
+        self.assertTrue(self.cache.add('lock', 1, ttl=5))
+        self.assertFalse(self.cache.add('lock', 2, ttl=5))
+        self.assertEqual(1, self.cache.get('lock'))
+        self.clock.now += 5
+        self.assertTrue(self.cache.add('lock', 3))
+
+    def test_incr(self):
+        self.assertEqual(1, self.cache.incr('counter'))
+        self.assertEqual(3, self.cache.incr('counter', 2))
+        self.assertEqual(3, self.cache.get('counter'))
+
+    def test_incr_keeps_ttl(self):
+        self.cache.incr('counter', ttl=10)
+        self.clock.now += 5
+        self.cache.incr('counter', ttl=100)
+        self.clock.now += 5
+        self.assertIsNone(self.cache.get('counter'))
+
+    def test_clear(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_stats(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.get('b')
+        self.assertEqual({'hits': 1, 'misses': 1, 'evictions': 0}, self.cache.stats.as_dict())
+
+
+class MemoryCacheTest(CacheTestCase, unittest.TestCase):
+
+    def create(self, clock, **kwargs):
+        return MemoryCache(clock=clock, **kwargs)
+
+    def test_lru_eviction(self):
+        cache = self.create(self.clock, maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(1, cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.stats.evictions)
+
+
+class SharedMemoryCacheTest(CacheTestCase, unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        super().setUp()
+
+    def tearDown(self):
+        self.cache.memory.close()
+        self.directory.cleanup()
+
+    def create(self, clock, **kwargs):
+        return SharedMemoryCache(os.path.join(self.directory.name, 'cache'), clock=clock, **kwargs)
+
+    def test_clock_eviction(self):
+        cache = SharedMemoryCache(os.path.join(self.directory.name, 'small'), capacity=2, group_size=2,
+                                  clock=self.clock)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        # Both entries referenced, hand clears 'a' and 'b', then evicts 'a'
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('a'))
+        # 'c' is referenced since written, 'b' was passed by the hand and is evicted
+        cache.get('c')
+        cache.set('d', 4)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(3, cache.get('c'))
+        self.assertEqual(4, cache.get('d'))
+        self.assertEqual(2, cache.stats.evictions)
+
+    def test_too_big_entry(self):
+        self.assertFalse(self.cache.set('big', 'x' * 1000))
+        self.assertIsNone(self.cache.get('big'))
+
+    def test_too_big_counter(self):
+        cache = SharedMemoryCache(os.path.join(self.directory.name, 'counters'), capacity=2, slot_size=64,
+                                  group_size=2, clock=self.clock)
+        key = 'k' * 20
+        cache.set('neighbour', 'value')
+        self.assertEqual(1, cache.incr(key))
+        with self.assertRaises(ValueError):
+            cache.incr(key, 2 ** 200)
+        with self.assertRaises(ValueError):
+            cache.incr('x' * 64)
+        self.assertEqual(1, cache.get(key))
+        self.assertEqual('value', cache.get('neighbour'))
+        cache.memory.close()
+
+    def test_shared_between_processes(self):
+        path = os.path.join(self.directory.name, 'cache')
+        self.cache.set('parent', 'value')
+        pid = os.fork()
+        if pid == 0:
+            code = 0 if self.cache.get('parent') == 'value' and self.cache.set('child', [1, 2]) else 1
+            self.cache.incr('counter')
+            os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(0, os.waitstatus_to_exitcode(status))
+
+        opened = SharedMemoryCache(path, clock=self.clock)
+        self.assertEqual([1, 2], opened.get('child'))
+        self.assertEqual(2, opened.incr('counter'))
+        self.assertEqual(2, self.cache.get('counter'))
+        opened.memory.close()
+
+
+class ConfigService:
+    loads = 0
+
+    @cached(ttl=10, cache=MemoryCache(clock=CLOCK))
+    def resolve(self, name, default=None):
+        ConfigService.loads += 1
+        return '%s=%s' % (name, default)
+
+    @cached(scope='request')
+    def permissions(self, user):
+        ConfigService.loads += 1
+        return [user, 'read']
+
+
+registry = MetricsRegistry()
+app = Bolt()
+app.use(Memoization(registry=registry))
+app.service_locator.set(ConfigService)
+
+
+@app.route('/config')
+class ConfigController:
+    def __init__(self, config: ConfigService):
+        self.config = config
+
+    @app.get('/permissions')
+    def permissions(self):
+        self.config.permissions('admin')
+        return Response(str(len(self.config.permissions('admin'))))
+
+
+app.ready()
+
+
+class CachedTest(unittest.TestCase):
+
+    def setUp(self):
+        ConfigService.loads = 0
+        ConfigService.resolve.clear()
+        CLOCK.now = 1000.0
+
+    def test_app_scope_shared_by_instances(self):
+        self.assertEqual('a=1', ConfigService().resolve('a', default=1))
+        self.assertEqual('a=1', ConfigService().resolve('a', default=1))
+        self.assertEqual('b=None', ConfigService().resolve('b'))
+        self.assertEqual(2, ConfigService.loads)
+        self.assertEqual(1, ConfigService.resolve.stats.hits)
+        self.assertEqual(2, ConfigService.resolve.stats.misses)
+
+    def test_ttl(self):
+        ConfigService().resolve('a')
+        CLOCK.now += 10
+        ConfigService().resolve('a')
+        self.assertEqual(2, ConfigService.loads)
+
+    def test_invalidate(self):
+        service = ConfigService()
+        service.resolve('a')
+        service.resolve('b')
+        service.resolve.invalidate('a')
+        service.resolve('a')
+        service.resolve('b')
+        self.assertEqual(3, ConfigService.loads)
+
+    def test_custom_key(self):
+        calls = []
+
+        @cached(key=lambda user, action: '%s:%s' % (user['id'], action))
+        def allowed(user, action):
+            calls.append(action)
+            return True
+
+        allowed({'id': 1, 'name': 'A'}, 'edit')
+        allowed({'id': 1, 'name': 'B'}, 'edit')
+        self.assertEqual(['edit'], calls)
+        self.assertTrue(allowed.key(({'id': 1}, 'edit'), {}).endswith('.allowed(1:edit)'))
+
+    def test_default_key(self):
+        key = ConfigService.resolve.key(('a', [1, {'b': 2, 'a': 1}], {2, 1}), {'z': None, 'default': 1.5})
+        self.assertTrue(key.endswith(".resolve('a', [1, {'a': 1, 'b': 2}], {1, 2}, default=1.5, z=None)"))
+
+    def test_arguments_without_stable_repr(self):
+        @cached()
+        def check(user, action):
+            return True
+
+        self.assertRaises(TypeError, check, object(), 'edit')
+        self.assertRaises(TypeError, check, [object()], 'edit')
+        self.assertRaises(TypeError, check, 'user', action=lambda: None)
+
+    def test_stampede_protection(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        @cached()
+        def slow(name):
+            calls.append(name)
+            started.set()
+            release.wait(5)
+            return name.upper()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow('a'))) for i in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(['a'], calls)
+        self.assertEqual(['A'] * 5, results)
+
+    def test_errors_are_not_cached(self):
+        calls = []
+
+        @cached()
+        def failing():
+            calls.append(1)
+            raise ValueError('failed')
+
+        self.assertRaises(ValueError, failing)
+        self.assertRaises(ValueError, failing)
+        self.assertEqual(2, len(calls))
+
+    def test_shared_memory_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SharedMemoryCache(os.path.join(directory, 'cache'))
+            calls = []
+
+            @cached(cache=backend)
+            def lookup(name):
+                calls.append(name)
+                return {'name': name}
+
+            self.assertEqual({'name': 'a'}, lookup('a'))
+            self.assertEqual({'name': 'a'}, lookup('a'))
+            self.assertEqual(1, len(calls))
+            backend.memory.close()
+
+    def test_request_scope(self):
+        self.assertEqual('2', call_app(app, '/config/permissions')['body'])
+        self.assertEqual('2', call_app(app, '/config/permissions')['body'])
+        # Computed once per request
+        self.assertEqual(2, ConfigService.loads)
+        name = ConfigService.permissions.name
+        self.assertIn('bolt_cached_calls_total{function="%s",result="hit"} 2.0' % name, registry.collect())
+        self.assertEqual({'hits': 2, 'misses': 2, 'evictions': 0}, Memoization.stats()[name])
+
+    def test_request_scope_without_plugin(self):
+        service = ConfigService()
+        service.permissions('admin')
+        service.permissions('admin')
+        self.assertEqual(2, ConfigService.loads)
+
+
+class TagsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tags = Tags()
+        CachedFunction.tags = self.tags
+
+    def tearDown(self):
+        CachedFunction.tags = Tags()
+
+    def test_versions(self):
+        versions = self.tags.versions(['users', 'users:1'])
+        self.assertTrue(self.tags.valid(['users', 'users:1'], versions))
+        self.tags.invalidate('users:2')
+        self.assertTrue(self.tags.valid(['users', 'users:1'], versions))
+        self.tags.invalidate('users:1')
+        self.assertFalse(self.tags.valid(['users', 'users:1'], versions))
+
+    def test_wildcard(self):
+        versions = self.tags.versions(['users:1'])
+        self.tags.invalidate('users:*')
+        self.assertFalse(self.tags.valid(['users:1'], versions))
+
+    def test_lost_version_invalidates(self):
+        versions = self.tags.versions(['users'])
+        self.tags.backend.clear()
+        self.assertFalse(self.tags.valid(['users'], versions))
+
+    def test_tagged_cached(self):
+        calls = []
+
+        @cached(tags=lambda id: ['users', entity_tag('users', id)])
+        def user(id):
+            calls.append(id)
+            return {'id': id}
+
+        user(1)
+        user(2)
+        user(1)
+        self.assertEqual([1, 2], calls)
+        invalidate(entity_tag('users', 1))
+        user(1)
+        user(2)
+        self.assertEqual([1, 2, 1], calls)
+        invalidate('users')
+        user(2)
+        self.assertEqual([1, 2, 1, 2], calls)
+
+    def test_static_tags(self):
+        calls = []
+
+        @cached(tags=['config'])
+        def config():
+            calls.append(1)
+            return 'value'
+
+        config()
+        config()
+        invalidate('config')
+        config()
+        self.assertEqual(2, len(calls))
+
+    def test_invalidation_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            app = Bolt()
+            app.use(Memoization(tags=SharedMemoryCache(os.path.join(directory, 'tags'))))
+            app.ready()
+            calls = []
+
+            @cached(tags=lambda id: [entity_tag('users', id)])
+            def user(id):
+                calls.append(id)
+                return id
+
+            user(1)
+            pid = os.fork()
+            if pid == 0:
+                invalidate(entity_tag('users', 1))
+                os._exit(0)
+            os.waitpid(pid, 0)
+            user(1)
+            self.assertEqual([1, 1], calls)
+            CachedFunction.tags.backend.memory.close()
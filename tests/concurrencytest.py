@@ -0,0 +1,330 @@
+import unittest
+import threading
+import time
+from bolt.application import Bolt
+from bolt.http import Response
+from bolt.concurrency import Lane, LaneScheduler, Bulkhead, Bulkheads, AIMDLimit, GradientLimit, AdaptiveLimiter
+from bolt.metrics import MetricsRegistry
+from tests.fixtures import call_app
+
+
+class LaneSchedulerTest(unittest.TestCase):
+
+    def test_lane_limit(self):
+        scheduler = LaneScheduler(3, {'bulk': Lane(limit=2)}, timeout=0)
+        self.assertTrue(scheduler.acquire('bulk'))
+        self.assertTrue(scheduler.acquire('bulk'))
+        self.assertFalse(scheduler.acquire('bulk'))
+        self.assertTrue(scheduler.acquire('default'))
+        self.assertEqual({'running': 2, 'waiting': 0, 'rejected': 1}, scheduler.stats()['bulk'])
+
+    def test_rejects_without_waiting_by_default(self):
+        scheduler = LaneScheduler(1)
+        self.assertTrue(scheduler.acquire('default'))
+        started = time.monotonic()
+        self.assertFalse(scheduler.acquire('default'))
+        self.assertLess(time.monotonic() - started, 0.1)
+
+    def test_lane_over_limit_does_not_wait(self):
+        scheduler = LaneScheduler(3, {'bulk': Lane(limit=1)}, timeout=5)
+        self.assertTrue(scheduler.acquire('bulk'))
+        started = time.monotonic()
+        self.assertFalse(scheduler.acquire('bulk'))
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual({'running': 1, 'waiting': 0, 'rejected': 1}, scheduler.stats()['bulk'])
+
+    def test_reserved_capacity(self):
+        scheduler = LaneScheduler(2, {'default': Lane(reserved=1)}, timeout=0)
+        self.assertTrue(scheduler.acquire('bulk'))
+        self.assertFalse(scheduler.acquire('bulk'))
+        self.assertTrue(scheduler.acquire('default'))
+        self.assertFalse(scheduler.acquire('default'))
+
+        scheduler.release('bulk')
+        self.assertTrue(scheduler.acquire('default'))
+
+    def test_invalid_reservation(self):
+        self.assertRaises(ValueError, LaneScheduler, 2, {'a': Lane(reserved=1), 'b': Lane(reserved=1)})
+        self.assertRaises(ValueError, Lane, weight=0)
+
+    def test_waiting_request_gets_freed_slot(self):
+        scheduler = LaneScheduler(1, timeout=5)
+        self.assertTrue(scheduler.acquire('default'))
+        acquired = []
+        waiting = threading.Thread(target=lambda: acquired.append(scheduler.acquire('default')))
+        waiting.start()
+        while not scheduler.stats()['default']['waiting']:
+            time.sleep(0.001)
+        scheduler.release('default')
+        waiting.join(5)
+        self.assertEqual([True], acquired)
+
+    def test_weighted_fairness(self):
+        scheduler = LaneScheduler(1, {'fast': Lane(weight=3), 'bulk': Lane(weight=1)}, timeout=5)
+        self.assertTrue(scheduler.acquire('default'))
+        order = []
+        lock = threading.Lock()
+
+        def run(lane):
+            scheduler.acquire(lane)
+            with lock:
+                order.append(lane)
+
+        threads = []
+        for lane in ['bulk'] * 4 + ['fast'] * 4:
+            thread = threading.Thread(target=run, args=(lane,))
+            thread.start()
+            threads.append(thread)
+        while sum(lane['waiting'] for lane in scheduler.stats().values()) < 8:
+            time.sleep(0.001)
+
+        released = 'default'
+        for i in range(8):
+            scheduler.release(released)
+            while len(order) <= i:
+                time.sleep(0.001)
+            released = order[i]
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(3, order[:4].count('fast'))
+
+    def test_rejection(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        class ReportController:
+            def __call__(self):
+                entered.set()
+                release.wait(5)
+                return Response('report')
+
+        app = Bolt()
+        app.use(LaneScheduler(4, {'bulk': Lane(limit=1)}, timeout=0, retry_after=3))
+        app.expose('/report', ReportController(), ['GET'], {LaneScheduler.LANE: 'bulk'})
+        app.ready()
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(call_app(app, '/report')))
+        first.start()
+        self.assertTrue(entered.wait(5))
+        rejected = call_app(app, '/report')
+        release.set()
+        first.join(5)
+
+        self.assertEqual('503 Service Unavailable', rejected['status'])
+        self.assertEqual('3', rejected['headers']['Retry-After'])
+        self.assertEqual('200 OK', results[0]['status'])
+
+
+blocked = threading.Event()
+unblock = threading.Event()
+
+bulkhead_app = Bolt()
+bulkhead_registry = MetricsRegistry()
+bulkheads = Bulkheads({__name__ + '.ExportController': 1}, registry=bulkhead_registry)
+bulkhead_app.use(bulkheads)
+
+
+@bulkhead_app.route('/export')
+class ExportController:
+
+    @bulkhead_app.get('/csv')
+    def csv(self):
+        blocked.set()
+        unblock.wait(5)
+        return Response('csv')
+
+    @bulkhead_app.get('/json')
+    def json(self):
+        return Response('json')
+
+
+@bulkhead_app.route('/search')
+class SearchController:
+
+    @bulkhead_app.get('/slow', concurrency=1, concurrency_timeout=0.5)
+    def slow(self):
+        blocked.set()
+        unblock.wait(5)
+        return Response('slow')
+
+    @bulkhead_app.get('/fast')
+    def fast(self):
+        return Response('fast')
+
+
+bulkhead_app.ready()
+
+
+class BulkheadTest(unittest.TestCase):
+
+    def setUp(self):
+        blocked.clear()
+        unblock.clear()
+
+    def test_bulkhead(self):
+        bulkhead = Bulkhead('test', 2)
+        self.assertTrue(bulkhead.acquire())
+        self.assertTrue(bulkhead.acquire())
+        self.assertFalse(bulkhead.acquire())
+        bulkhead.release()
+        self.assertTrue(bulkhead.acquire())
+        self.assertEqual(2, bulkhead.in_flight)
+        self.assertEqual(1, bulkhead.rejected)
+
+    def test_controller_bulkhead(self):
+        results = []
+        first = threading.Thread(target=lambda: results.append(call_app(bulkhead_app, '/export/csv')))
+        first.start()
+        self.assertTrue(blocked.wait(5))
+
+        self.assertEqual('503 Service Unavailable', call_app(bulkhead_app, '/export/json')['status'])
+        self.assertEqual('200 OK', call_app(bulkhead_app, '/search/fast')['status'])
+        unblock.set()
+        first.join(5)
+        self.assertEqual('200 OK', results[0]['status'])
+        self.assertEqual('200 OK', call_app(bulkhead_app, '/export/json')['status'])
+
+        stats = bulkheads.stats()[__name__ + '.ExportController']
+        self.assertEqual({'limit': 1, 'in_flight': 0, 'rejected': 1}, stats)
+        output = bulkhead_registry.collect()
+        self.assertIn('bolt_bulkhead_rejected_total{bulkhead="%s.ExportController"} 1.0' % __name__, output)
+        self.assertIn('bolt_bulkhead_in_flight{bulkhead="%s.ExportController"} 0.0' % __name__, output)
+
+    def test_route_bulkhead_queues(self):
+        results = []
+        first = threading.Thread(target=lambda: results.append(call_app(bulkhead_app, '/search/slow')))
+        first.start()
+        self.assertTrue(blocked.wait(5))
+        second = threading.Thread(target=lambda: results.append(call_app(bulkhead_app, '/search/slow')))
+        second.start()
+        time.sleep(0.05)
+        unblock.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(['200 OK', '200 OK'], [result['status'] for result in results])
+        self.assertEqual(0, bulkheads.stats()['/search/slow']['rejected'])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class AdaptiveLimitTest(unittest.TestCase):
+
+    def test_aimd(self):
+        limit = AIMDLimit(initial=4, min_limit=2, max_limit=6, latency_threshold=0.1, backoff=0.5)
+        self.assertEqual(5, limit.update(0.01, in_flight=2))
+        self.assertEqual(6, limit.update(0.01, in_flight=3))
+        self.assertEqual(6, limit.update(0.01, in_flight=3))
+        self.assertEqual(6, limit.update(0.01, in_flight=1))
+        self.assertEqual(3, limit.update(0.5, in_flight=1))
+        self.assertEqual(2, limit.update(0.01, in_flight=1, dropped=True))
+
+    def test_gradient(self):
+        limit = GradientLimit(initial=20, smoothing=0.5)
+        for i in range(10):
+            limit.update(0.01, in_flight=20)
+        grown = limit.limit
+        self.assertGreater(grown, 20)
+
+        for i in range(10):
+            limit.update(0.1, in_flight=20)
+        self.assertLess(limit.limit, grown / 4)
+
+        shrunk = limit.limit
+        for i in range(10):
+            limit.update(0.01, in_flight=20)
+        self.assertGreater(limit.limit, shrunk)
+
+    def test_gradient_unutilized_limit(self):
+        limit = GradientLimit(initial=20)
+        for i in range(10):
+            limit.update(0.01, in_flight=1)
+        self.assertEqual(20, limit.limit)
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        clock = self.clock
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        test = self
+
+        class SlowController:
+            latency = 0.5
+
+            def __call__(self):
+                clock.now += self.latency
+                return Response('slow')
+
+        class BlockingController:
+            def __call__(self):
+                test.entered.set()
+                test.release.wait(5)
+                return Response('blocking')
+
+        self.slow = SlowController()
+        self.registry = MetricsRegistry()
+        self.app = Bolt()
+        self.app.expose('/slow', self.slow, ['GET'])
+        self.app.expose('/blocking', BlockingController(), ['GET'])
+
+    def test_limit_follows_latency(self):
+        limiter = AdaptiveLimiter(AIMDLimit(initial=8, latency_threshold=0.1, backoff=0.5),
+                                  clock=self.clock, registry=self.registry)
+        self.app.use(limiter)
+        self.app.ready()
+
+        for i in range(3):
+            self.assertEqual('200 OK', call_app(self.app, '/slow')['status'])
+        self.assertEqual(1, limiter.stats()[AdaptiveLimiter.GLOBAL]['limit'])
+        self.assertIn('bolt_adaptive_limit{limit="*"} 1.0', self.registry.collect())
+
+        self.slow.latency = 0.01
+        call_app(self.app, '/slow')
+        call_app(self.app, '/slow')
+        self.assertEqual(3, limiter.stats()[AdaptiveLimiter.GLOBAL]['limit'])
+
+    def test_shedding(self):
+        limiter = AdaptiveLimiter(AIMDLimit(initial=1), clock=self.clock, retry_after=2, registry=self.registry)
+        self.app.use(limiter)
+        self.app.ready()
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(call_app(self.app, '/blocking')))
+        first.start()
+        self.assertTrue(self.entered.wait(5))
+        rejected = call_app(self.app, '/slow')
+        self.release.set()
+        first.join(5)
+
+        self.assertEqual('503 Service Unavailable', rejected['status'])
+        self.assertEqual('2', rejected['headers']['Retry-After'])
+        self.assertEqual('200 OK', results[0]['status'])
+        self.assertEqual(1, limiter.stats()[AdaptiveLimiter.GLOBAL]['rejected'])
+        self.assertIn('bolt_adaptive_limit_rejected_total{limit="*"} 1.0', self.registry.collect())
+
+    def test_per_route(self):
+        limiter = AdaptiveLimiter(AIMDLimit(initial=4, latency_threshold=0.1, backoff=0.5),
+                                  per_route=True, clock=self.clock)
+        self.app.use(limiter)
+        self.app.ready()
+
+        call_app(self.app, '/slow')
+        self.release.set()
+        call_app(self.app, '/blocking')
+        self.assertEqual('404 Not Found', call_app(self.app, '/missing')['status'])
+
+        stats = limiter.stats()
+        self.assertEqual(2, stats['/slow']['limit'])
+        self.assertEqual(4, stats['/blocking']['limit'])
+        self.assertNotIn(AdaptiveLimiter.GLOBAL, stats)
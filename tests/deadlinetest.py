@@ -0,0 +1,141 @@
+import unittest
+import pymongo
+from unittest import mock
+from bolt.application import Bolt
+from bolt.http import Response
+from bolt.deadline import Deadline, Deadlines, DeadlineExceeded, current_deadline
+from bolt.odm import Query
+from tests.fixtures import call_app
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+clock = FakeClock()
+app = Bolt()
+app.use(Deadlines(default=10, clock=clock))
+seen = {}
+
+
+@app.route('/reports')
+class ReportController:
+
+    def __init__(self, deadline: Deadline):
+        self.deadline = deadline
+
+    @app.get('/slow', timeout=1)
+    def slow(self):
+        clock.now += 2
+        return Response('late')
+
+    @app.get('/steps', timeout=1)
+    def steps(self):
+        clock.now += 2
+        self.deadline.check()
+        seen['after_check'] = True
+        return Response('late')
+
+    @app.get('/remaining')
+    def remaining(self):
+        seen['remaining'] = self.deadline.remaining()
+        seen['current'] = current_deadline()
+        return Response('ok')
+
+
+app.ready()
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def setUp(self):
+        seen.clear()
+
+    def test_deadline(self):
+        deadline = Deadline(2, clock)
+        self.assertEqual(2, deadline.remaining())
+        self.assertEqual(2000, deadline.max_time_ms())
+        clock.now += 3
+        self.assertTrue(deadline.expired)
+        self.assertEqual(0, deadline.remaining())
+        self.assertEqual(1, deadline.max_time_ms())
+        self.assertRaises(DeadlineExceeded, deadline.check)
+
+        unlimited = Deadline()
+        self.assertFalse(unlimited.expired)
+        self.assertIsNone(unlimited.remaining())
+        self.assertIsNone(unlimited.max_time_ms())
+
+    def test_expired_response(self):
+        self.assertEqual('504 Gateway Timeout', call_app(app, '/reports/slow')['status'])
+
+    def test_check_stops_controller(self):
+        self.assertEqual('504 Gateway Timeout', call_app(app, '/reports/steps')['status'])
+        self.assertNotIn('after_check', seen)
+
+    def test_injected_deadline(self):
+        self.assertEqual('200 OK', call_app(app, '/reports/remaining')['status'])
+        self.assertEqual(10, seen['remaining'])
+        self.assertIsNone(current_deadline())
+
+    def test_header_timeout(self):
+        call_app(app, '/reports/remaining', headers={'X-Request-Timeout': '0.5'})
+        self.assertEqual(0.5, seen['remaining'])
+        call_app(app, '/reports/remaining', headers={'X-Request-Timeout': '50'})
+        self.assertEqual(10, seen['remaining'])
+        self.assertEqual('400 Bad Request',
+                         call_app(app, '/reports/remaining', headers={'X-Request-Timeout': 'soon'})['status'])
+
+    def test_header_timeout_out_of_range(self):
+        for value in ('nan', 'inf', '-1', '0'):
+            self.assertEqual('400 Bad Request',
+                             call_app(app, '/reports/remaining', headers={'X-Request-Timeout': value})['status'])
+
+    def test_without_deadline(self):
+        unlimited = Bolt()
+        unlimited.use(Deadlines(clock=clock))
+        unlimited.expose('/remaining', ReportController.remaining, ['GET'])
+        unlimited.ready()
+
+        self.assertEqual('200 OK', call_app(unlimited, '/remaining')['status'])
+        self.assertIsNone(seen['remaining'])
+        self.assertIsNone(seen['current'])
+
+
+class QueryDeadlineTest(unittest.TestCase):
+
+    def setUp(self):
+        client = pymongo.MongoClient('mongodb://localhost:1', connect=False)
+        self.query = Query(client.get_database('test'), 'users')
+
+    def test_max_time_ms(self):
+        with mock.patch.object(pymongo.collection.Collection, 'count_documents') as count_documents:
+            with Deadline(1.5, clock).scope():
+                self.query.count_documents({})
+            self.query.count_documents({})
+
+        self.assertEqual([mock.call(self.query, {}, maxTimeMS=1500), mock.call(self.query, {})],
+                         count_documents.call_args_list)
+
+        with mock.patch('bolt.odm.Cursor') as cursor:
+            with Deadline(1.5, clock).scope():
+                self.query.find({})
+        cursor.assert_called_once_with(self.query, {}, max_time_ms=1500)
+
+    def test_expired_deadline(self):
+        with mock.patch.object(pymongo.collection.Collection, 'insert_one') as insert_one:
+            with Deadline(1, clock).scope():
+                clock.now += 1
+                self.assertRaises(DeadlineExceeded, self.query.insert_one, {'name': 'Bob'})
+        insert_one.assert_not_called()
+
+    def test_execution_timeout(self):
+        with mock.patch.object(pymongo.collection.Collection, 'aggregate',
+                               side_effect=pymongo.errors.ExecutionTimeout('exceeded')):
+            with Deadline(1, clock).scope():
+                self.assertRaises(DeadlineExceeded, self.query.aggregate, [])
+            self.assertRaises(pymongo.errors.ExecutionTimeout, self.query.aggregate, [])
@@ -0,0 +1,133 @@
+import unittest
+import os
+import threading
+import time
+from bolt.application import Bolt
+from bolt.http import Response
+from bolt.deadline import Deadline, DeadlineExceeded, current_deadline
+from bolt.fanout import FanOut, Parallel
+from bolt.metrics import MetricsRegistry
+from tests.fixtures import call_app
+
+
+class ParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.fan_out = FanOut(workers=2, registry=self.registry)
+        self.parallel = Parallel(self.fan_out)
+
+    def tearDown(self):
+        self.fan_out.shutdown()
+
+    def test_gather(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def first():
+            barrier.wait()
+            return 1
+
+        def second():
+            barrier.wait()
+            return 2
+
+        self.assertEqual([1, 2], self.parallel.gather(first, second))
+        self.assertEqual(['first', 'second'], [timing['call'] for timing in self.parallel.timings])
+        self.assertEqual(['ok', 'ok'], [timing['status'] for timing in self.parallel.timings])
+        self.assertIn('bolt_fan_out_call_duration_seconds_count{status="ok"} 2.0', self.registry.collect())
+
+    def test_cancel_on_failure(self):
+        release = threading.Event()
+
+        def blocking():
+            release.wait(5)
+
+        def failing():
+            raise ValueError('failed')
+
+        self.assertRaises(ValueError, self.parallel.gather, blocking, failing, blocking, blocking, blocking)
+        statuses = [timing['status'] for timing in self.parallel.timings]
+        release.set()
+        self.assertEqual('error', statuses[1])
+        # At most one blocking call could have been started by the thread which run failing call
+        self.assertGreaterEqual(statuses.count('cancelled'), 2)
+
+    def test_wait_for_all(self):
+        calls = []
+
+        def failing():
+            raise ValueError('failed')
+
+        def slow():
+            time.sleep(0.05)
+            calls.append('slow')
+
+        self.assertRaises(ValueError, self.parallel.gather, failing, slow, slow, cancel_on_failure=False)
+        self.assertEqual(['slow', 'slow'], calls)
+
+    def test_deadline(self):
+        release = threading.Event()
+        deadlines = []
+
+        def blocking():
+            deadlines.append(current_deadline())
+            release.wait(5)
+
+        with Deadline(0.05).scope() as deadline:
+            self.assertRaises(DeadlineExceeded, self.parallel.gather, blocking, blocking, blocking)
+        release.set()
+        self.assertEqual([deadline, deadline], deadlines)
+        self.assertEqual('cancelled', self.parallel.timings[2]['status'])
+
+    def test_nested_gather(self):
+        fan_out = FanOut(workers=1)
+        parallel = Parallel(fan_out)
+        self.assertEqual([[1, 2]], parallel.gather(lambda: parallel.gather(lambda: 1, lambda: 2)))
+        fan_out.shutdown()
+
+
+app = Bolt()
+app.use(FanOut(workers=4))
+
+
+@app.route('/dashboard')
+class DashboardController:
+
+    def __init__(self, parallel: Parallel):
+        self.parallel = parallel
+
+    @app.get('')
+    def show(self):
+        user, orders = self.parallel.gather(lambda: 'bob', lambda: 3)
+        return Response('%s has %d orders' % (user, orders))
+
+
+app.ready()
+
+
+class FanOutTest(unittest.TestCase):
+
+    def test_injection(self):
+        self.assertEqual('bob has 3 orders', call_app(app, '/dashboard')['body'])
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork')
+    def test_gather_after_fork(self):
+        fan_out = FanOut(workers=1)
+        self.assertEqual([1], Parallel(fan_out).gather(lambda: 1))
+        pid = os.fork()
+        if pid == 0:
+            # Calls queued to the parent's pool would never run
+            threading.Timer(5, os._exit, [2]).start()
+            os._exit(0 if Parallel(fan_out).gather(lambda: 2) == [2] else 1)
+        _, status = os.waitpid(pid, 0)
+        fan_out.shutdown()
+        self.assertEqual(0, os.waitstatus_to_exitcode(status))
+
+    def test_shutdown(self):
+        shutdown_app = Bolt()
+        fan_out = FanOut(workers=1)
+        shutdown_app.use(fan_out)
+        shutdown_app.ready()
+        fan_out.pool()
+        shutdown_app.shutdown()
+        self.assertIsNone(fan_out._pool)
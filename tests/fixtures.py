@@ -3,6 +3,7 @@ from bolt.router import Route
 from bolt.validator import Validator, StringValidator, EmailValidator
 from bolt.odm import Field, Entity, Map
 from datetime import datetime
+import io
 
 app = Bolt()
 
@@ -113,3 +114,37 @@ class GroupEntity(Entity):
         'c': EntityC
     }, discriminator='type')
 
+
+
+def wsgi_env(path, method='GET', query='', headers=None, body=''):
+    env = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'HTTP_HOST': 'localhost:8000',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.url_scheme': 'http',
+    }
+    if body:
+        encoded = body.encode('utf-8')
+        env['CONTENT_LENGTH'] = str(len(encoded))
+        env['wsgi.input'] = io.BytesIO(encoded)
+    for name, value in (headers or {}).items():
+        env['HTTP_' + name.upper().replace('-', '_')] = value
+
+    return env
+
+
+def call_app(app, path, method='GET', query='', headers=None, body=''):
+    captured = {}
+
+    def start_response(status, response_headers):
+        captured['status'] = status
+        captured['headers'] = dict(response_headers)
+
+    result = app(wsgi_env(path, method, query, headers, body), start_response)
+    captured['body'] = b''.join(result).decode('utf-8')
+    if hasattr(result, 'close'):
+        result.close()
+
+    return captured
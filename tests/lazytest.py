@@ -0,0 +1,72 @@
+import unittest
+import os
+import sys
+import tempfile
+from bolt.application import Bolt, LazyController
+from tests.fixtures import call_app
+
+CONTROLLERS = '''
+from bolt.http import Response, Request
+from bolt.router import Route
+
+
+class ReportController:
+    def __init__(self, request: Request):
+        self.request = request
+
+    def show(self, route: Route):
+        return Response('report %s' % route.get('id'))
+
+
+class SummaryController:
+    def __call__(self):
+        return Response('summary')
+
+
+summary = SummaryController()
+'''
+
+
+class LazyControllerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.module = 'lazy_reports_%d' % id(self)
+        with open(os.path.join(self.directory, self.module + '.py'), 'w') as file:
+            file.write(CONTROLLERS)
+        sys.path.insert(0, self.directory)
+
+        self.app = Bolt()
+        self.show = self.app.lazy_get('/reports/{id}', self.module + ':ReportController.show')
+        self.app.ready()
+
+    def tearDown(self):
+        sys.path.remove(self.directory)
+        sys.modules.pop(self.module, None)
+
+    def test_import_on_first_hit(self):
+        self.assertEqual('404 Not Found', call_app(self.app, '/missing')['status'])
+        self.assertEqual('405 Method Not Allowed', call_app(self.app, '/reports/1', 'POST')['status'])
+        self.assertNotIn(self.module, sys.modules)
+        self.assertFalse(self.show.loaded)
+
+        self.assertEqual('report 1', call_app(self.app, '/reports/1')['body'])
+        self.assertIn(self.module, sys.modules)
+        self.assertTrue(self.show.loaded)
+        self.assertEqual('report 2', call_app(self.app, '/reports/2')['body'])
+
+    def test_prewarm(self):
+        self.app.prewarm().join(5)
+        self.assertTrue(self.show.loaded)
+        self.assertIn(self.module, sys.modules)
+
+    def test_callable_controller(self):
+        app = Bolt()
+        app.lazy_any('/summary', self.module + ':summary')
+        app.ready()
+        self.assertEqual('summary', call_app(app, '/summary', 'DELETE')['body'])
+
+    def test_invalid_path(self):
+        self.assertRaises(ValueError, LazyController, 'module.ReportController')
+        controller = LazyController(self.module + ':Missing')
+        self.assertRaises(AttributeError, controller.load)
@@ -0,0 +1,121 @@
+import unittest
+import tempfile
+from bolt.application import Bolt
+from bolt.http import Response
+from bolt.metrics import MetricsRegistry, MmapStore, Metrics, Counter, Gauge, Histogram, render, mark_process_dead
+from tests.fixtures import call_app
+
+app = Bolt()
+metrics = Metrics()
+app.use(metrics)
+
+
+@app.route('/metered')
+class MeteredController:
+
+    @app.get('/{id:numeric}')
+    def show(self):
+        return Response('shown', 200)
+
+
+app.ready()
+
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def test_counter(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('jobs_total', 'Jobs.', ['queue'])
+        counter.labels('a').inc()
+        counter.labels('a').inc(2)
+        counter.labels('b').inc()
+
+        output = registry.collect()
+        self.assertIn('# TYPE jobs_total counter', output)
+        self.assertIn('jobs_total{queue="a"} 3.0', output)
+        self.assertIn('jobs_total{queue="b"} 1.0', output)
+        self.assertRaises(ValueError, counter.labels('a').inc, -1)
+
+    def test_gauge(self):
+        registry = MetricsRegistry()
+        gauge = registry.gauge('workers', 'Workers.')
+        gauge.inc(3)
+        gauge.dec()
+        self.assertIn('workers 2.0', registry.collect())
+        gauge.set(7)
+        self.assertIn('workers 7.0', registry.collect())
+
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram('latency', 'Latency.', buckets=[0.1, 1])
+        histogram.observe(0.05)
+        histogram.observe(0.1)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        output = registry.collect()
+        self.assertIn('latency_bucket{le="0.1"} 2.0', output)
+        self.assertIn('latency_bucket{le="1.0"} 3.0', output)
+        self.assertIn('latency_bucket{le="+Inf"} 4.0', output)
+        self.assertIn('latency_count 4.0', output)
+        self.assertIn('latency_sum 5.65', output)
+
+    def test_register_twice(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('requests_total', labelnames=['route'])
+        self.assertIs(counter, registry.counter('requests_total', labelnames=['route']))
+        self.assertRaises(ValueError, registry.gauge, 'requests_total')
+
+    def test_label_escaping(self):
+        key = ('counter', 'c_total', '', 'c_total', (('path', 'a"b\\c'),))
+        self.assertIn(r'c_total{path="a\"b\\c"} 1.0', render([(key, 1.0)]))
+
+
+class MmapStoreTest(unittest.TestCase):
+
+    def test_aggregation(self):
+        directory = tempfile.mkdtemp()
+        workers = [MmapStore(directory, pid) for pid in (100, 101)]
+        for store in workers:
+            Counter('hits_total', 'Hits.', ['route'], store).labels('/a').inc(2)
+            Gauge('busy', 'Busy.', None, store).inc()
+            Histogram('wait', 'Wait.', None, store, [1]).observe(0.5)
+
+        registry = MetricsRegistry(directory)
+        output = registry.collect()
+        self.assertIn('hits_total{route="/a"} 4.0', output)
+        self.assertIn('busy 2.0', output)
+        self.assertIn('wait_bucket{le="1.0"} 2.0', output)
+
+        mark_process_dead(directory, 101)
+        output = registry.collect()
+        self.assertIn('busy 1.0', output)
+        self.assertIn('hits_total{route="/a"} 4.0', output)
+
+    def test_growing(self):
+        directory = tempfile.mkdtemp()
+        store = MmapStore(directory, 1)
+        counter = Counter('grow_total', 'Grow.', ['id'], store)
+        for i in range(3000):
+            counter.labels(i).inc()
+
+        reopened = MmapStore(directory, 1)
+        Counter('grow_total', 'Grow.', ['id'], reopened).labels(2999).inc()
+        self.assertIn('grow_total{id="2999"} 2.0', render(reopened.samples()))
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_request_metrics(self):
+        call_app(app, '/metered/1')
+        call_app(app, '/metered/2')
+        call_app(app, '/missing')
+
+        result = call_app(app, '/metrics')
+        self.assertEqual('200 OK', result['status'])
+        self.assertIn('bolt_requests_total{route="/metered/{id:numeric}",method="GET",status="200"} 2.0',
+                      result['body'])
+        self.assertIn('bolt_requests_total{route="",method="GET",status="404"} 1.0', result['body'])
+        self.assertIn('bolt_request_duration_seconds_count{route="/metered/{id:numeric}",method="GET"} 2.0',
+                      result['body'])
+        self.assertIn('bolt_requests_in_flight 1.0', result['body'])
@@ -1,5 +1,8 @@
 from tests.fixtures import UserEntity, CitizenEntity, TeamEntity, GroupEntity, EntityA, EntityB, EntityC
-from bolt.odm import Entity, Field, Mapper
+from bolt.odm import Entity, Field, Id, Mapper, Query, ODM
+from bson import ObjectId
+from unittest import mock
+import pymongo
 import unittest
 
 
@@ -137,3 +140,64 @@ class MapperTest(unittest.TestCase):
     def test_entity_with_inheritance(self):
 
         entity = CitizenEntity(name='Bob', city='California')
+
+
+@ODM.use('accounts')
+class AccountEntity(Entity):
+    id = Id()
+    name = Field(type=str)
+
+
+class CacheInvalidationTest(unittest.TestCase):
+
+    def setUp(self):
+        client = pymongo.MongoClient('mongodb://localhost:1', connect=False)
+        self.query = Query(client.get_database('test'), 'users')
+        self.id = ObjectId()
+
+    def assert_invalidated(self, tags, operation, method, *args):
+        with mock.patch.object(pymongo.collection.Collection, method), \
+                mock.patch('bolt.odm.invalidate') as invalidate:
+            operation(*args)
+        self.assertEqual(tags, [tag for call in invalidate.call_args_list for tag in call[0]])
+
+    def test_single_document_writes(self):
+        tags = ['users', 'users:%s' % self.id]
+        self.assert_invalidated(tags, self.query.insert_one, 'insert_one', {'_id': self.id})
+        self.assert_invalidated(tags, self.query.update_one, 'update_one', {'_id': self.id}, {'$set': {'a': 1}})
+        self.assert_invalidated(tags, self.query.delete_one, 'delete_one', {'_id': self.id})
+        self.assert_invalidated(tags, self.query.find_one_and_delete, 'find_one_and_delete', {'_id': self.id})
+
+    def test_unknown_documents_writes(self):
+        tags = ['users', 'users:*']
+        self.assert_invalidated(tags, self.query.update_many, 'update_many', {'age': 1}, {'$set': {'a': 1}})
+        self.assert_invalidated(tags, self.query.delete_one, 'delete_one', {'_id': {'$in': [self.id]}})
+        self.assert_invalidated(tags, self.query.insert_many, 'insert_many', [{'_id': self.id}, {}])
+
+    def test_failed_write_invalidates(self):
+        with mock.patch.object(pymongo.collection.Collection, 'delete_many', side_effect=pymongo.errors.PyMongoError()), \
+                mock.patch('bolt.odm.invalidate') as invalidate:
+            self.assertRaises(pymongo.errors.PyMongoError, self.query.delete_many, {})
+        invalidate.assert_called_once_with('users', 'users:*')
+
+    def test_persist(self):
+        query = Query(self.query.database, 'accounts')
+        account = AccountEntity(name='Bob')
+        account.__persisted__ = True
+        with mock.patch.object(pymongo.collection.Collection, 'replace_one'), \
+                mock.patch('bolt.odm.invalidate') as invalidate:
+            query.persist(account)
+        self.assertEqual([mock.call('accounts', 'accounts:%s' % account.id)], invalidate.call_args_list)
+
+    def test_persist_new_entity(self):
+        def insert_one(collection, document):
+            # pymongo assigns _id to inserted document
+            document['_id'] = ObjectId()
+
+        query = Query(self.query.database, 'accounts')
+        account = AccountEntity(id=ObjectId(), name='Bob')
+        with mock.patch.object(pymongo.collection.Collection, 'insert_one', side_effect=insert_one), \
+                mock.patch('bolt.odm.invalidate') as invalidate:
+            query.persist(account)
+        self.assertEqual(2, invalidate.call_count)
+        self.assertEqual(mock.call('accounts:%s' % account.id), invalidate.call_args_list[1])
@@ -0,0 +1,77 @@
+import unittest
+import tempfile
+import time
+import os
+from bolt.application import Bolt
+from bolt.http import Response
+from bolt.profiler import Profiler, route_filename
+from tests.fixtures import call_app
+
+
+def build_app(profiler):
+    app = Bolt()
+    app.use(profiler)
+    app.expose('/fast', FastController(), ['GET'])
+    app.expose('/slow', SlowController(), ['GET'], {Profiler.PROFILE: 1.0})
+    return app.ready()
+
+
+class FastController:
+    def __call__(self):
+        return Response('fast')
+
+
+class SlowController:
+    def __call__(self):
+        return Response(slow_work())
+
+
+def slow_work():
+    time.sleep(0.05)
+    return 'slow'
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def test_cprofile(self):
+        profiler = Profiler()
+        app = build_app(profiler)
+        call_app(app, '/fast')
+        call_app(app, '/slow')
+        call_app(app, '/slow')
+
+        self.assertEqual(['/slow'], list(profiler.stats.keys()))
+        functions = [function[2] for function in profiler.stats['/slow'].stats]
+        self.assertIn('slow_work', functions)
+
+        directory = tempfile.mkdtemp()
+        written = profiler.dump(directory)
+        self.assertEqual([os.path.join(directory, 'slow.pstats')], written)
+        self.assertTrue(os.path.getsize(written[0]) > 0)
+
+    def test_route_rates(self):
+        profiler = Profiler(rate=1.0, routes={'/slow': 0})
+        app = build_app(profiler)
+        call_app(app, '/fast')
+        call_app(app, '/slow')
+
+        self.assertEqual(['/fast'], list(profiler.stats.keys()))
+        profiler.reset()
+        self.assertEqual({}, profiler.stats)
+
+    def test_sampler(self):
+        profiler = Profiler(mode=Profiler.MODE_SAMPLER, interval=0.001)
+        app = build_app(profiler)
+        call_app(app, '/slow')
+        profiler.stop()
+
+        stacks = profiler.stats['/slow']
+        self.assertTrue(any('profilertest:slow_work' in stack for stack in stacks))
+
+        written = profiler.dump(tempfile.mkdtemp())
+        with open(written[0]) as file:
+            self.assertIn('profilertest:slow_work', file.read())
+
+    def test_route_filename(self):
+        self.assertEqual('users_id_numeric', route_filename('/users/{id:numeric}'))
+        self.assertEqual('root', route_filename('/'))
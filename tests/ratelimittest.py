@@ -0,0 +1,138 @@
+import unittest
+import os
+import tempfile
+from bolt.application import Bolt
+from bolt.http import Response
+from bolt.metrics import MetricsRegistry
+from bolt.ratelimit import RateLimiter, Limit, MemoryBackend, SharedMemoryBackend
+from tests.fixtures import call_app
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class SearchController:
+    calls = 0
+
+    def __call__(self):
+        SearchController.calls += 1
+        return Response('results')
+
+
+class BackendTest(unittest.TestCase):
+
+    def assert_token_bucket(self, backend):
+        self.assertEqual(0, backend.consume('a', 1, 2, 0.0))
+        self.assertEqual(0, backend.consume('a', 1, 2, 0.0))
+        self.assertEqual(1.0, backend.consume('a', 1, 2, 0.0))
+        self.assertEqual(0, backend.consume('b', 1, 2, 0.0))
+        self.assertEqual(0.5, backend.consume('a', 1, 2, 0.5))
+        self.assertEqual(0, backend.consume('a', 1, 2, 1.0))
+        # Refill never exceeds burst
+        self.assertEqual(0, backend.consume('a', 1, 2, 100.0))
+        self.assertEqual(0, backend.consume('a', 1, 2, 100.0))
+        self.assertEqual(1.0, backend.consume('a', 1, 2, 100.0))
+
+    def test_memory(self):
+        self.assert_token_bucket(MemoryBackend())
+
+    def test_memory_eviction(self):
+        backend = MemoryBackend(max_keys=2)
+        backend.consume('a', 1, 1, 0.0)
+        backend.consume('b', 1, 1, 0.0)
+        backend.consume('c', 1, 1, 0.0)
+        self.assertEqual(0, backend.consume('a', 1, 1, 0.0))
+        self.assertEqual(1.0, backend.consume('c', 1, 1, 0.0))
+
+    def test_shared_memory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assert_token_bucket(SharedMemoryBackend(os.path.join(directory, 'ratelimit')))
+
+    def test_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ratelimit')
+            backend = SharedMemoryBackend(path)
+            pid = os.fork()
+            if pid == 0:
+                code = 0 if backend.consume('client', 1, 3, 0.0) == 0 else 1
+                os._exit(code)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(0, os.waitstatus_to_exitcode(status))
+
+            opened = SharedMemoryBackend(path)
+            self.assertEqual(0, opened.consume('client', 1, 3, 0.0))
+            self.assertEqual(0, backend.consume('client', 1, 3, 0.0))
+            self.assertEqual(1.0, opened.consume('client', 1, 3, 0.0))
+
+    def test_shared_memory_full_group(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SharedMemoryBackend(os.path.join(directory, 'ratelimit'), slots=2, group_size=2)
+            backend.consume('a', 1, 1, 0.0)
+            backend.consume('b', 1, 1, 1.0)
+            backend.consume('c', 1, 1, 2.0)
+            # Least recently updated bucket 'a' was replaced
+            self.assertEqual(0, backend.consume('a', 1, 1, 2.0))
+            self.assertEqual(1.0, backend.consume('c', 1, 1, 2.0))
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        SearchController.calls = 0
+        self.clock = FakeClock()
+        self.registry = MetricsRegistry()
+        self.app = Bolt()
+        self.app.use(RateLimiter(clock=self.clock, registry=self.registry))
+        self.app.expose('/search', SearchController(), ['GET'], {RateLimiter.RATE_LIMIT: Limit(1, burst=2)})
+        self.app.expose('/api', SearchController(), ['GET'], {
+            RateLimiter.RATE_LIMIT: Limit(0.5, header='X-Api-Key', scope='api')
+        })
+        self.app.expose('/api/other', SearchController(), ['GET'], {
+            RateLimiter.RATE_LIMIT: Limit(0.5, header='X-Api-Key', scope='api')
+        })
+        self.app.expose('/free', SearchController(), ['GET'])
+        self.app.ready()
+
+    def test_limit_by_ip(self):
+        self.assertEqual('200 OK', call_app(self.app, '/search')['status'])
+        self.assertEqual('200 OK', call_app(self.app, '/search')['status'])
+        rejected = call_app(self.app, '/search')
+        self.assertEqual('429 Too Many Requests', rejected['status'])
+        self.assertEqual('1', rejected['headers']['Retry-After'])
+        self.assertEqual(2, SearchController.calls)
+
+        self.clock.now += 1
+        self.assertEqual('200 OK', call_app(self.app, '/search')['status'])
+        self.assertIn('bolt_rate_limited_total{scope="/search"} 1.0', self.registry.collect())
+
+    def test_limit_by_header_and_scope(self):
+        self.assertEqual('200 OK', call_app(self.app, '/api', headers={'X-Api-Key': 'a'})['status'])
+        rejected = call_app(self.app, '/api/other', headers={'X-Api-Key': 'a'})
+        self.assertEqual('429 Too Many Requests', rejected['status'])
+        self.assertEqual('2', rejected['headers']['Retry-After'])
+        self.assertEqual('200 OK', call_app(self.app, '/api/other', headers={'X-Api-Key': 'b'})['status'])
+        # Requests without the header are not limited
+        self.assertEqual('200 OK', call_app(self.app, '/api')['status'])
+        self.assertEqual('200 OK', call_app(self.app, '/api')['status'])
+
+    def test_unlimited_route(self):
+        for i in range(5):
+            self.assertEqual('200 OK', call_app(self.app, '/free')['status'])
+
+    def test_key_function(self):
+        app = Bolt()
+        app.use(RateLimiter(default=Limit(1, key=lambda request: request.uri.get_argument('user')), clock=self.clock))
+        app.expose('/search', SearchController(), ['GET'])
+        app.ready()
+
+        self.assertEqual('200 OK', call_app(app, '/search', query='user=a')['status'])
+        self.assertEqual('429 Too Many Requests', call_app(app, '/search', query='user=a')['status'])
+        self.assertEqual('200 OK', call_app(app, '/search', query='user=b')['status'])
+
+    def test_invalid_rate(self):
+        self.assertRaises(ValueError, Limit, 0)
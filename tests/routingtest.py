@@ -1,6 +1,7 @@
 import unittest
 from bolt.router import Rule, Route, RouteMap
 import inspect
+import threading
 
 
 class Test:
@@ -133,4 +134,42 @@ class RoutingTest(unittest.TestCase):
         fg = grouped_map('/more', ['*'])
         self.assertEqual(r4.name, fg.name)
         fg = grouped_map('/more', ['GET', 'POST'])
-        self.assertEqual(r4.name, fg.name)
\ No newline at end of file
+        self.assertEqual(r4.name, fg.name)
+
+    def testCloneSharesRule(self):
+        route = Route('/users/{id}', Test.listener, {'timeout': 1})
+        self.assertTrue(route.match('/users/1'))
+        cloned = route.clone()
+
+        self.assertIs(route._rule, cloned._rule)
+        self.assertEqual(('/users/{id}', Test.listener, '1', 1),
+                         (cloned.name, cloned.callback, cloned.get('id'), cloned.get('timeout')))
+        self.assertFalse(hasattr(cloned, '__dict__'))
+
+    def testFindDoesNotModifyRoutes(self):
+        route = Route('/items/{id}', Test.listener)
+        route_map = RouteMap().add(route)
+
+        first = route_map.find('/items/1')
+        second = route_map.find('/items/2')
+
+        self.assertEqual({}, route.params)
+        self.assertEqual(('1', '2'), (first.get('id'), second.get('id')))
+        self.assertIsNone(route.matched('/other'))
+
+    def testConcurrentFind(self):
+        route_map = RouteMap().add(Route('/items/{id}', Test.listener))
+        mismatches = []
+
+        def find(worker):
+            for i in range(2000):
+                id = '%d-%d' % (worker, i)
+                if route_map.find('/items/' + id).get('id') != id:
+                    mismatches.append(id)
+
+        threads = [threading.Thread(target=find, args=(worker,)) for worker in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], mismatches)
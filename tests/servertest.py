@@ -0,0 +1,228 @@
+import unittest
+import subprocess
+import signal
+import socket
+import sys
+import time
+import os
+import threading
+from threading import Thread
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import urlopen
+from bolt.application import Bolt
+from bolt.http import Response
+from bolt.metrics import MetricsRegistry
+from bolt.server import load_app, create_parser, PreforkServer, RecyclePolicy, PooledWSGIServer, \
+    QuietRequestHandler, Worker, current_rss
+
+app = Bolt()
+
+
+class PidController:
+    def __call__(self):
+        return Response(str(os.getpid()))
+
+
+app.expose('/pid', PidController(), ['GET'])
+
+
+def free_port():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def serve(port, *arguments):
+    tests_directory = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.Popen(
+        [sys.executable, '-m', 'bolt', 'serve', 'servertest:app', '--port', str(port), '--graceful-timeout', '5'] +
+        list(arguments),
+        cwd=tests_directory,
+        env=dict(os.environ, PYTHONPATH=os.path.dirname(tests_directory)),
+    )
+
+
+def wait_for(url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return urlopen(url, timeout=1).read().decode('utf-8')
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+class ServerTest(unittest.TestCase):
+
+    def test_load_app(self):
+        self.assertIs(app, load_app('servertest:app'))
+        self.assertIs(app, load_app('servertest'))
+        self.assertRaises(ValueError, load_app, 'servertest:missing')
+
+    def test_parser(self):
+        arguments = create_parser().parse_args(['serve', 'myapp:app', '--workers', '3', '--port', '9000'])
+        self.assertEqual('myapp:app', arguments.app)
+        self.assertEqual(3, arguments.workers)
+        self.assertEqual(9000, arguments.port)
+
+    def test_default_workers(self):
+        self.assertEqual(os.cpu_count(), PreforkServer(app).workers)
+
+    def test_prefork(self):
+        port = free_port()
+        process = serve(port, '--workers', '2')
+        try:
+            url = 'http://127.0.0.1:%d/pid' % port
+            workers = {int(wait_for(url)) for i in range(20)}
+            self.assertNotIn(process.pid, workers)
+
+            process.send_signal(signal.SIGHUP)
+            deadline = time.monotonic() + 10
+            worker = int(wait_for(url))
+            while worker in workers and time.monotonic() < deadline:
+                time.sleep(0.05)
+                worker = int(wait_for(url))
+            self.assertNotIn(worker, workers)
+
+            process.send_signal(signal.SIGTERM)
+            self.assertEqual(0, process.wait(10))
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    def test_recycling(self):
+        port = free_port()
+        process = serve(port, '--workers', '1', '--max-requests', '3')
+        try:
+            url = 'http://127.0.0.1:%d/pid' % port
+            workers = set()
+            deadline = time.monotonic() + 10
+            while len(workers) < 3 and time.monotonic() < deadline:
+                workers.add(int(wait_for(url)))
+                time.sleep(0.05)
+            self.assertGreaterEqual(len(workers), 3)
+            process.send_signal(signal.SIGTERM)
+            self.assertEqual(0, process.wait(10))
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+
+class WorkerTest(unittest.TestCase):
+
+    class BusyServer:
+        """ Listening socket which always has another connection waiting. """
+        def __init__(self, duration=0.0):
+            self.duration = duration
+            self.handled = 0
+
+        def handle_request(self):
+            time.sleep(self.duration)
+            self.handled += 1
+
+    def drain(self, server, **kwargs):
+        worker = Worker(app, '127.0.0.1', 0, **kwargs)
+        worker.server = server
+        with mock.patch('bolt.server.select.select', return_value=([server], [], [])):
+            worker.drain()
+
+    def test_drain_is_limited_by_backlog(self):
+        server = self.BusyServer()
+        self.drain(server, backlog=16)
+        self.assertEqual(16, server.handled)
+
+    def test_drain_is_limited_by_timeout(self):
+        server = self.BusyServer(0.05)
+        started = time.monotonic()
+        self.drain(server, backlog=1000, drain_timeout=0.2)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertLess(server.handled, 10)
+
+
+class RecyclePolicyTest(unittest.TestCase):
+
+    def test_requests(self):
+        policy = RecyclePolicy(max_requests=100, max_requests_jitter=10)
+        limit = policy.requests_limit()
+        self.assertTrue(100 <= limit <= 110)
+        self.assertIsNone(policy.check(limit - 1, limit, 0))
+        self.assertEqual('served %d requests' % limit, policy.check(limit, limit, 0))
+
+    def test_age(self):
+        policy = RecyclePolicy(max_age=60)
+        self.assertIsNone(policy.requests_limit())
+        self.assertIsNone(policy.check(1000, None, 59))
+        self.assertIsNotNone(policy.check(0, None, 60))
+
+    def test_rss(self):
+        policy = RecyclePolicy(max_rss=1024)
+        self.assertIsNotNone(policy.check(0, None, 0, rss=2048))
+        self.assertIsNone(policy.check(0, None, 0, rss=512))
+        self.assertIsNone(RecyclePolicy(max_rss=current_rss() * 10).check(0, None, 0))
+
+    def test_enabled(self):
+        self.assertFalse(RecyclePolicy().enabled)
+        self.assertTrue(RecyclePolicy(max_age=1).enabled)
+
+
+class PooledWSGIServerTest(unittest.TestCase):
+
+    def test_load_shedding(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        class BlockingController:
+            def __call__(self):
+                entered.set()
+                release.wait(10)
+                return Response('done')
+
+        registry = MetricsRegistry()
+        blocking_app = Bolt()
+        blocking_app.expose('/block', BlockingController(), ['GET'])
+        blocking_app.ready()
+        server = PooledWSGIServer(('127.0.0.1', 0), QuietRequestHandler, threads=1, queue_size=1, retry_after=7,
+                                  registry=registry)
+        server.set_app(blocking_app)
+        Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        url = 'http://127.0.0.1:%d/block' % server.server_address[1]
+        results = []
+
+        def fetch():
+            results.append(urlopen(url, timeout=10).read().decode('utf-8'))
+
+        try:
+            first = Thread(target=fetch)
+            first.start()
+            self.assertTrue(entered.wait(5))
+            second = Thread(target=fetch)
+            second.start()
+            deadline = time.monotonic() + 5
+            while server.queue_depth < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            with self.assertRaises(HTTPError) as context:
+                urlopen(url, timeout=10)
+            self.assertEqual(503, context.exception.code)
+            self.assertEqual('7', context.exception.headers['Retry-After'])
+
+            release.set()
+            first.join(5)
+            second.join(5)
+            self.assertEqual(['done', 'done'], results)
+            self.assertEqual(1, server.rejected)
+
+            output = registry.collect()
+            self.assertIn('bolt_server_rejected_total 1.0', output)
+            self.assertIn('bolt_server_queue_depth 0.0', output)
+            self.assertIn('bolt_server_queue_wait_seconds_count 2.0', output)
+        finally:
+            release.set()
+            server.shutdown()
+            server.server_close()
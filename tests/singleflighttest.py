@@ -0,0 +1,98 @@
+import unittest
+import threading
+import time
+from bolt.application import Bolt
+from bolt.http import Response, Request
+from bolt.metrics import MetricsRegistry
+from bolt.singleflight import SingleFlight
+from tests.fixtures import call_app
+
+entered = threading.Event()
+release = threading.Event()
+calls = []
+
+
+class ProductController:
+    def __call__(self, request: Request):
+        calls.append(request.uri.query)
+        if request.uri.get_argument('block'):
+            entered.set()
+            release.wait(5)
+        return Response('product %d' % len(calls), 200, {'Content-Type': 'text/plain', 'X-Calls': str(len(calls))})
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        entered.clear()
+        release.clear()
+        calls.clear()
+        self.registry = MetricsRegistry()
+        self.single_flight = SingleFlight(timeout=5, registry=self.registry)
+        self.app = Bolt()
+        self.app.use(self.single_flight)
+        self.app.expose('/products', ProductController(), ['GET', 'POST'], {SingleFlight.COALESCE: True})
+        self.app.expose('/feed', ProductController(), ['GET'], {SingleFlight.COALESCE: ['Accept-Language']})
+        self.app.expose('/plain', ProductController(), ['GET'])
+
+    def run_concurrently(self, requests):
+        """ Starts the first request, waits until it blocks in the controller and
+        sends the remaining ones while it is running.
+        """
+        results = {}
+
+        def call(index, args):
+            results[index] = call_app(self.app, *args[:2], query=args[2], headers=args[3] if len(args) > 3 else None)
+
+        threads = [threading.Thread(target=call, args=(i, args)) for i, args in enumerate(requests)]
+        threads[0].start()
+        self.assertTrue(entered.wait(5))
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        return [results[i] for i in range(len(requests))]
+
+    def test_coalescing(self):
+        self.app.ready()
+        results = self.run_concurrently([('/products', 'GET', 'block=1')] * 4)
+
+        self.assertEqual(['block=1'], calls)
+        self.assertEqual(['product 1'] * 4, [result['body'] for result in results])
+        self.assertEqual('1', results[3]['headers']['X-Calls'])
+        self.assertEqual(3, self.single_flight.coalesced)
+        self.assertIn('bolt_coalesced_requests_total{route="/products"} 3.0', self.registry.collect())
+
+        # Finished requests are not reused
+        call_app(self.app, '/products', query='block=1')
+        self.assertEqual(2, len(calls))
+
+    def test_different_requests(self):
+        self.app.ready()
+        self.run_concurrently([
+            ('/products', 'GET', 'block=1'),
+            ('/products', 'GET', 'block=1&page=2'),
+            ('/products', 'POST', 'block=1'),
+            ('/plain', 'GET', 'block=1'),
+        ])
+        self.assertEqual(4, len(calls))
+
+    def test_selected_headers(self):
+        self.app.ready()
+        self.run_concurrently([
+            ('/feed', 'GET', 'block=1', {'Accept-Language': 'en'}),
+            ('/feed', 'GET', 'block=1', {'Accept-Language': 'en', 'Cookie': 'a=1'}),
+            ('/feed', 'GET', 'block=1', {'Accept-Language': 'pl'}),
+        ])
+        self.assertEqual(2, len(calls))
+
+    def test_follower_timeout(self):
+        self.single_flight.timeout = 0.01
+        self.app.ready()
+        results = self.run_concurrently([('/products', 'GET', 'block=1')] * 2)
+
+        self.assertEqual('200 OK', results[0]['status'])
+        self.assertEqual('504 Gateway Timeout', results[1]['status'])
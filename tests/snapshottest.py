@@ -0,0 +1,158 @@
+import unittest
+import os
+import pickle
+import tempfile
+from bolt.application import Bolt
+from bolt.cache import MemoryCache, SharedMemoryCache, cached
+from bolt.http import Response
+from bolt.snapshot import CacheSnapshots
+from tests.fixtures import call_app
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+CLOCK = FakeClock()
+
+
+class PriceService:
+    @cached(ttl=100, cache=MemoryCache(clock=CLOCK))
+    def price(self, product):
+        return len(product)
+
+
+class PriceController:
+    def __call__(self):
+        return Response(str(PriceService().price('apple')))
+
+
+class CacheSnapshotsTest(unittest.TestCase):
+
+    def setUp(self):
+        CLOCK.now = 1000.0
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'caches.snapshot')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_and_load(self):
+        cache = MemoryCache(clock=CLOCK)
+        cache.set('a', {'id': 1})
+        cache.set('b', 2, ttl=10)
+        cache.set('c', 3, ttl=60)
+        self.assertEqual(3, CacheSnapshots(self.path, '1', {'main': cache}, clock=CLOCK).save())
+
+        CLOCK.now += 30
+        restored = MemoryCache(clock=CLOCK)
+        self.assertEqual(2, CacheSnapshots(self.path, '1', {'main': restored}, clock=CLOCK).load())
+        self.assertEqual({'id': 1}, restored.get('a'))
+        self.assertIsNone(restored.get('b'))
+        # Remaining TTL is kept
+        CLOCK.now += 30
+        self.assertIsNone(restored.get('c'))
+
+    def test_version_mismatch(self):
+        cache = MemoryCache(clock=CLOCK)
+        cache.set('a', 1)
+        CacheSnapshots(self.path, '1', {'main': cache}, clock=CLOCK).save()
+
+        restored = MemoryCache(clock=CLOCK)
+        self.assertEqual(0, CacheSnapshots(self.path, '2', {'main': restored}, clock=CLOCK).load())
+        self.assertIsNone(restored.get('a'))
+
+    def test_max_age(self):
+        cache = MemoryCache(clock=CLOCK)
+        cache.set('a', 1)
+        CacheSnapshots(self.path, '1', {'main': cache}, clock=CLOCK).save()
+        CLOCK.now += 3600
+
+        snapshots = CacheSnapshots(self.path, '1', {'main': MemoryCache(clock=CLOCK)}, max_age=60, clock=CLOCK)
+        self.assertEqual(0, snapshots.load())
+
+    def test_missing_and_corrupted_file(self):
+        snapshots = CacheSnapshots(self.path, '1', {'main': MemoryCache()})
+        self.assertEqual(0, snapshots.load())
+        with open(self.path, 'wb') as file:
+            file.write(b'corrupted')
+        with self.assertLogs('bolt.snapshot'):
+            self.assertEqual(0, snapshots.load())
+
+    def test_unpicklable_values_are_skipped(self):
+        cache = MemoryCache()
+        cache.set('a', 1)
+        cache.set('lock', lambda: None)
+        self.assertEqual(1, CacheSnapshots(self.path, '1', {'main': cache}).save())
+        with open(self.path, 'rb') as file:
+            self.assertEqual(['a'], [entry[0] for entry in pickle.load(file)['caches']['main']])
+
+    def test_shared_memory_cache(self):
+        cache = SharedMemoryCache(os.path.join(self.directory.name, 'cache'), clock=CLOCK)
+        cache.set('a', [1, 2], ttl=60)
+        CacheSnapshots(self.path, '1', {'shared': cache}, clock=CLOCK).save()
+        cache.clear()
+
+        CacheSnapshots(self.path, '1', {'shared': cache}, clock=CLOCK).load()
+        self.assertEqual([1, 2], cache.get('a'))
+        self.assertEqual([('a', [1, 2], 1060.0)], cache.entries())
+        cache.memory.close()
+
+    def test_request_scope_cannot_be_persisted(self):
+        @cached(scope='request')
+        def lookup():
+            pass
+
+        self.assertRaises(ValueError, CacheSnapshots, self.path, '1', {'lookup': lookup})
+
+    def test_application_lifecycle(self):
+        app = Bolt()
+        app.expose('/price', PriceController(), ['GET'])
+        app.use(CacheSnapshots(self.path, '1', {'prices': PriceService.price}, clock=CLOCK))
+        app.ready()
+        self.assertEqual('5', call_app(app, '/price')['body'])
+        app.shutdown()
+
+        PriceService.price.clear()
+        other = Bolt()
+        other.use(CacheSnapshots(self.path, '1', {'prices': PriceService.price}, clock=CLOCK))
+        other.ready()
+        self.assertEqual(5, PriceService.price.cache.get(PriceService.price.key(('apple',), {})))
+
+    def test_no_save_without_requests(self):
+        app = Bolt()
+        app.use(CacheSnapshots(self.path, '1', {'main': MemoryCache()}))
+        app.ready()
+        app.shutdown()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_warmup_does_not_start_saving(self):
+        app = Bolt()
+        app.expose('/price', PriceController(), ['GET'])
+        snapshots = CacheSnapshots(self.path, '1', {'prices': PriceService.price}, interval=0.01)
+        app.use(snapshots)
+        app.ready(warmup=True, requests=[('GET', '/price')])
+
+        self.assertEqual(200, app.startup_report.requests[0]['status'])
+        self.assertIsNone(snapshots._thread)
+        app.shutdown()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_periodic_save(self):
+        cache = MemoryCache()
+        cache.set('a', 1)
+        snapshots = CacheSnapshots(self.path, '1', {'main': cache}, interval=0.01)
+        app = Bolt()
+        app.use(snapshots)
+        app.ready()
+        snapshots.intercept(None, lambda request: None)
+        for i in range(100):
+            if os.path.exists(self.path):
+                break
+            snapshots._stop.wait(0.01)
+        snapshots.close()
+        self.assertTrue(os.path.exists(self.path))
@@ -0,0 +1,32 @@
+import unittest
+import os
+import subprocess
+import sys
+from bolt.http import Request, Uri
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StartupTest(unittest.TestCase):
+
+    def imported_modules(self, code):
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        output = subprocess.check_output([sys.executable, '-W', 'ignore', '-c', code + '''
+import sys
+print(' '.join(name for name in ('pymongo', 'bson', 'dateutil', 'six') if name in sys.modules))
+'''], cwd=ROOT, env=env)
+        return output.decode('utf-8').split()
+
+    def test_import_bolt_skips_optional_dependencies(self):
+        self.assertEqual([], self.imported_modules('import bolt; from bolt.application import Bolt, Controller'))
+
+    def test_validator_imports_dateutil_on_first_use(self):
+        self.assertEqual([], self.imported_modules('import bolt.validator'))
+
+    def test_odm_imports_pymongo(self):
+        self.assertIn('pymongo', self.imported_modules('import bolt.odm'))
+
+    def test_cookies(self):
+        request = Request('GET', Uri('http://localhost/'), None, {'COOKIE': 'session=abc; theme=dark'})
+        self.assertEqual({'session': 'abc', 'theme': 'dark'}, request.cookies)
+        self.assertEqual({}, Request('GET', Uri('http://localhost/'), None, {}).cookies)
@@ -0,0 +1,107 @@
+import unittest
+import tempfile
+import json
+import os
+import pymongo
+from unittest import mock
+from bolt.application import Bolt
+from bolt.http import Response
+from bolt.odm import Query
+from bolt.tracing import Tracer, InMemoryExporter, JsonFileExporter, span, current_span, parse_traceparent
+from tests.fixtures import call_app
+
+exporter = InMemoryExporter()
+app = Bolt()
+app.use(Tracer(exporter))
+
+
+@app.before()
+def authenticate(service_locator):
+    pass
+
+
+@app.route('/traced')
+class TracedController:
+
+    @app.get('/{id}')
+    def show(self):
+        with span('custom', key='value'):
+            pass
+        return Response('traced')
+
+
+app.ready()
+
+
+class TracingTest(unittest.TestCase):
+
+    def setUp(self):
+        exporter.spans.clear()
+
+    def test_request_spans(self):
+        result = call_app(app, '/traced/1')
+
+        spans = {span.name: span for span in exporter.spans}
+        self.assertEqual(['route.find', 'middleware.before', 'custom', 'controller.resolve', 'request'],
+                         [span.name for span in exporter.spans])
+        root = spans['request']
+        self.assertIsNone(root.parent_id)
+        self.assertEqual('/traced/{id}', root.attributes['route'])
+        self.assertEqual(200, root.attributes['status'])
+        self.assertEqual(root.span_id, spans['route.find'].parent_id)
+        self.assertEqual(root.span_id, spans['controller.resolve'].parent_id)
+        self.assertEqual(spans['controller.resolve'].span_id, spans['custom'].parent_id)
+        self.assertEqual('authenticate', spans['middleware.before'].attributes['callback'])
+        self.assertEqual(1, len({span.trace_id for span in exporter.spans}))
+        self.assertEqual(root.traceparent, result['headers']['traceparent'])
+
+    def test_incoming_traceparent(self):
+        traceparent = '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'
+        call_app(app, '/traced/1', headers={'traceparent': traceparent})
+
+        root = exporter.spans[-1]
+        self.assertEqual('0af7651916cd43dd8448eb211c80319c', root.trace_id)
+        self.assertEqual('b7ad6b7169203331', root.parent_id)
+
+    def test_not_sampled(self):
+        call_app(app, '/traced/1', headers={'traceparent': '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00'})
+        self.assertEqual([], exporter.spans)
+
+    def test_no_active_trace(self):
+        with span('orphan') as orphan:
+            self.assertIsNone(orphan)
+        self.assertIsNone(current_span())
+
+    def test_parse_traceparent(self):
+        self.assertEqual(('0af7651916cd43dd8448eb211c80319c', 'b7ad6b7169203331', True),
+                         parse_traceparent('00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'))
+        self.assertIsNone(parse_traceparent('00-00000000000000000000000000000000-b7ad6b7169203331-01'))
+        self.assertIsNone(parse_traceparent('garbage'))
+        self.assertIsNone(parse_traceparent(None))
+
+    def test_odm_spans(self):
+        client = pymongo.MongoClient('mongodb://localhost:1', connect=False)
+        query = Query(client.get_database('test'), 'users')
+        tracer = Tracer(exporter)
+
+        with mock.patch.object(pymongo.collection.Collection, 'insert_one') as insert_one:
+            with tracer.trace('job'):
+                query.insert_one({'name': 'Bob'})
+
+        insert_one.assert_called_once_with(query, {'name': 'Bob'})
+        self.assertEqual(['odm.insert_one', 'job'], [span.name for span in exporter.spans])
+        self.assertEqual('users', exporter.spans[0].attributes['collection'])
+        self.assertEqual(exporter.spans[1].span_id, exporter.spans[0].parent_id)
+
+    def test_json_file_exporter(self):
+        path = os.path.join(tempfile.mkdtemp(), 'spans.jsonl')
+        tracer = Tracer(JsonFileExporter(path))
+        with tracer.trace('job', size=3):
+            with span('step'):
+                pass
+
+        with open(path) as file:
+            lines = [json.loads(line) for line in file]
+        self.assertEqual(['step', 'job'], [line['name'] for line in lines])
+        self.assertEqual(3, lines[1]['attributes']['size'])
+        self.assertEqual(lines[1]['span_id'], lines[0]['parent_id'])
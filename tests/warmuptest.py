@@ -0,0 +1,96 @@
+import unittest
+from bolt.application import Bolt
+from bolt.http import Response, Request
+
+created = []
+handled = []
+
+app = Bolt()
+app.warmup_requests = [('GET', '/api/health')]
+
+
+@app.service()
+class Clock:
+    def __init__(self):
+        created.append('clock')
+
+
+@app.service()
+class Greeter:
+    def __init__(self, clock: Clock):
+        created.append('greeter')
+
+
+@app.route('/api')
+class HealthController:
+
+    def __init__(self, request: Request):
+        self.request = request
+
+    @app.get('/health')
+    def health(self):
+        handled.append(self.request.uri.path)
+        return Response('ok')
+
+    @app.post('/echo')
+    def echo(self):
+        handled.append(self.request.body.from_json())
+        return Response('echo', 201)
+
+
+class WarmupTest(unittest.TestCase):
+
+    def tearDown(self):
+        created.clear()
+        handled.clear()
+
+    def test_warmup(self):
+        app.ready(warmup=True)
+
+        self.assertTrue(app.is_ready)
+        self.assertEqual(['clock', 'greeter'], sorted(created))
+        self.assertEqual(['/api/health'], handled)
+        report = app.startup_report
+        self.assertEqual(['services', 'routes', 'pipeline', 'compile', 'plans', 'instances', 'requests'],
+                         list(report.phases.keys()))
+        self.assertEqual(200, report.requests[0]['status'])
+        self.assertIn('GET /api/health -> 200', str(report))
+
+    def test_requests(self):
+        warmed = Bolt()
+        warmed.expose('/echo', HealthController.echo, ['POST'])
+        warmed.ready(warmup=True, requests=[{'method': 'POST', 'path': '/echo', 'body': {'id': 1}}])
+
+        self.assertEqual([{'id': 1}], handled)
+        self.assertEqual(201, warmed.startup_report.requests[0]['status'])
+
+    def test_responses_are_closed(self):
+        closed = []
+
+        def interceptor(request, handler):
+            response = handler(request)
+            response.on_close(lambda: closed.append(request.uri.path))
+            return response
+
+        warmed = Bolt()
+        warmed.intercept(interceptor)
+        warmed.expose('/echo', HealthController.echo, ['POST'])
+        warmed.ready(warmup=True, requests=[{'method': 'POST', 'path': '/echo', 'body': {'id': 1}}])
+
+        self.assertEqual(['/echo'], closed)
+
+    def test_missing_dependency(self):
+        broken = Bolt()
+
+        class Mailer:
+            def __init__(self, transport: unittest.TestCase):
+                pass
+
+        broken.service_locator.set(Mailer)
+        self.assertRaises(AttributeError, broken.ready, warmup=True)
+        self.assertFalse(broken.is_ready)
+
+    def test_without_warmup(self):
+        plain = Bolt()
+        plain.ready()
+        self.assertEqual(['services', 'routes', 'pipeline'], list(plain.startup_report.phases.keys()))